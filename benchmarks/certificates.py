@@ -0,0 +1,91 @@
+"""
+Benchmarks for encoding the server's Certificate message and verifying the
+server's certificate chain, with and without a CertificateCache.
+
+Usage: PYTHONPATH=src python benchmarks/certificates.py [--handshakes 1000]
+"""
+
+import argparse
+import datetime
+import time
+from typing import Callable
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from aioquic.tls import CertificateCache, encode_certificate, verify_certificate
+
+
+def bench(name: str, func: Callable[[], int]) -> None:
+    start = time.perf_counter()
+    operations = func()
+    elapsed = time.perf_counter() - start
+    print(
+        "%-24s %8d ops %10.3f ms %10.3f us/handshake"
+        % (name, operations, elapsed * 1000, elapsed * 1000000 / operations)
+    )
+
+
+def generate_certificate(common_name: str) -> x509.Certificate:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, common_name)])
+    now = datetime.datetime.utcnow()
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=10))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(common_name)]), critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+
+
+def run(count: int) -> None:
+    certificate = generate_certificate("example.com")
+    cadata = certificate.public_bytes(serialization.Encoding.PEM)
+    cache = CertificateCache()
+
+    def encode() -> int:
+        for i in range(count):
+            encode_certificate(certificate, [])
+        return count
+
+    def encode_cached() -> int:
+        for i in range(count):
+            cache.encode_certificate(certificate, [])
+        return count
+
+    def verify() -> int:
+        for i in range(count):
+            verify_certificate(
+                certificate=certificate, cadata=cadata, server_name="example.com"
+            )
+        return count
+
+    def verify_cached() -> int:
+        for i in range(count):
+            cache.verify_certificate(
+                certificate=certificate, cadata=cadata, server_name="example.com"
+            )
+        return count
+
+    bench("encode", encode)
+    bench("encode cached", encode_cached)
+    bench("verify", verify)
+    bench("verify cached", verify_cached)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Certificate benchmarks")
+    parser.add_argument(
+        "--handshakes", type=int, default=1000, help="number of handshakes"
+    )
+    args = parser.parse_args()
+
+    run(count=args.handshakes)
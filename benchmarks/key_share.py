@@ -0,0 +1,55 @@
+"""
+Benchmarks for obtaining the ephemeral keys of a TLS handshake, generating
+them on the spot or taking them from a KeySharePool filled beforehand.
+
+Usage: PYTHONPATH=src python benchmarks/key_share.py [--handshakes 2000]
+"""
+
+import argparse
+import time
+from typing import Callable
+
+from aioquic.tls import Group, KeySharePool, generate_private_key
+
+GROUPS = [Group.SECP256R1, Group.X25519]
+
+
+def bench(name: str, func: Callable[[], int]) -> None:
+    start = time.perf_counter()
+    operations = func()
+    elapsed = time.perf_counter() - start
+    print(
+        "%-24s %8d ops %10.3f ms %10.3f us/handshake"
+        % (name, operations, elapsed * 1000, elapsed * 1000000 / operations)
+    )
+
+
+def run(count: int) -> None:
+    pool = KeySharePool(groups=GROUPS, size=count)
+
+    def generate() -> int:
+        for i in range(count):
+            for group in GROUPS:
+                generate_private_key(group)
+        return count
+
+    def take() -> int:
+        for i in range(count):
+            for group in GROUPS:
+                pool.get(group)
+        return count
+
+    bench("generate", generate)
+    bench("pool fill", lambda: pool.fill() // len(GROUPS))
+    bench("pool get", take)
+    print("pool hits %d, misses %d" % (pool.hits, pool.misses))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Key share pool benchmarks")
+    parser.add_argument(
+        "--handshakes", type=int, default=2000, help="number of handshakes"
+    )
+    args = parser.parse_args()
+
+    run(count=args.handshakes)
@@ -0,0 +1,470 @@
+"""
+Benchmarks for the QUIC and HTTP/3 stack, running a client and a server
+back to back in memory.
+
+Datagrams go through an optional link emulator which adds delay, loss and a
+bandwidth limit. Time is simulated, so the wall-clock figures measure the CPU
+cost of the stack while the simulated figures reflect the emulated network.
+
+Usage: PYTHONPATH=src python benchmarks/loopback.py [--json results.json]
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import ssl
+import statistics
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from aioquic.h3.connection import H3_ALPN, H3Connection
+from aioquic.h3.events import DataReceived, H3Event, HeadersReceived
+from aioquic.quic import events
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.connection import QuicConnection
+
+CLIENT_ADDR = ("1.2.3.4", 1234)
+SERVER_ADDR = ("2.3.4.5", 4433)
+
+EventHandler = Callable[[events.QuicEvent], None]
+
+
+class Link:
+    """
+    A one-way link with a fixed delay, random loss and an optional bandwidth.
+    """
+
+    def __init__(
+        self,
+        rng: random.Random,
+        delay: float = 0.0,
+        loss: float = 0.0,
+        bandwidth: Optional[float] = None,
+    ) -> None:
+        self.delivered = 0
+        self.dropped = 0
+
+        self._bandwidth = bandwidth
+        self._delay = delay
+        self._free_at = 0.0
+        self._loss = loss
+        self._queue: Deque[Tuple[float, bytes]] = deque()
+        self._rng = rng
+
+    def next_arrival(self) -> Optional[float]:
+        return self._queue[0][0] if self._queue else None
+
+    def receive(self, now: float) -> List[bytes]:
+        """
+        Return the datagrams which have arrived by `now`.
+        """
+        datagrams = []
+        while self._queue and self._queue[0][0] <= now:
+            datagrams.append(self._queue.popleft()[1])
+        self.delivered += len(datagrams)
+        return datagrams
+
+    def send(self, data: bytes, now: float) -> None:
+        # serialize datagrams at the link's bandwidth
+        if self._bandwidth is not None:
+            self._free_at = max(now, self._free_at) + len(data) * 8 / self._bandwidth
+            departure = self._free_at
+        else:
+            departure = now
+
+        if self._loss and self._rng.random() < self._loss:
+            self.dropped += 1
+        else:
+            self._queue.append((departure + self._delay, data))
+
+
+class Loopback:
+    """
+    A client and a server connected by a pair of links, driven by a
+    simulated clock.
+    """
+
+    def __init__(
+        self,
+        client: QuicConnection,
+        server: QuicConnection,
+        link_options: Dict,
+        rng: random.Random,
+    ) -> None:
+        self.client = client
+        self.server = server
+        self.now = 0.0
+
+        # statistics about datagrams received by each endpoint
+        self.receive_count = {client: 0, server: 0}
+        self.receive_time = {client: 0.0, server: 0.0}
+
+        self._handlers: Dict[QuicConnection, EventHandler] = {}
+        self._links = {
+            client: Link(rng=rng, **link_options),
+            server: Link(rng=rng, **link_options),
+        }
+
+    def connect(self) -> None:
+        self.client.connect(SERVER_ADDR, now=self.now)
+
+    def run(self, until: Callable[[], bool], timeout: float = 600.0) -> None:
+        """
+        Exchange datagrams until `until()` returns `True`.
+
+        `timeout` is expressed in simulated seconds.
+        """
+        deadline = self.now + timeout
+        peers = ((self.client, self.server), (self.server, self.client))
+        while True:
+            self._process_events()
+            if until():
+                return
+            for connection, peer in peers:
+                # the server has no network path until it receives a datagram
+                if connection is self.server and not self.receive_count[connection]:
+                    continue
+                for data, addr in connection.datagrams_to_send(now=self.now):
+                    self._links[connection].send(data, self.now)
+
+            # advance the clock to the next arrival or timer
+            candidates = [
+                t
+                for t in (
+                    self.client.get_timer(),
+                    self.server.get_timer(),
+                    self._links[self.client].next_arrival(),
+                    self._links[self.server].next_arrival(),
+                )
+                if t is not None
+            ]
+            if not candidates:
+                raise RuntimeError("Nothing left to do")
+            self.now = max(self.now, min(candidates))
+            if self.now > deadline:
+                raise RuntimeError("Timed out after %.1f simulated seconds" % timeout)
+
+            for connection, peer in peers:
+                from_addr = CLIENT_ADDR if connection is self.client else SERVER_ADDR
+                for data in self._links[connection].receive(self.now):
+                    start = time.perf_counter()
+                    peer.receive_datagram(data, from_addr, now=self.now)
+                    self.receive_time[peer] += time.perf_counter() - start
+                    self.receive_count[peer] += 1
+
+                timer_at = connection.get_timer()
+                if timer_at is not None and timer_at <= self.now:
+                    connection.handle_timer(now=self.now)
+
+    def set_handler(self, connection: QuicConnection, handler: EventHandler) -> None:
+        self._handlers[connection] = handler
+
+    def _process_events(self) -> None:
+        for connection in (self.client, self.server):
+            handler = self._handlers.get(connection)
+            event = connection.next_event()
+            while event is not None:
+                if handler is not None:
+                    handler(event)
+                event = connection.next_event()
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed)
+
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, "localhost")])
+        now = datetime.datetime.utcnow()
+        self.certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256())
+        )
+        self.private_key = key
+
+    def create_loopback(
+        self, alpn_protocols: Optional[List[str]] = None, loss: Optional[float] = None
+    ) -> Loopback:
+        client_configuration = QuicConfiguration(
+            alpn_protocols=alpn_protocols,
+            congestion_control_algorithm=self.args.congestion_control,
+            is_client=True,
+            verify_mode=ssl.CERT_NONE,
+        )
+        client = QuicConnection(configuration=client_configuration)
+
+        server_configuration = QuicConfiguration(
+            alpn_protocols=alpn_protocols,
+            congestion_control_algorithm=self.args.congestion_control,
+            is_client=False,
+        )
+        server_configuration.certificate = self.certificate
+        server_configuration.private_key = self.private_key
+        server = QuicConnection(
+            configuration=server_configuration,
+            original_destination_connection_id=client.original_destination_connection_id,
+        )
+
+        link_options = {
+            "bandwidth": self.args.bandwidth,
+            "delay": self.args.delay,
+            "loss": self.args.loss if loss is None else loss,
+        }
+        return Loopback(client, server, link_options=link_options, rng=self.rng)
+
+    def handshake(self, loopback: Loopback) -> None:
+        completed = set()
+
+        def handler(event: events.QuicEvent) -> None:
+            if isinstance(event, events.HandshakeCompleted):
+                completed.add(loopback.client)
+
+        loopback.set_handler(loopback.client, handler)
+        loopback.connect()
+        loopback.run(lambda: bool(completed))
+
+    def transfer(self, loopback: Loopback, size: int) -> None:
+        """
+        Send `size` bytes from the client to the server on a single stream.
+        """
+        received = [0, False]
+
+        def handler(event: events.QuicEvent) -> None:
+            if isinstance(event, events.StreamDataReceived):
+                received[0] += len(event.data)
+                received[1] = event.end_stream
+
+        loopback.set_handler(loopback.server, handler)
+        stream_id = loopback.client.get_next_available_stream_id()
+        loopback.client.send_stream_data(stream_id, bytes(size), end_stream=True)
+        loopback.run(lambda: received[1])
+        assert received[0] == size
+
+    def bench_ack(self) -> Dict:
+        loss = self.args.loss or 0.01
+        loopback = self.create_loopback(loss=loss)
+        self.handshake(loopback)
+
+        size = self.args.size * 1024 * 1024
+        count = loopback.receive_count[loopback.client]
+        elapsed = loopback.receive_time[loopback.client]
+        self.transfer(loopback, size)
+        count = loopback.receive_count[loopback.client] - count
+        elapsed = loopback.receive_time[loopback.client] - elapsed
+        return {
+            "datagrams": count,
+            "loss": loss,
+            "us_per_datagram": elapsed * 1000000 / count,
+        }
+
+    def bench_bulk(self) -> Dict:
+        loopback = self.create_loopback()
+        self.handshake(loopback)
+
+        size = self.args.size * 1024 * 1024
+        simulated = loopback.now
+        start = time.perf_counter()
+        self.transfer(loopback, size)
+        elapsed = time.perf_counter() - start
+        simulated = loopback.now - simulated
+        return {
+            "bytes": size,
+            "mbps": size * 8 / elapsed / 1000000,
+            "seconds": elapsed,
+            "simulated_mbps": size * 8 / simulated / 1000000 if simulated else None,
+        }
+
+    def bench_h3(self) -> Dict:
+        loopback = self.create_loopback(alpn_protocols=H3_ALPN)
+        self.handshake(loopback)
+        client = H3Connection(loopback.client)
+        server = H3Connection(loopback.server)
+        body = bytes(self.args.response_size)
+        done = set()
+
+        def client_handler(event: events.QuicEvent) -> None:
+            for http_event in client.handle_event(event):
+                if isinstance(http_event, (DataReceived, HeadersReceived)):
+                    if http_event.stream_ended:
+                        done.add(http_event.stream_id)
+
+        def server_handler(event: events.QuicEvent) -> None:
+            for http_event in server.handle_event(event):
+                handle_request(http_event)
+
+        def handle_request(http_event: H3Event) -> None:
+            if isinstance(http_event, HeadersReceived) and http_event.stream_ended:
+                server.send_headers(
+                    stream_id=http_event.stream_id,
+                    headers=[(b":status", b"200")],
+                )
+                server.send_data(
+                    stream_id=http_event.stream_id, data=body, end_stream=True
+                )
+
+        loopback.set_handler(loopback.client, client_handler)
+        loopback.set_handler(loopback.server, server_handler)
+
+        latencies = []
+        simulated = []
+        for i in range(self.args.requests):
+            stream_id = loopback.client.get_next_available_stream_id()
+            client.send_headers(
+                stream_id=stream_id,
+                headers=[
+                    (b":method", b"GET"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                ],
+                end_stream=True,
+            )
+            simulated_start = loopback.now
+            start = time.perf_counter()
+            loopback.run(lambda: stream_id in done)
+            latencies.append(time.perf_counter() - start)
+            simulated.append(loopback.now - simulated_start)
+
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "latency_mean_us": statistics.mean(latencies) * 1000000,
+            "latency_p50_us": latencies[len(latencies) // 2] * 1000000,
+            "latency_p99_us": latencies[int(len(latencies) * 0.99)] * 1000000,
+            "simulated_latency_mean_ms": statistics.mean(simulated) * 1000,
+        }
+
+    def bench_handshake(self) -> Dict:
+        count = self.args.handshakes
+        start = time.perf_counter()
+        for i in range(count):
+            self.handshake(self.create_loopback())
+        elapsed = time.perf_counter() - start
+        return {"handshakes": count, "per_second": count / elapsed}
+
+    def bench_streams(self) -> Dict:
+        loopback = self.create_loopback()
+        self.handshake(loopback)
+        request = bytes(self.args.request_size)
+        done = set()
+
+        def client_handler(event: events.QuicEvent) -> None:
+            if isinstance(event, events.StreamDataReceived) and event.end_stream:
+                done.add(event.stream_id)
+
+        def server_handler(event: events.QuicEvent) -> None:
+            if isinstance(event, events.StreamDataReceived) and event.end_stream:
+                loopback.server.send_stream_data(
+                    event.stream_id, request, end_stream=True
+                )
+
+        loopback.set_handler(loopback.client, client_handler)
+        loopback.set_handler(loopback.server, server_handler)
+
+        # send all requests at once, each on its own stream
+        count = self.args.requests
+        start = time.perf_counter()
+        for i in range(count):
+            stream_id = loopback.client.get_next_available_stream_id()
+            loopback.client.send_stream_data(stream_id, request, end_stream=True)
+        loopback.run(lambda: len(done) == count)
+        elapsed = time.perf_counter() - start
+        return {"requests": count, "per_second": count / elapsed}
+
+
+BENCHMARKS = {
+    "bulk": Benchmark.bench_bulk,
+    "handshake": Benchmark.bench_handshake,
+    "streams": Benchmark.bench_streams,
+    "ack": Benchmark.bench_ack,
+    "h3": Benchmark.bench_h3,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-memory QUIC benchmarks")
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help="the benchmarks to run, among %s (default: all)"
+        % ", ".join(BENCHMARKS.keys()),
+    )
+    parser.add_argument(
+        "--bandwidth", type=float, help="link bandwidth in bits per second"
+    )
+    parser.add_argument(
+        "--congestion-control",
+        type=str,
+        default="reno",
+        help="the congestion control algorithm",
+    )
+    parser.add_argument(
+        "--delay", type=float, default=0.0, help="one-way link delay in seconds"
+    )
+    parser.add_argument(
+        "--loss", type=float, default=0.0, help="link loss rate, between 0 and 1"
+    )
+    parser.add_argument(
+        "--handshakes", type=int, default=100, help="number of handshakes"
+    )
+    parser.add_argument("--requests", type=int, default=1000, help="number of requests")
+    parser.add_argument(
+        "--request-size", type=int, default=100, help="size of stream requests"
+    )
+    parser.add_argument(
+        "--response-size", type=int, default=1000, help="size of H3 responses"
+    )
+    parser.add_argument(
+        "--size", type=int, default=10, help="bulk transfer size in MiB"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--json", type=str, help="write the results to a JSON file")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark %r" % name)
+
+    benchmark = Benchmark(args)
+    results = {}
+    for name in args.benchmarks or BENCHMARKS.keys():
+        results[name] = BENCHMARKS[name](benchmark)
+        print(
+            "%-10s %s"
+            % (
+                name,
+                " ".join(
+                    "%s=%.3f" % (k, v) if isinstance(v, float) else "%s=%s" % (k, v)
+                    for k, v in results[name].items()
+                ),
+            )
+        )
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(
+                {
+                    "options": vars(args),
+                    "python": platform.python_version(),
+                    "results": results,
+                },
+                fp,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmarks for RangeSet on workloads with many disjoint ranges.
+
+Usage: PYTHONPATH=src python benchmarks/rangeset.py [--ranges 10000]
+"""
+
+import argparse
+import random
+import time
+from typing import Callable
+
+from aioquic.quic.rangeset import RangeSet
+
+
+def sparse_rangeset(count: int) -> RangeSet:
+    """
+    Build a RangeSet with `count` ranges, each followed by a one-item gap.
+    """
+    rangeset = RangeSet()
+    for i in range(count):
+        rangeset.add(3 * i, 3 * i + 2)
+    return rangeset
+
+
+def bench(name: str, func: Callable[[], int]) -> None:
+    start = time.perf_counter()
+    operations = func()
+    elapsed = time.perf_counter() - start
+    print(
+        "%-24s %8d ops %10.3f ms %10.3f us/op"
+        % (name, operations, elapsed * 1000, elapsed * 1000000 / operations)
+    )
+
+
+def run(count: int, operations: int, seed: int) -> None:
+    rng = random.Random(seed)
+    positions = [rng.randrange(0, 3 * count) for i in range(operations)]
+
+    def add_in_order() -> int:
+        rangeset = RangeSet()
+        for i in range(count):
+            rangeset.add(i)
+        return count
+
+    def add_reordered() -> int:
+        rangeset = sparse_rangeset(count)
+        for pos in positions:
+            # fill gaps at random, merging neighbouring ranges
+            rangeset.add(pos - pos % 3 + 2)
+        return operations
+
+    def add_sparse() -> int:
+        rangeset = RangeSet()
+        for i in reversed(range(count)):
+            rangeset.add(3 * i, 3 * i + 2)
+        return count
+
+    def subtract_split() -> int:
+        rangeset = RangeSet([range(0, 3 * count)])
+        for pos in positions:
+            rangeset.subtract(pos, pos + 1)
+        return operations
+
+    def subtract_front() -> int:
+        rangeset = sparse_rangeset(count)
+        for i in range(count):
+            rangeset.subtract(3 * i, 3 * i + 2)
+        return count
+
+    def contains() -> int:
+        rangeset = sparse_rangeset(count)
+        for pos in positions:
+            pos in rangeset
+        return operations
+
+    print("%d ranges, %d random operations" % (count, operations))
+    bench("add in order", add_in_order)
+    bench("add reordered", add_reordered)
+    bench("add sparse, reversed", add_sparse)
+    bench("subtract split", subtract_split)
+    bench("subtract front", subtract_front)
+    bench("contains", contains)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RangeSet micro-benchmarks")
+    parser.add_argument(
+        "--ranges", type=int, default=10000, help="number of ranges in the set"
+    )
+    parser.add_argument(
+        "--operations", type=int, default=10000, help="number of random operations"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    run(count=args.ranges, operations=args.operations, seed=args.seed)
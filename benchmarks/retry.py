@@ -0,0 +1,97 @@
+"""
+Benchmarks for creating and validating retry tokens, comparing the AES-GCM
+tokens of QuicRetryTokenHandler with the RSA-OAEP tokens it used to create.
+
+Usage: PYTHONPATH=src python benchmarks/retry.py [--tokens 10000]
+"""
+
+import argparse
+import os
+import time
+from typing import Callable, List, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from aioquic.buffer import Buffer
+from aioquic.quic.connection import NetworkAddress
+from aioquic.quic.retry import QuicRetryTokenHandler, encode_address
+from aioquic.tls import pull_opaque, push_opaque
+
+OAEP = padding.OAEP(
+    mgf=padding.MGF1(hashes.SHA256()), algorithm=hashes.SHA256(), label=None
+)
+
+
+class RsaRetryTokenHandler:
+    """
+    The previous token handler, which encrypted tokens with a 1024-bit RSA key.
+    """
+
+    def __init__(self) -> None:
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+
+    def create_token(
+        self,
+        addr: NetworkAddress,
+        original_destination_connection_id: bytes,
+        retry_source_connection_id: bytes,
+    ) -> bytes:
+        buf = Buffer(capacity=512)
+        push_opaque(buf, 1, encode_address(addr))
+        push_opaque(buf, 1, original_destination_connection_id)
+        push_opaque(buf, 1, retry_source_connection_id)
+        return self._key.public_key().encrypt(buf.data, OAEP)
+
+    def validate_token(self, addr: NetworkAddress, token: bytes) -> Tuple[bytes, bytes]:
+        buf = Buffer(data=self._key.decrypt(token, OAEP))
+        encoded_addr = pull_opaque(buf, 1)
+        original_destination_connection_id = pull_opaque(buf, 1)
+        retry_source_connection_id = pull_opaque(buf, 1)
+        if encoded_addr != encode_address(addr):
+            raise ValueError("Remote address does not match.")
+        return original_destination_connection_id, retry_source_connection_id
+
+
+def bench(name: str, func: Callable[[], int]) -> None:
+    start = time.perf_counter()
+    operations = func()
+    elapsed = time.perf_counter() - start
+    print(
+        "%-24s %8d ops %10.3f ms %10.0f tokens/s"
+        % (name, operations, elapsed * 1000, operations / elapsed)
+    )
+
+
+def run(count: int) -> None:
+    addr = ("192.0.2.1", 4433)
+    connection_ids = [(os.urandom(8), os.urandom(8)) for i in range(count)]
+
+    for name, handler in [
+        ("rsa-oaep", RsaRetryTokenHandler()),
+        ("aes-gcm", QuicRetryTokenHandler()),
+    ]:
+        tokens: List[bytes] = []
+
+        def create() -> int:
+            for original_cid, retry_cid in connection_ids:
+                tokens.append(handler.create_token(addr, original_cid, retry_cid))
+            return count
+
+        def validate() -> int:
+            for token in tokens:
+                handler.validate_token(addr, token)
+            return count
+
+        bench("%s create" % name, create)
+        bench("%s validate" % name, validate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retry token benchmarks")
+    parser.add_argument(
+        "--tokens", type=int, default=10000, help="number of tokens to create"
+    )
+    args = parser.parse_args()
+
+    run(count=args.tokens)
@@ -0,0 +1,97 @@
+"""
+Benchmarks for re-arming connection timers on the event loop or on a timer
+wheel shared by all the connections.
+
+Each connection re-arms its timer as QuicConnectionProtocol.transmit does
+after sending a packet: the previous timer is cancelled and a new one is
+scheduled a few milliseconds later, as for pacing or delayed ACKs. Then a
+timer is armed for each connection and the event loop runs until they all
+fire.
+
+Usage: PYTHONPATH=src python benchmarks/timers.py [--connections 50000]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Callable, List, Optional, Union
+
+from aioquic.asyncio.timer import QuicTimerHandle, QuicTimerWheel
+
+Handle = Union[asyncio.TimerHandle, QuicTimerHandle]
+
+
+def bench(name: str, func: Callable[[], int]) -> None:
+    # measure CPU time, as the timers expire in real time
+    start = time.process_time()
+    operations = func()
+    elapsed = time.process_time() - start
+    print(
+        "%-24s %8d ops %10.3f ms %10.3f us/op"
+        % (name, operations, elapsed * 1000, elapsed * 1000000 / operations)
+    )
+
+
+def run(count: int, rearms: int, seed: int) -> None:
+    rng = random.Random(seed)
+    connections = [rng.randrange(count) for i in range(rearms)]
+    delays = [rng.uniform(0.001, 0.025) for i in range(rearms)]
+
+    loop = asyncio.new_event_loop()
+    wheel = QuicTimerWheel(loop)
+    fired = 0
+
+    def callback() -> None:
+        nonlocal fired
+        fired += 1
+
+    def rearm(call_at: Callable[[float, Callable], Handle]) -> int:
+        now = loop.time()
+        handles: List[Optional[Handle]] = [None] * count
+        for connection, delay in zip(connections, delays):
+            handle = handles[connection]
+            if handle is not None:
+                handle.cancel()
+            handles[connection] = call_at(now + delay, callback)
+        for handle in handles:
+            if handle is not None:
+                handle.cancel()
+        return rearms
+
+    def expire(call_at: Callable[[float, Callable], Handle]) -> int:
+        nonlocal fired
+        fired = 0
+        now = loop.time()
+        for delay in delays[:count]:
+            call_at(now + delay, callback)
+        loop.run_until_complete(asyncio.sleep(0.030))
+        assert fired == count, "not all timers fired"
+        return count
+
+    print("%d connections, %d timer re-arms" % (count, rearms))
+    bench("event loop re-arm", lambda: rearm(loop.call_at))
+    print("  event loop heap: %d handles" % len(loop._scheduled))  # type: ignore
+    loop.run_until_complete(asyncio.sleep(0))
+
+    bench("timer wheel re-arm", lambda: rearm(wheel.call_at))
+    print("  event loop heap: %d handles" % len(loop._scheduled))  # type: ignore
+    loop.run_until_complete(asyncio.sleep(0.030))
+
+    bench("event loop expire", lambda: expire(loop.call_at))
+    bench("timer wheel expire", lambda: expire(wheel.call_at))
+    loop.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connection timer benchmarks")
+    parser.add_argument(
+        "--connections", type=int, default=50000, help="number of connections"
+    )
+    parser.add_argument(
+        "--rearms", type=int, default=500000, help="number of timer re-arms"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    run(count=args.connections, rearms=args.rearms, seed=args.seed)
@@ -60,7 +60,14 @@ setuptools.setup(
     ],
     package_dir={"": "src"},
     package_data={"aioquic": ["py.typed", "_buffer.pyi", "_crypto.pyi"]},
-    packages=["aioquic", "aioquic.asyncio", "aioquic.h0", "aioquic.h3", "aioquic.quic"],
+    packages=[
+        "aioquic",
+        "aioquic.asyncio",
+        "aioquic.h0",
+        "aioquic.h3",
+        "aioquic.quic",
+        "aioquic.quic.congestion",
+    ],
     install_requires=[
         "certifi",
         "cryptography >= 3.1",
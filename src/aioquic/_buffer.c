@@ -189,15 +189,19 @@ Buffer_pull_uint_var(BufferObject *self, PyObject *args)
 static PyObject *
 Buffer_push_bytes(BufferObject *self, PyObject *args)
 {
-    const unsigned char *data;
-    Py_ssize_t data_len;
-    if (!PyArg_ParseTuple(args, "y#", &data, &data_len))
+    Py_buffer data;
+    if (!PyArg_ParseTuple(args, "y*", &data))
         return NULL;
 
-    CHECK_WRITE_BOUNDS(self, data_len)
+    if (self->pos + data.len > self->end) {
+        PyBuffer_Release(&data);
+        PyErr_SetString(BufferWriteError, "Write out of bounds");
+        return NULL;
+    }
 
-    memcpy(self->pos, data, data_len);
-    self->pos += data_len;
+    memcpy(self->pos, data.buf, data.len);
+    self->pos += data.len;
+    PyBuffer_Release(&data);
     Py_RETURN_NONE;
 }
 
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Union
 
 class BufferReadError(ValueError): ...
 class BufferWriteError(ValueError): ...
@@ -19,7 +19,7 @@ class Buffer:
     def pull_uint32(self) -> int: ...
     def pull_uint64(self) -> int: ...
     def pull_uint_var(self) -> int: ...
-    def push_bytes(self, value: bytes) -> None: ...
+    def push_bytes(self, value: Union[bytes, bytearray, memoryview]) -> None: ...
     def push_uint8(self, value: int) -> None: ...
     def push_uint16(self, value: int) -> None: ...
     def push_uint32(self, v: int) -> None: ...
@@ -1,3 +1,4 @@
 from .client import connect  # noqa
 from .protocol import QuicConnectionProtocol  # noqa
 from .server import serve  # noqa
+from .workers import serve_workers  # noqa
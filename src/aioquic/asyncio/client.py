@@ -5,9 +5,10 @@ from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Callable, Optional, cast
 
 from ..quic.configuration import QuicConfiguration
-from ..quic.connection import QuicConnection
+from ..quic.connection import QuicConnection, QuicTokenHandler
 from ..tls import SessionTicketHandler
 from .protocol import QuicConnectionProtocol, QuicStreamHandler
+from .transport import create_datagram_endpoint
 
 __all__ = ["connect"]
 
@@ -25,6 +26,7 @@ async def connect(
     create_protocol: Optional[Callable] = QuicConnectionProtocol,
     session_ticket_handler: Optional[SessionTicketHandler] = None,
     stream_handler: Optional[QuicStreamHandler] = None,
+    token_handler: Optional[QuicTokenHandler] = None,
     wait_connected: bool = True,
     local_port: int = 0,
 ) -> AsyncGenerator[QuicConnectionProtocol, None]:
@@ -48,6 +50,10 @@ async def connect(
     * ``stream_handler`` is a callback which is invoked whenever a stream is
       created. It must accept two arguments: a :class:`asyncio.StreamReader`
       and a :class:`asyncio.StreamWriter`.
+    * ``token_handler`` is a callback which is invoked when the server sends an
+      address validation token. Storing the token and passing it as the
+      configuration's ``token`` when connecting to the same server again
+      spares a retry.
     * ``local_port`` is the UDP port number that this client wants to bind.
     """
     loop = asyncio.get_event_loop()
@@ -72,7 +78,9 @@ async def connect(
     if configuration.server_name is None:
         configuration.server_name = server_name
     connection = QuicConnection(
-        configuration=configuration, session_ticket_handler=session_ticket_handler
+        configuration=configuration,
+        session_ticket_handler=session_ticket_handler,
+        token_handler=token_handler,
     )
 
     # explicitly enable IPv4/IPv6 dual stack
@@ -86,7 +94,7 @@ async def connect(
         if not completed:
             sock.close()
     # connect
-    transport, protocol = await loop.create_datagram_endpoint(
+    transport, protocol = await create_datagram_endpoint(
         lambda: create_protocol(connection, stream_handler=stream_handler),
         sock=sock,
     )
@@ -1,8 +1,11 @@
 import asyncio
-from typing import Any, Callable, Dict, Optional, Text, Tuple, Union, cast
+from typing import Any, Callable, Dict, List, Optional, Set, Text, Tuple, Union, cast
 
 from ..quic import events
 from ..quic.connection import NetworkAddress, QuicConnection
+from ..quic.packet import ECN_NOT_ECT
+from .timer import QuicTimerHandle, QuicTimerWheel
+from .transport import QuicDatagramTransport
 
 QuicConnectionIdHandler = Callable[[bytes], None]
 QuicStreamHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], None]
@@ -10,7 +13,10 @@ QuicStreamHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], None]
 
 class QuicConnectionProtocol(asyncio.DatagramProtocol):
     def __init__(
-        self, quic: QuicConnection, stream_handler: Optional[QuicStreamHandler] = None
+        self,
+        quic: QuicConnection,
+        stream_handler: Optional[QuicStreamHandler] = None,
+        timer_wheel: Optional[QuicTimerWheel] = None,
     ):
         loop = asyncio.get_event_loop()
 
@@ -20,9 +26,12 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         self._loop = loop
         self._ping_waiters: Dict[int, asyncio.Future[None]] = {}
         self._quic = quic
+        self._stream_flow_controls: Dict[int, asyncio.streams.FlowControlMixin] = {}
         self._stream_readers: Dict[int, asyncio.StreamReader] = {}
-        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stream_writes_paused: Set[int] = set()
+        self._timer: Optional[Union[asyncio.TimerHandle, QuicTimerHandle]] = None
         self._timer_at: Optional[float] = None
+        self._timer_wheel = timer_wheel
         self._transmit_task: Optional[asyncio.Handle] = None
         self._transport: Optional[asyncio.DatagramTransport] = None
 
@@ -98,9 +107,13 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         """
         self._transmit_task = None
 
-        # send datagrams
-        for data, addr in self._quic.datagrams_to_send(now=self._loop.time()):
-            self._transport.sendto(data, addr)
+        # send datagrams, marking them with the ECN codepoint if supported
+        datagrams = self._quic.datagrams_to_send(now=self._loop.time())
+        if isinstance(self._transport, QuicDatagramTransport):
+            self._transport.sendto_many(datagrams, ecn=self._quic.ecn_codepoint)
+        else:
+            for data, addr in datagrams:
+                self._transport.sendto(data, addr)
 
         # re-arm timer
         timer_at = self._quic.get_timer()
@@ -108,7 +121,10 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
             self._timer.cancel()
             self._timer = None
         if self._timer is None and timer_at is not None:
-            self._timer = self._loop.call_at(timer_at, self._handle_timer)
+            if self._timer_wheel is not None:
+                self._timer = self._timer_wheel.call_at(timer_at, self._handle_timer)
+            else:
+                self._timer = self._loop.call_at(timer_at, self._handle_timer)
         self._timer_at = timer_at
 
     async def wait_closed(self) -> None:
@@ -131,8 +147,32 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         self._transport = cast(asyncio.DatagramTransport, transport)
 
-    def datagram_received(self, data: Union[bytes, Text], addr: NetworkAddress) -> None:
-        self._quic.receive_datagram(cast(bytes, data), addr, now=self._loop.time())
+    def datagram_received(
+        self, data: Union[bytes, Text], addr: NetworkAddress, ecn: int = ECN_NOT_ECT
+    ) -> None:
+        self._quic.receive_datagram(
+            cast(bytes, data), addr, now=self._loop.time(), ecn=ecn
+        )
+        self._process_events()
+        self.transmit()
+
+    def datagrams_received(
+        self, datagrams: List[Tuple[bytes, NetworkAddress, int]]
+    ) -> None:
+        """
+        Handle a batch of `(data, addr, ecn)` datagrams, then send once.
+
+        If a subclass overrides :meth:`datagram_received`, it is called for
+        each datagram instead.
+        """
+        if type(self).datagram_received is not QuicConnectionProtocol.datagram_received:
+            for data, addr, ecn in datagrams:
+                self.datagram_received(data, addr, ecn=ecn)
+            return
+
+        now = self._loop.time()
+        for data, addr, ecn in datagrams:
+            self._quic.receive_datagram(data, addr, now=now, ecn=ecn)
         self._process_events()
         self.transmit()
 
@@ -163,9 +203,17 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         self, stream_id: int
     ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
         adapter = QuicStreamAdapter(self, stream_id)
+        flow_control = asyncio.streams.FlowControlMixin(loop=self._loop)
         reader = asyncio.StreamReader()
-        writer = asyncio.StreamWriter(adapter, None, reader, self._loop)
+        writer = asyncio.StreamWriter(adapter, flow_control, reader, self._loop)
+        self._stream_flow_controls[stream_id] = flow_control
         self._stream_readers[stream_id] = reader
+
+        # apply the default write buffer limits, unless the stream is receive-only
+        try:
+            adapter.set_write_buffer_limits()
+        except ValueError:
+            pass
         return reader, writer
 
     def _handle_timer(self) -> None:
@@ -197,6 +245,11 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
                     waiter.set_exception(ConnectionError)
                 self._ping_waiters.clear()
 
+                # abort stream writers waiting to drain
+                for flow_control in self._stream_flow_controls.values():
+                    flow_control.connection_lost(None)
+                self._stream_writes_paused.clear()
+
                 self._closed.set()
             elif isinstance(event, events.HandshakeCompleted):
                 if self._connected_waiter is not None:
@@ -208,9 +261,21 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
                 waiter = self._ping_waiters.pop(event.uid, None)
                 if waiter is not None:
                     waiter.set_result(None)
+            elif isinstance(event, events.StreamWritable):
+                self._resume_stream_writing(event.stream_id)
             self.quic_event_received(event)
             event = self._quic.next_event()
 
+    def _pause_stream_writing(self, stream_id: int) -> None:
+        if stream_id not in self._stream_writes_paused:
+            self._stream_writes_paused.add(stream_id)
+            self._stream_flow_controls[stream_id].pause_writing()
+
+    def _resume_stream_writing(self, stream_id: int) -> None:
+        if stream_id in self._stream_writes_paused:
+            self._stream_writes_paused.discard(stream_id)
+            self._stream_flow_controls[stream_id].resume_writing()
+
     def _transmit_soon(self) -> None:
         if self._transmit_task is None:
             self._transmit_task = self._loop.call_soon(self.transmit)
@@ -220,10 +285,17 @@ class QuicStreamAdapter(asyncio.Transport):
     def __init__(self, protocol: QuicConnectionProtocol, stream_id: int):
         self.protocol = protocol
         self.stream_id = stream_id
+        self._eof_written = False
 
     def can_write_eof(self) -> bool:
         return True
 
+    def get_write_buffer_size(self) -> int:
+        """
+        Return the number of bytes written to the stream but not acknowledged yet.
+        """
+        return self.protocol._quic.get_write_buffer_size(self.stream_id)
+
     def get_extra_info(self, name: str, default: Any = None) -> Any:
         """
         Get information about the underlying QUIC stream.
@@ -231,10 +303,29 @@ class QuicStreamAdapter(asyncio.Transport):
         if name == "stream_id":
             return self.stream_id
 
+    def is_closing(self) -> bool:
+        return self._eof_written or self.protocol._closed.is_set()
+
+    def set_write_buffer_limits(
+        self, high: Optional[int] = None, low: Optional[int] = None
+    ) -> None:
+        """
+        Set the high and low watermarks of the stream's write buffer.
+
+        :meth:`asyncio.StreamWriter.drain` blocks while more than `high` bytes
+        are buffered, until no more than `low` bytes remain.
+        """
+        self.protocol._quic.set_write_buffer_limits(
+            high=high, low=low, stream_id=self.stream_id
+        )
+
     def write(self, data):
         self.protocol._quic.send_stream_data(self.stream_id, data)
+        if not self.protocol._quic.is_stream_writable(self.stream_id):
+            self.protocol._pause_stream_writing(self.stream_id)
         self.protocol._transmit_soon()
 
     def write_eof(self):
+        self._eof_written = True
         self.protocol._quic.send_stream_data(self.stream_id, b"", end_stream=True)
         self.protocol._transmit_soon()
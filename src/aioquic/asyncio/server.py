@@ -1,23 +1,60 @@
 import asyncio
 import os
+from concurrent.futures import Executor
 from functools import partial
-from typing import Callable, Dict, Optional, Text, Union, cast
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple, Union, cast
+
+from cryptography.hazmat.primitives.serialization import (
+    Encoding,
+    NoEncryption,
+    PrivateFormat,
+    load_der_private_key,
+)
 
 from ..buffer import Buffer
 from ..quic.configuration import QuicConfiguration
 from ..quic.connection import NetworkAddress, QuicConnection
 from ..quic.packet import (
+    ECN_NOT_ECT,
     PACKET_TYPE_INITIAL,
+    QuicErrorCode,
+    QuicFrameType,
     encode_quic_retry,
     encode_quic_version_negotiation,
     pull_quic_header,
 )
 from ..quic.retry import QuicRetryTokenHandler
-from ..tls import SessionTicketFetcher, SessionTicketHandler
+from ..tls import (
+    SessionTicketFetcher,
+    SessionTicketHandler,
+    SignatureAlgorithm,
+    signature_algorithm_params,
+)
 from .protocol import QuicConnectionProtocol, QuicStreamHandler
+from .timer import QuicTimerWheel
+from .transport import create_datagram_endpoint
 
 __all__ = ["serve"]
 
+# private keys loaded by the signing workers, by DER encoding
+_signing_keys: Dict[bytes, Any] = {}
+
+
+def _sign_certificate_verify(
+    private_key: bytes, signature_algorithm: SignatureAlgorithm, data: bytes
+) -> bytes:
+    """
+    Sign the data of a CertificateVerify message in a signing worker.
+
+    The private key is passed in DER form, so that it can be sent to a process.
+    """
+    key = _signing_keys.get(private_key)
+    if key is None:
+        key = _signing_keys[private_key] = load_der_private_key(
+            private_key, password=None
+        )
+    return key.sign(data, *signature_algorithm_params(signature_algorithm))
+
 
 class QuicServer(asyncio.DatagramProtocol):
     def __init__(
@@ -28,7 +65,9 @@ class QuicServer(asyncio.DatagramProtocol):
         session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
         session_ticket_handler: Optional[SessionTicketHandler] = None,
         retry: bool = False,
+        signing_executor: Optional[Executor] = None,
         stream_handler: Optional[QuicStreamHandler] = None,
+        timer_wheel: bool = False,
     ) -> None:
         self._configuration = configuration
         self._create_protocol = create_protocol
@@ -36,26 +75,77 @@ class QuicServer(asyncio.DatagramProtocol):
         self._protocols: Dict[bytes, QuicConnectionProtocol] = {}
         self._session_ticket_fetcher = session_ticket_fetcher
         self._session_ticket_handler = session_ticket_handler
+        self._signing_executor = signing_executor
         self._transport: Optional[asyncio.DatagramTransport] = None
 
         self._stream_handler = stream_handler
 
         if retry:
-            self._retry = QuicRetryTokenHandler()
+            self._retry = QuicRetryTokenHandler(secret=configuration.token_secret)
         else:
             self._retry = None
 
-    def close(self):
+        if signing_executor is not None:
+            self._signing_key = configuration.private_key.private_bytes(
+                encoding=Encoding.DER,
+                format=PrivateFormat.PKCS8,
+                encryption_algorithm=NoEncryption(),
+            )
+
+        if timer_wheel:
+            self._timer_wheel: Optional[QuicTimerWheel] = QuicTimerWheel(self._loop)
+        else:
+            self._timer_wheel = None
+
+    def close(self) -> None:
         for protocol in set(self._protocols.values()):
             protocol.close()
         self._protocols.clear()
+        if self._timer_wheel is not None:
+            self._timer_wheel.close()
         self._transport.close()
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         self._transport = cast(asyncio.DatagramTransport, transport)
 
-    def datagram_received(self, data: Union[bytes, Text], addr: NetworkAddress) -> None:
-        data = cast(bytes, data)
+    def datagram_received(
+        self, data: Union[bytes, Text], addr: NetworkAddress, ecn: int = ECN_NOT_ECT
+    ) -> None:
+        protocol = self._route_datagram(cast(bytes, data), addr, ecn)
+        if protocol is not None:
+            protocol.datagram_received(data, addr, ecn=ecn)
+
+    def datagrams_received(
+        self, datagrams: List[Tuple[bytes, NetworkAddress, int]]
+    ) -> None:
+        """
+        Handle a batch of `(data, addr, ecn)` datagrams.
+
+        Each connection is handed all of its datagrams at once, so that it only
+        sends after processing the whole batch. If a subclass overrides
+        :meth:`datagram_received`, it is called for each datagram instead.
+        """
+        if type(self).datagram_received is not QuicServer.datagram_received:
+            for data, addr, ecn in datagrams:
+                self.datagram_received(data, addr, ecn=ecn)
+            return
+
+        batches: Dict[QuicConnectionProtocol, List[Tuple[bytes, NetworkAddress, int]]]
+        batches = {}
+        for data, addr, ecn in datagrams:
+            protocol = self._route_datagram(data, addr, ecn)
+            if protocol is not None:
+                batches.setdefault(protocol, []).append((data, addr, ecn))
+        for protocol, batch in batches.items():
+            protocol.datagrams_received(batch)
+
+    def _route_datagram(
+        self, data: bytes, addr: NetworkAddress, ecn: int
+    ) -> Optional[QuicConnectionProtocol]:
+        """
+        Return the protocol which handles the datagram, creating a new
+        connection if needed.
+        """
         buf = Buffer(data=data)
 
         try:
@@ -63,7 +153,7 @@ class QuicServer(asyncio.DatagramProtocol):
                 buf, host_cid_length=self._configuration.connection_id_length
             )
         except ValueError:
-            return
+            return None
 
         # version negotiation
         if (
@@ -78,7 +168,7 @@ class QuicServer(asyncio.DatagramProtocol):
                 ),
                 addr,
             )
-            return
+            return None
 
         protocol = self._protocols.get(header.destination_cid, None)
         original_destination_connection_id: Optional[bytes] = None
@@ -88,9 +178,12 @@ class QuicServer(asyncio.DatagramProtocol):
             and len(data) >= 1200
             and header.packet_type == PACKET_TYPE_INITIAL
         ):
-            # retry
-            if self._retry is not None:
-                if not header.token:
+            # retry, unless the client presents a token from a previous
+            # connection's NEW_TOKEN frame
+            if self._retry is not None and not self._retry.validate_new_token(
+                addr, header.token
+            ):
+                if not self._retry.is_retry_token(header.token):
                     # create a retry token
                     source_cid = os.urandom(8)
                     self._transport.sendto(
@@ -105,7 +198,7 @@ class QuicServer(asyncio.DatagramProtocol):
                         ),
                         addr,
                     )
-                    return
+                    return None
                 else:
                     # validate retry token
                     try:
@@ -114,7 +207,7 @@ class QuicServer(asyncio.DatagramProtocol):
                             retry_source_connection_id,
                         ) = self._retry.validate_token(addr, header.token)
                     except ValueError:
-                        return
+                        return None
             else:
                 original_destination_connection_id = header.destination_cid
 
@@ -125,10 +218,20 @@ class QuicServer(asyncio.DatagramProtocol):
                 retry_source_connection_id=retry_source_connection_id,
                 session_ticket_fetcher=self._session_ticket_fetcher,
                 session_ticket_handler=self._session_ticket_handler,
+                signature_request_handler=(
+                    partial(self._request_signature, cid=header.destination_cid)
+                    if self._signing_executor is not None
+                    else None
+                ),
+                token_issuer=(
+                    self._retry.create_new_token if self._retry is not None else None
+                ),
             )
-            protocol = self._create_protocol(
-                connection, stream_handler=self._stream_handler
-            )
+            # factories which predate timer wheels are not passed one
+            protocol_kwargs: Dict[str, Any] = {"stream_handler": self._stream_handler}
+            if self._timer_wheel is not None:
+                protocol_kwargs["timer_wheel"] = self._timer_wheel
+            protocol = self._create_protocol(connection, **protocol_kwargs)
             protocol.connection_made(self._transport)
 
             # register callbacks
@@ -145,8 +248,7 @@ class QuicServer(asyncio.DatagramProtocol):
             self._protocols[header.destination_cid] = protocol
             self._protocols[connection.host_cid] = protocol
 
-        if protocol is not None:
-            protocol.datagram_received(data, addr)
+        return protocol
 
     def _connection_id_issued(self, cid: bytes, protocol: QuicConnectionProtocol):
         self._protocols[cid] = protocol
@@ -162,6 +264,37 @@ class QuicServer(asyncio.DatagramProtocol):
             if proto == protocol:
                 del self._protocols[cid]
 
+    def _request_signature(
+        self, data: bytes, signature_algorithm: SignatureAlgorithm, cid: bytes
+    ) -> None:
+        # the connection is registered under its original destination CID
+        # before it handles any datagram
+        protocol = self._protocols[cid]
+        future = self._loop.run_in_executor(
+            self._signing_executor,
+            _sign_certificate_verify,
+            self._signing_key,
+            signature_algorithm,
+            data,
+        )
+        future.add_done_callback(partial(self._signature_received, protocol=protocol))
+
+    def _signature_received(
+        self, future: asyncio.Future, protocol: QuicConnectionProtocol
+    ) -> None:
+        try:
+            signature = future.result()
+        except (asyncio.CancelledError, Exception) as exc:
+            protocol._quic.close(
+                error_code=QuicErrorCode.INTERNAL_ERROR,
+                frame_type=QuicFrameType.CRYPTO,
+                reason_phrase="Signing failed: %r" % exc,
+            )
+        else:
+            protocol._quic.handle_signature(signature)
+        protocol._process_events()
+        protocol.transmit()
+
 
 async def serve(
     host: str,
@@ -172,7 +305,9 @@ async def serve(
     session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
     session_ticket_handler: Optional[SessionTicketHandler] = None,
     retry: bool = False,
+    signing_executor: Optional[Executor] = None,
     stream_handler: QuicStreamHandler = None,
+    timer_wheel: bool = False,
 ) -> QuicServer:
     """
     Start a QUIC server at the given `host` and `port`.
@@ -193,23 +328,35 @@ async def serve(
       engine when a new session ticket is issued. It should store the session
       ticket for future lookup.
     * ``retry`` specifies whether client addresses should be validated prior to
-      the cryptographic handshake using a retry packet.
+      the cryptographic handshake using a retry packet. Clients are then sent a
+      token in a NEW_TOKEN frame, which lets their next connections skip the
+      retry.
+    * ``signing_executor`` is a :class:`concurrent.futures.Executor` which
+      computes the server's CertificateVerify signatures, so that the event
+      loop keeps serving the other connections meanwhile. A connection resumes
+      its handshake when its signature is ready, having handled the datagrams
+      received in the meantime. Both thread and process pools can be used.
     * ``stream_handler`` is a callback which is invoked whenever a stream is
       created. It must accept two arguments: a :class:`asyncio.StreamReader`
       and a :class:`asyncio.StreamWriter`.
+    * ``timer_wheel`` specifies whether the connections' timers should be
+      scheduled on a timer wheel shared by the server, with a granularity of
+      one millisecond, rather than on the event loop. This reduces the cost of
+      re-arming timers when serving many connections. The wheel is passed to
+      `create_protocol` as a ``timer_wheel`` keyword argument.
     """
 
-    loop = asyncio.get_event_loop()
-
-    _, protocol = await loop.create_datagram_endpoint(
+    _, protocol = await create_datagram_endpoint(
         lambda: QuicServer(
             configuration=configuration,
             create_protocol=create_protocol,
             session_ticket_fetcher=session_ticket_fetcher,
             session_ticket_handler=session_ticket_handler,
             retry=retry,
+            signing_executor=signing_executor,
             stream_handler=stream_handler,
+            timer_wheel=timer_wheel,
         ),
         local_addr=(host, port),
     )
-    return protocol
+    return cast(QuicServer, protocol)
@@ -0,0 +1,214 @@
+import asyncio
+import math
+from typing import Callable, List, Optional, Set
+
+__all__ = ["QuicTimerWheel"]
+
+# each level of the wheel has 64 slots, and a slot of one level spans a whole
+# turn of the level below it
+WHEEL_BITS = 6
+WHEEL_LEVELS = 4
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SIZE - 1
+
+# tolerance for rounding errors when converting times to ticks
+TICK_EPSILON = 1e-3
+
+# later timers are clamped to the last slot, and placed again when it expires
+WHEEL_MAX_DELTA = (1 << (WHEEL_BITS * WHEEL_LEVELS)) - 1
+
+
+class QuicTimerHandle:
+    """
+    A timer scheduled on a :class:`QuicTimerWheel`.
+    """
+
+    __slots__ = ("callback", "tick", "_slot", "_wheel")
+
+    def __init__(self, wheel: "QuicTimerWheel", tick: int, callback: Callable) -> None:
+        self.callback = callback
+        self.tick = tick
+        self._slot: Optional[Set["QuicTimerHandle"]] = None
+        self._wheel = wheel
+
+    def cancel(self) -> None:
+        """
+        Cancel the timer, if it has not fired yet.
+        """
+        if self._slot is not None:
+            self._slot.discard(self)
+            self._slot = None
+            self._wheel._count -= 1
+
+
+class QuicTimerWheel:
+    """
+    A hierarchical timer wheel which fires many timers from a single event loop
+    timer.
+
+    Timers are rounded up to the wheel's `granularity`, in seconds. The first
+    level holds the timers due within 64 ticks, and each of the next three
+    levels spans 64 times longer than the one below it. Timers move down a
+    level when their slot comes up, and all the timers due at a given tick fire
+    in the same event loop callback.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, granularity: float = 0.001
+    ) -> None:
+        self._count = 0
+        self._granularity = granularity
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._handle_tick: Optional[int] = None
+        self._levels: List[List[Set[QuicTimerHandle]]] = [
+            [set() for i in range(WHEEL_SIZE)] for level in range(WHEEL_LEVELS)
+        ]
+        self._loop = loop
+        self._tick = self._current_tick()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def call_at(self, when: float, callback: Callable) -> QuicTimerHandle:
+        """
+        Arrange for `callback` to be called at the given event loop time.
+        """
+        if not self._count:
+            # skip the ticks during which the wheel was empty
+            self._tick = max(self._tick, self._current_tick())
+
+        handle = QuicTimerHandle(self, max(self._due_tick(when), self._tick), callback)
+        self._place(handle)
+        self._count += 1
+        if self._handle_tick is None or handle.tick < self._handle_tick:
+            self._arm(handle.tick)
+        return handle
+
+    def close(self) -> None:
+        """
+        Cancel all the timers.
+        """
+        for level in self._levels:
+            for slot in level:
+                for handle in slot:
+                    handle._slot = None
+                slot.clear()
+        self._count = 0
+        self._disarm()
+
+    def _arm(self, tick: int) -> None:
+        self._disarm()
+        self._handle = self._loop.call_at(tick * self._granularity, self._run)
+        self._handle_tick = tick
+
+    def _cascade(self, level: int) -> None:
+        """
+        Move the timers of the current slot of `level` down to lower levels.
+        """
+        index = (self._tick >> (WHEEL_BITS * level)) & WHEEL_MASK
+        slot = self._levels[level][index]
+        if slot:
+            self._levels[level][index] = set()
+            for handle in slot:
+                self._place(handle)
+
+    def _current_tick(self) -> int:
+        """
+        Return the last tick which the event loop time has reached.
+        """
+        return math.floor(self._loop.time() / self._granularity + TICK_EPSILON)
+
+    def _disarm(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self._handle_tick = None
+
+    def _due_tick(self, when: float) -> int:
+        """
+        Return the first tick at or after the given time.
+        """
+        return math.ceil(when / self._granularity - TICK_EPSILON)
+
+    def _next_tick(self) -> int:
+        """
+        Return the next tick at which timers fire or move down a level.
+
+        Ticks before it can be skipped.
+        """
+        next_tick = None
+        for level in range(WHEEL_LEVELS):
+            shift = WHEEL_BITS * level
+            index = (self._tick >> shift) & WHEEL_MASK
+            turn = (self._tick >> shift) - index
+
+            # the current slot of a higher level was already emptied, unless
+            # the tick is the first one of the slot
+            start = index
+            if self._tick & ((1 << shift) - 1):
+                start += 1
+
+            slots = self._levels[level]
+            for i in range(start, WHEEL_SIZE):
+                if slots[i]:
+                    tick = (turn + i) << shift
+                    break
+            else:
+                if any(slots[:start]):
+                    # the slots are reached in the next turn of the level
+                    tick = (turn + WHEEL_SIZE) << shift
+                else:
+                    continue
+            if next_tick is None or tick < next_tick:
+                next_tick = tick
+        assert next_tick is not None, "the wheel is empty"
+        return next_tick
+
+    def _place(self, handle: QuicTimerHandle) -> None:
+        delta = min(handle.tick - self._tick, WHEEL_MAX_DELTA)
+        level = 0
+        while delta >= WHEEL_SIZE:
+            delta >>= WHEEL_BITS
+            level += 1
+        tick = min(handle.tick, self._tick + WHEEL_MAX_DELTA)
+        slot = self._levels[level][(tick >> (WHEEL_BITS * level)) & WHEEL_MASK]
+        slot.add(handle)
+        handle._slot = slot
+
+    def _run(self) -> None:
+        self._handle = None
+        self._handle_tick = None
+
+        now_tick = self._current_tick()
+        while self._count and self._tick <= now_tick:
+            # at the start of a turn, bring the next timers down a level,
+            # starting from the highest level
+            level = 1
+            while (
+                level < WHEEL_LEVELS
+                and (self._tick >> (WHEEL_BITS * (level - 1))) & WHEEL_MASK == 0
+            ):
+                level += 1
+            for level in range(level - 1, 0, -1):
+                self._cascade(level)
+
+            index = self._tick & WHEEL_MASK
+            slot = self._levels[0][index]
+            self._levels[0][index] = set()
+            self._tick += 1
+            while slot:
+                # callbacks may cancel the other timers of the slot
+                handle = slot.pop()
+                handle._slot = None
+                self._count -= 1
+                handle.callback()
+
+            # skip the ticks at which nothing happens
+            if self._count:
+                self._tick = min(self._next_tick(), now_tick + 1)
+
+        if self._count:
+            # callbacks may have armed the loop timer for a later tick
+            tick = self._next_tick()
+            if self._handle_tick is None or tick < self._handle_tick:
+                self._arm(tick)
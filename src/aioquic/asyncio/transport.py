@@ -0,0 +1,359 @@
+import asyncio
+import errno
+import socket
+import struct
+import sys
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple, Union, cast
+
+from ..quic.connection import NetworkAddress
+from ..quic.packet import ECN_MASK, ECN_NOT_ECT
+
+__all__ = ["QuicDatagramTransport", "create_datagram_endpoint"]
+
+# reading and writing the ECN codepoint relies on Linux socket options
+ECN_SUPPORTED = sys.platform.startswith("linux")
+
+# not all Python versions expose these constants
+IP_RECVTOS = getattr(socket, "IP_RECVTOS", 13)
+IPV6_RECVTCLASS = getattr(socket, "IPV6_RECVTCLASS", 66)
+IPV6_TCLASS = getattr(socket, "IPV6_TCLASS", 67)
+
+# set the Don't Fragment bit but ignore the kernel's path MTU, as path MTU
+# discovery is performed by QUIC itself
+IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10)
+IP_PMTUDISC_PROBE = getattr(socket, "IP_PMTUDISC_PROBE", 3)
+IPV6_MTU_DISCOVER = getattr(socket, "IPV6_MTU_DISCOVER", 23)
+IPV6_PMTUDISC_PROBE = getattr(socket, "IPV6_PMTUDISC_PROBE", 3)
+
+# UDP generic segmentation and receive offload, since Linux 4.18 and 5.0
+SOL_UDP = getattr(socket, "SOL_UDP", 17)
+UDP_GRO = getattr(socket, "UDP_GRO", 104)
+UDP_SEGMENT = getattr(socket, "UDP_SEGMENT", 103)
+UDP_MAX_SEGMENTS = 64
+UDP_MAX_SEGMENTED_SIZE = 65000
+
+# errors which mean the socket or the interface cannot segment datagrams
+GSO_ERRORS = (errno.EINVAL, errno.EIO, errno.ENOPROTOOPT, errno.EOPNOTSUPP)
+
+# the socket is drained of at most this many reads before yielding
+RECEIVE_BATCH = 64
+RECEIVE_SIZE = 65536
+
+ProtocolFactory = Callable[[], asyncio.DatagramProtocol]
+
+
+class QuicDatagramTransport(asyncio.DatagramTransport):
+    """
+    A datagram transport which exposes the ECN codepoint of the IP header.
+
+    Each time the socket is readable, it is drained of pending datagrams, which
+    the kernel may have coalesced with UDP generic receive offload. Protocols
+    opt into receiving the ECN codepoint by defining a `datagrams_received`
+    method, which is called once with a list of `(data, addr, ecn)` tuples.
+    Other protocols have their standard `datagram_received(data, addr)` method
+    called for each datagram. :meth:`sendto` accepts the codepoint with which
+    to mark outgoing datagrams.
+
+    Where the kernel supports UDP generic segmentation offload,
+    :meth:`sendto_many` hands runs of equal-size datagrams to the kernel in a
+    single system call.
+
+    Outgoing datagrams have the Don't Fragment bit set, so that path MTU probes
+    which are too large get dropped rather than fragmented.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        sock: socket.socket,
+        protocol: asyncio.DatagramProtocol,
+        waiter: Optional[asyncio.Future] = None,
+    ) -> None:
+        super().__init__(extra={"socket": sock, "sockname": sock.getsockname()})
+        self._buffer: Deque[Tuple[bytes, NetworkAddress, int]] = deque()
+        self._buffer_size = 0
+        self._closing = False
+        self._loop = loop
+        self._protocol = protocol
+        self._sock = sock
+
+        # ask for the TOS / traffic class of received datagrams, and never
+        # fragment sent datagrams
+        if sock.family == socket.AF_INET6:
+            sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVTCLASS, 1)
+            sock.setsockopt(socket.IPPROTO_IPV6, IPV6_MTU_DISCOVER, IPV6_PMTUDISC_PROBE)
+            if not sock.getsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY):
+                sock.setsockopt(socket.IPPROTO_IP, IP_RECVTOS, 1)
+                sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE)
+        else:
+            sock.setsockopt(socket.IPPROTO_IP, IP_RECVTOS, 1)
+            sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_PROBE)
+        self._ancillary_size = 3 * socket.CMSG_SPACE(4)
+
+        try:
+            sock.setsockopt(SOL_UDP, UDP_GRO, 1)
+        except OSError:
+            pass
+
+        try:
+            sock.getsockopt(SOL_UDP, UDP_SEGMENT)
+            self._gso_enabled = True
+        except OSError:
+            self._gso_enabled = False
+
+        loop.call_soon(protocol.connection_made, self)
+        loop.call_soon(loop.add_reader, sock.fileno(), self._read_ready)
+        if waiter is not None:
+            loop.call_soon(_set_result_unless_cancelled, waiter)
+
+    def abort(self) -> None:
+        self._force_close(None)
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._sock.fileno())
+        if not self._buffer:
+            self._loop.call_soon(self._call_connection_lost, None)
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        return self._protocol
+
+    def get_write_buffer_size(self) -> int:
+        return self._buffer_size
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def sendto(
+        self,
+        data: Union[bytes, bytearray, memoryview],
+        addr: Optional[NetworkAddress] = None,
+        ecn: int = ECN_NOT_ECT,
+    ) -> None:
+        """
+        Send a datagram to `addr`, marked with the given ECN codepoint.
+        """
+        if self._closing:
+            return
+
+        if not self._buffer:
+            try:
+                self._send(data, addr, ecn)
+                return
+            except (BlockingIOError, InterruptedError):
+                self._loop.add_writer(self._sock.fileno(), self._write_ready)
+            except OSError as exc:
+                self._protocol.error_received(exc)
+                return
+
+        self._buffer.append((bytes(data), addr, ecn))
+        self._buffer_size += len(data)
+
+    def sendto_many(
+        self,
+        datagrams: Sequence[Tuple[bytes, NetworkAddress]],
+        ecn: int = ECN_NOT_ECT,
+    ) -> None:
+        """
+        Send `(data, addr)` datagrams, marked with the given ECN codepoint.
+
+        Consecutive datagrams to the same address are sent as one segmented
+        buffer if they have the same size, except for the last one which may
+        be shorter.
+        """
+        count = len(datagrams)
+        i = 0
+        while i < count:
+            data, addr = datagrams[i]
+            if not self._gso_enabled or self._buffer or self._closing:
+                self.sendto(data, addr, ecn)
+                i += 1
+                continue
+
+            # collect the run of datagrams which can be segmented together
+            segment_size = len(data)
+            segments = [data]
+            max_segments = min(UDP_MAX_SEGMENTS, UDP_MAX_SEGMENTED_SIZE // segment_size)
+            i += 1
+            while i < count and len(segments) < max_segments:
+                data, next_addr = datagrams[i]
+                if next_addr != addr or len(data) > segment_size:
+                    break
+                segments.append(data)
+                i += 1
+                if len(data) < segment_size:
+                    break
+
+            if len(segments) == 1:
+                self.sendto(segments[0], addr, ecn)
+            else:
+                self._sendto_segments(segments, addr, ecn)
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol) -> None:
+        self._protocol = cast(asyncio.DatagramProtocol, protocol)
+
+    def _call_connection_lost(self, exc: Optional[Exception]) -> None:
+        try:
+            self._protocol.connection_lost(exc)
+        finally:
+            self._sock.close()
+
+    def _force_close(self, exc: Optional[Exception]) -> None:
+        if self._buffer:
+            self._buffer.clear()
+            self._buffer_size = 0
+            self._loop.remove_writer(self._sock.fileno())
+        if not self._closing:
+            self._closing = True
+            self._loop.remove_reader(self._sock.fileno())
+        self._loop.call_soon(self._call_connection_lost, exc)
+
+    def _read_ready(self) -> None:
+        datagrams: List[Tuple[bytes, NetworkAddress, int]] = []
+        for i in range(RECEIVE_BATCH):
+            try:
+                data, ancdata, flags, addr = self._sock.recvmsg(
+                    RECEIVE_SIZE, self._ancillary_size
+                )
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as exc:
+                self._protocol.error_received(exc)
+                break
+
+            ecn = ECN_NOT_ECT
+            segment_size = len(data)
+            for level, kind, value in ancdata:
+                if (level == socket.IPPROTO_IP and kind == socket.IP_TOS) or (
+                    level == socket.IPPROTO_IPV6 and kind == IPV6_TCLASS
+                ):
+                    ecn = int.from_bytes(value, sys.byteorder) & ECN_MASK
+                elif level == SOL_UDP and kind == UDP_GRO:
+                    segment_size = int.from_bytes(value, sys.byteorder)
+
+            # split datagrams coalesced by the kernel
+            if segment_size < len(data):
+                for start in range(0, len(data), segment_size):
+                    datagrams.append((data[start : start + segment_size], addr, ecn))
+            else:
+                datagrams.append((data, addr, ecn))
+
+        datagrams_received = getattr(self._protocol, "datagrams_received", None)
+        if datagrams_received is not None:
+            if datagrams:
+                datagrams_received(datagrams)
+        else:
+            for data, addr, ecn in datagrams:
+                self._protocol.datagram_received(data, addr)
+
+    def _ecn_ancillary(self, addr: NetworkAddress, ecn: int) -> Tuple[int, int, bytes]:
+        # IPv4 peers, including IPv4-mapped addresses, take the TOS byte
+        value = ecn.to_bytes(4, sys.byteorder)
+        if self._sock.family == socket.AF_INET or addr[0].startswith("::ffff:"):
+            return (socket.IPPROTO_IP, socket.IP_TOS, value)
+        else:
+            return (socket.IPPROTO_IPV6, IPV6_TCLASS, value)
+
+    def _send(self, data: Any, addr: NetworkAddress, ecn: int) -> None:
+        if ecn == ECN_NOT_ECT:
+            self._sock.sendto(data, addr)
+        else:
+            self._sock.sendmsg([data], [self._ecn_ancillary(addr, ecn)], 0, addr)
+
+    def _sendto_segments(
+        self, segments: List[bytes], addr: NetworkAddress, ecn: int
+    ) -> None:
+        """
+        Send datagrams with a single system call, letting the kernel split the
+        buffers at the size of the first one.
+        """
+        ancdata = [(SOL_UDP, UDP_SEGMENT, struct.pack("@H", len(segments[0])))]
+        if ecn != ECN_NOT_ECT:
+            ancdata.append(self._ecn_ancillary(addr, ecn))
+
+        try:
+            self._sock.sendmsg(segments, ancdata, 0, addr)
+        except (BlockingIOError, InterruptedError):
+            self._loop.add_writer(self._sock.fileno(), self._write_ready)
+            for data in segments:
+                self._buffer.append((data, addr, ecn))
+                self._buffer_size += len(data)
+        except OSError as exc:
+            if exc.errno in GSO_ERRORS:
+                # fall back to sending datagrams one by one
+                self._gso_enabled = False
+                for data in segments:
+                    self.sendto(data, addr, ecn)
+            else:
+                self._protocol.error_received(exc)
+
+    def _write_ready(self) -> None:
+        while self._buffer:
+            data, addr, ecn = self._buffer[0]
+            try:
+                self._send(data, addr, ecn)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as exc:
+                self._protocol.error_received(exc)
+            self._buffer.popleft()
+            self._buffer_size -= len(data)
+
+        self._loop.remove_writer(self._sock.fileno())
+        if self._closing:
+            self._call_connection_lost(None)
+
+
+async def create_datagram_endpoint(
+    protocol_factory: ProtocolFactory,
+    *,
+    local_addr: Optional[Tuple[str, int]] = None,
+    reuse_port: Optional[bool] = None,
+    sock: Optional[socket.socket] = None,
+) -> Tuple[asyncio.DatagramTransport, asyncio.DatagramProtocol]:
+    """
+    Create a datagram endpoint bound to `local_addr`, or using `sock`.
+
+    If `reuse_port` is true, other sockets may bind to the same address and the
+    kernel balances incoming datagrams between them.
+
+    On Linux the endpoint uses a :class:`QuicDatagramTransport`, elsewhere it
+    falls back to the event loop's own datagram transport.
+    """
+    loop = asyncio.get_event_loop()
+    if not ECN_SUPPORTED:
+        return await loop.create_datagram_endpoint(
+            protocol_factory, local_addr=local_addr, reuse_port=reuse_port, sock=sock
+        )
+
+    if sock is None:
+        assert local_addr is not None, "either local_addr or sock is required"
+        infos = await loop.getaddrinfo(*local_addr, type=socket.SOCK_DGRAM)
+        family, type, proto, _, sockaddr = infos[0]
+        sock = socket.socket(family, type, proto)
+        try:
+            if reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(sockaddr)
+        except OSError:
+            sock.close()
+            raise
+    sock.setblocking(False)
+
+    protocol = protocol_factory()
+    waiter = loop.create_future()
+    transport = QuicDatagramTransport(loop, sock, protocol, waiter=waiter)
+    try:
+        await waiter
+    except BaseException:
+        transport.close()
+        raise
+    return transport, protocol
+
+
+def _set_result_unless_cancelled(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.set_result(None)
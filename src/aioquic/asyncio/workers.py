@@ -0,0 +1,289 @@
+import asyncio
+import copy
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import sys
+import tempfile
+from typing import Any, Callable, Optional, cast
+
+from ..quic.configuration import QuicConfiguration
+from ..quic.connection import NetworkAddress
+from ..quic.connection_id import QuicConnectionIdGenerator
+from ..quic.packet import is_long_header
+from ..tls import SessionTicketFetcher, SessionTicketHandler
+from .protocol import QuicConnectionProtocol, QuicStreamHandler
+from .server import QuicServer
+from .transport import create_datagram_endpoint
+
+__all__ = ["QuicWorkerConnectionIdGenerator", "serve_workers"]
+
+# the worker index is stored in one byte of the connection IDs
+MAX_WORKERS = 256
+
+# forwarded datagrams are prefixed with the ECN codepoint, the length of the
+# client host, the client port, flow info and scope ID, then the client host
+FORWARD_HEADER = struct.Struct("!BBHII")
+
+
+class QuicWorkerConnectionIdGenerator(QuicConnectionIdGenerator):
+    """
+    Generates connection IDs whose first byte is the index of the worker
+    process which owns the connection.
+    """
+
+    def __init__(self, worker_index: int) -> None:
+        assert 0 <= worker_index < MAX_WORKERS, "worker index must fit in one byte"
+        self.worker_index = worker_index
+
+    def generate_connection_id(self, length: int) -> bytes:
+        return bytes([self.worker_index]) + os.urandom(length - 1)
+
+
+class QuicWorkerServer(QuicServer):
+    """
+    A server running in one of several processes sharing a UDP port.
+
+    The kernel picks a worker by hashing the client's address, so after a
+    client migrates its packets can reach another worker. 1-RTT packets whose
+    destination connection ID belongs to another worker are forwarded to it
+    over a Unix socket.
+    """
+
+    def __init__(
+        self, *, socket_dir: str, worker_count: int, worker_index: int, **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self._forward_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._forward_sock.setblocking(False)
+        self._forward_transport: Optional[asyncio.BaseTransport] = None
+        self._socket_dir = socket_dir
+        self._worker_count = worker_count
+        self._worker_index = worker_index
+
+    def close(self) -> None:
+        super().close()
+        self._forward_sock.close()
+        if self._forward_transport is not None:
+            self._forward_transport.close()
+
+    def forwarded_datagram_received(self, message: bytes) -> None:
+        """
+        Handle a datagram forwarded by another worker.
+        """
+        ecn, host_length, port, flowinfo, scope_id = FORWARD_HEADER.unpack_from(message)
+        offset = FORWARD_HEADER.size + host_length
+        host = message[FORWARD_HEADER.size : offset].decode("ascii")
+
+        addr: NetworkAddress
+        if self._transport.get_extra_info("socket").family == socket.AF_INET6:
+            addr = (host, port, flowinfo, scope_id)
+        else:
+            addr = (host, port)
+        self.datagram_received(message[offset:], addr, ecn=ecn)
+
+    def _route_datagram(
+        self, data: bytes, addr: NetworkAddress, ecn: int
+    ) -> Optional[QuicConnectionProtocol]:
+        if self._forward_datagram(data, addr, ecn):
+            return None
+        return super()._route_datagram(data, addr, ecn)
+
+    def _forward_datagram(self, data: bytes, addr: NetworkAddress, ecn: int) -> bool:
+        """
+        Forward the datagram if it belongs to another worker.
+        """
+        # only 1-RTT packets are sent after a client migrates
+        if len(data) < 2 or is_long_header(data[0]):
+            return False
+        worker_index = data[1]
+        if worker_index == self._worker_index or worker_index >= self._worker_count:
+            return False
+
+        host = addr[0].encode("ascii")
+        flowinfo, scope_id = addr[2:4] if len(addr) == 4 else (0, 0)
+        try:
+            self._forward_sock.sendto(
+                FORWARD_HEADER.pack(ecn, len(host), addr[1], flowinfo, scope_id)
+                + host
+                + data,
+                _worker_socket_path(self._socket_dir, worker_index),
+            )
+        except OSError:
+            # like any datagram, a forwarded one may be lost
+            pass
+        return True
+
+
+class QuicWorkerForwardProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: QuicWorkerServer) -> None:
+        self._server = server
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        self._server.forwarded_datagram_received(data)
+
+
+async def _serve_worker(
+    host: str,
+    port: int,
+    *,
+    configuration: QuicConfiguration,
+    socket_dir: str,
+    worker_count: int,
+    worker_index: int,
+    create_protocol: Callable = QuicConnectionProtocol,
+    session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
+    session_ticket_handler: Optional[SessionTicketHandler] = None,
+    retry: bool = False,
+    stream_handler: Optional[QuicStreamHandler] = None,
+    timer_wheel: bool = False,
+) -> QuicWorkerServer:
+    """
+    Start one worker of a server sharing the given `host` and `port`.
+    """
+    _check_connection_id_generator(configuration)
+    configuration = copy.copy(configuration)
+    configuration.connection_id_generator = QuicWorkerConnectionIdGenerator(
+        worker_index
+    )
+
+    _, protocol = await create_datagram_endpoint(
+        lambda: QuicWorkerServer(
+            configuration=configuration,
+            create_protocol=create_protocol,
+            session_ticket_fetcher=session_ticket_fetcher,
+            session_ticket_handler=session_ticket_handler,
+            retry=retry,
+            socket_dir=socket_dir,
+            stream_handler=stream_handler,
+            timer_wheel=timer_wheel,
+            worker_count=worker_count,
+            worker_index=worker_index,
+        ),
+        local_addr=(host, port),
+        reuse_port=True,
+    )
+    server = cast(QuicWorkerServer, protocol)
+
+    # receive datagrams forwarded by the other workers
+    loop = asyncio.get_event_loop()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(_worker_socket_path(socket_dir, worker_index))
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: QuicWorkerForwardProtocol(server), sock=sock
+    )
+    server._forward_transport = transport
+    return server
+
+
+def _run_worker(**kwargs: Any) -> None:
+    async def main() -> None:
+        await _serve_worker(**kwargs)
+        await asyncio.Future()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def _check_connection_id_generator(configuration: QuicConfiguration) -> None:
+    if configuration.connection_id_generator is not None:
+        raise ValueError(
+            "Workers generate their own connection IDs, "
+            "connection_id_generator must not be set"
+        )
+
+
+def _terminate(signum: int, frame: Any) -> None:
+    sys.exit(0)
+
+
+def _worker_socket_path(socket_dir: str, worker_index: int) -> str:
+    return os.path.join(socket_dir, "worker-%d" % worker_index)
+
+
+def serve_workers(
+    host: str,
+    port: int,
+    *,
+    configuration: QuicConfiguration,
+    workers: Optional[int] = None,
+    create_protocol: Callable = QuicConnectionProtocol,
+    session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
+    session_ticket_handler: Optional[SessionTicketHandler] = None,
+    retry: bool = False,
+    stream_handler: Optional[QuicStreamHandler] = None,
+    timer_wheel: bool = False,
+) -> None:
+    """
+    Run a QUIC server at the given `host` and `port` in several processes.
+
+    :func:`serve_workers` forks `workers` processes, by default one per CPU,
+    which bind the same port using `SO_REUSEPORT`. Each worker encodes its
+    index in the first byte of the connection IDs it issues, and forwards
+    packets which reach it but belong to another worker. It blocks until the
+    workers exit, and stops them when it is interrupted or terminated.
+
+    The other arguments are those of :func:`serve`. The callbacks run in the
+    worker processes, so session tickets are only shared between workers if
+    the callbacks store them outside of the process. Address validation tokens
+    are sealed with keys derived from the configuration's
+    :attr:`~aioquic.quic.configuration.QuicConfiguration.token_secret`, which
+    is generated once for all the workers if it is not set.
+
+    As the workers issue their own connection IDs, the configuration must not
+    set a connection ID generator, so :func:`serve_workers` cannot be combined
+    with QUIC-LB connection IDs. A :class:`ValueError` is raised otherwise.
+
+    Forking requires Linux.
+    """
+    _check_connection_id_generator(configuration)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert 0 < workers <= MAX_WORKERS, "workers must be between 1 and 256"
+
+    # the workers accept each other's retry tokens
+    if configuration.token_secret is None:
+        configuration = copy.copy(configuration)
+        configuration.token_secret = os.urandom(32)
+
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as socket_dir:
+        processes = [
+            context.Process(
+                target=_run_worker,
+                kwargs=dict(
+                    host=host,
+                    port=port,
+                    configuration=configuration,
+                    socket_dir=socket_dir,
+                    worker_count=workers,
+                    worker_index=worker_index,
+                    create_protocol=create_protocol,
+                    session_ticket_fetcher=session_ticket_fetcher,
+                    session_ticket_handler=session_ticket_handler,
+                    retry=retry,
+                    stream_handler=stream_handler,
+                    timer_wheel=timer_wheel,
+                ),
+                daemon=True,
+            )
+            for worker_index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        previous_handler = signal.signal(signal.SIGTERM, _terminate)
+        try:
+            for process in processes:
+                process.join()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
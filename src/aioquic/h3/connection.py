@@ -1,7 +1,7 @@
 import logging
 import re
 from enum import Enum, IntEnum
-from typing import Dict, FrozenSet, List, Optional, Set
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple, Union
 
 import pylsqpack
 
@@ -19,10 +19,14 @@ from aioquic.h3.exceptions import NoAvailablePushIDError
 from aioquic.quic.connection import QuicConnection, stream_is_unidirectional
 from aioquic.quic.events import DatagramFrameReceived, QuicEvent, StreamDataReceived
 from aioquic.quic.logger import QuicLoggerTrace
+from aioquic.quic.scheduler import INCREMENTAL_DEFAULT, URGENCY_COUNT, URGENCY_DEFAULT
+from aioquic.quic.stream import QuicStreamProducer
 
 logger = logging.getLogger("http3")
 
 H3_ALPN = ["h3", "h3-32", "h3-31", "h3-30", "h3-29"]
+PRIORITY_KEY = re.compile(r"^[a-z*][a-z0-9_\-.*]*$")
+PRIORITY_UPDATES_MAX = 128
 RESERVED_SETTINGS = (0x0, 0x2, 0x3, 0x4, 0x5)
 UPPERCASE = re.compile(b"[A-Z]")
 
@@ -62,8 +66,9 @@ class FrameType(IntEnum):
     DUPLICATE_PUSH = 0xE
     WEBTRANSPORT_STREAM = 0x41
 
-    # https://datatracker.ietf.org/doc/html/draft-ietf-httpbis-priority-12#section-7.2
+    # https://datatracker.ietf.org/doc/html/rfc9218#section-7.2
     PRIORITY_UPDATE = 0xF0700
+    PRIORITY_UPDATE_PUSH = 0xF0701
 
 
 class HeadersState(Enum):
@@ -131,6 +136,10 @@ class FrameUnexpected(ProtocolError):
     error_code = ErrorCode.H3_FRAME_UNEXPECTED
 
 
+class IdError(ProtocolError):
+    error_code = ErrorCode.H3_ID_ERROR
+
+
 class MessageError(ProtocolError):
     error_code = ErrorCode.H3_MESSAGE_ERROR
 
@@ -147,7 +156,7 @@ class StreamCreationError(ProtocolError):
     error_code = ErrorCode.H3_STREAM_CREATION_ERROR
 
 
-def encode_frame(frame_type: int, frame_data: bytes) -> bytes:
+def encode_frame(frame_type: int, frame_data: Union[bytes, memoryview]) -> bytes:
     frame_length = len(frame_data)
     buf = Buffer(capacity=frame_length + 2 * UINT_VAR_MAX_SIZE)
     buf.push_uint_var(frame_type)
@@ -171,6 +180,67 @@ def parse_max_push_id(data: bytes) -> int:
     return max_push_id
 
 
+def split_structured_field(text: str, separator: str) -> List[str]:
+    """
+    Split a structured field on `separator`, except within quoted strings.
+    """
+    parts = []
+    start = 0
+    quoted = False
+    escaped = False
+    for i, c in enumerate(text):
+        if escaped:
+            escaped = False
+        elif quoted:
+            if c == "\\":
+                escaped = True
+            elif c == '"':
+                quoted = False
+        elif c == '"':
+            quoted = True
+        elif c == separator:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def parse_priority(data: bytes) -> Optional[Tuple[int, bool]]:
+    """
+    Parse a Priority Field Value and return an `(urgency, incremental)` tuple.
+
+    The value is a structured field dictionary, unknown keys and invalid
+    parameter values are ignored. Returns `None` if the value cannot be parsed.
+
+    See: https://datatracker.ietf.org/doc/html/rfc9218#section-4
+    """
+    urgency = URGENCY_DEFAULT
+    incremental = INCREMENTAL_DEFAULT
+    try:
+        text = data.decode("ascii")
+    except UnicodeDecodeError:
+        return None
+    if not text.strip(" \t"):
+        return urgency, incremental
+
+    for member in split_structured_field(text, ","):
+        # strip parameters, which are not used by any priority key
+        item = split_structured_field(member, ";")[0].strip(" \t")
+        key, sep, value = item.partition("=")
+        if not PRIORITY_KEY.match(key):
+            return None
+        if not sep:
+            value = "?1"
+
+        if key == "u":
+            if value.isdigit() and int(value) < URGENCY_COUNT:
+                urgency = int(value)
+        elif key == "i":
+            if value in ("?0", "?1"):
+                incremental = value == "?1"
+    return urgency, incremental
+
+
 def parse_settings(data: bytes) -> Dict[int, int]:
     buf = Buffer(data=data)
     settings: Dict[int, int] = {}
@@ -274,6 +344,44 @@ def validate_trailers(headers: Headers) -> None:
     )
 
 
+class DataFrameProducer(QuicStreamProducer):
+    """
+    Frame the data read from a producer of unknown size as DATA frames.
+    """
+
+    def __init__(
+        self,
+        producer: QuicStreamProducer,
+        quic_logger: Optional[QuicLoggerTrace],
+        stream_id: int,
+    ) -> None:
+        self._offset = 0
+        self._producer = producer
+        self._quic_logger = quic_logger
+        self._stream_id = stream_id
+
+    def close(self) -> None:
+        self._producer.close()
+
+    def read(self, offset: int, size: int) -> bytes:
+        data = self._producer.read(self._offset, max(1, size - 2 * UINT_VAR_MAX_SIZE))
+        if not len(data):
+            return b""
+        self._offset += len(data)
+
+        # log frame
+        if self._quic_logger is not None:
+            self._quic_logger.log_event(
+                category="http",
+                event="frame_created",
+                data=self._quic_logger.encode_http3_data_frame(
+                    length=len(data), stream_id=self._stream_id
+                ),
+            )
+
+        return encode_frame(FrameType.DATA, data)
+
+
 class H3Stream:
     def __init__(self, stream_id: int) -> None:
         self.blocked = False
@@ -284,6 +392,7 @@ class H3Stream:
         self.frame_type: Optional[int] = None
         self.headers_recv_state: HeadersState = HeadersState.INITIAL
         self.headers_send_state: HeadersState = HeadersState.INITIAL
+        self.priority_update_received = False
         self.push_id: Optional[int] = None
         self.session_id: Optional[int] = None
         self.stream_id = stream_id
@@ -321,6 +430,9 @@ class H3Connection:
         self._max_push_id: Optional[int] = 8 if self._is_client else None
         self._next_push_id: int = 0
 
+        # priority signals received for request streams which are not open yet
+        self._priority_updates: Dict[int, Tuple[int, bool]] = {}
+
         self._local_control_stream_id: Optional[int] = None
         self._local_decoder_stream_id: Optional[int] = None
         self._local_encoder_stream_id: Optional[int] = None
@@ -426,7 +538,12 @@ class H3Connection:
 
         return push_stream_id
 
-    def send_data(self, stream_id: int, data: bytes, end_stream: bool) -> None:
+    def send_data(
+        self,
+        stream_id: int,
+        data: Union[bytes, QuicStreamProducer],
+        end_stream: bool,
+    ) -> None:
         """
         Send data on the given stream.
 
@@ -435,7 +552,9 @@ class H3Connection:
         method.
 
         :param stream_id: The stream ID on which to send the data.
-        :param data: The data to send.
+        :param data: The data to send, or a
+                     :class:`~aioquic.quic.stream.QuicStreamProducer` which is
+                     read when the stream is ready to send more data.
         :param end_stream: Whether to end the stream.
         """
         # check DATA frame is allowed
@@ -443,19 +562,37 @@ class H3Connection:
         if stream.headers_send_state != HeadersState.AFTER_HEADERS:
             raise FrameUnexpected("DATA frame is not allowed in this state")
 
+        if isinstance(data, QuicStreamProducer):
+            if data.size is None:
+                # the length is unknown, send one DATA frame per read
+                self._quic.send_stream_data(
+                    stream_id,
+                    DataFrameProducer(
+                        data, quic_logger=self._quic_logger, stream_id=stream_id
+                    ),
+                    end_stream,
+                )
+                return
+            length = data.size
+        else:
+            length = len(data)
+
         # log frame
         if self._quic_logger is not None:
             self._quic_logger.log_event(
                 category="http",
                 event="frame_created",
                 data=self._quic_logger.encode_http3_data_frame(
-                    length=len(data), stream_id=stream_id
+                    length=length, stream_id=stream_id
                 ),
             )
 
-        self._quic.send_stream_data(
-            stream_id, encode_frame(FrameType.DATA, data), end_stream
-        )
+        # send the frame header and payload separately to avoid copying the payload
+        buf = Buffer(capacity=2 * UINT_VAR_MAX_SIZE)
+        buf.push_uint_var(FrameType.DATA)
+        buf.push_uint_var(length)
+        self._quic.send_stream_data(stream_id, buf.data)
+        self._quic.send_stream_data(stream_id, data, end_stream)
 
     def send_headers(
         self, stream_id: int, headers: Headers, end_stream: bool = False
@@ -534,6 +671,26 @@ class H3Connection:
                 ),
             )
 
+    def _apply_request_priority(self, stream: H3Stream, headers: Headers) -> None:
+        """
+        Apply the priority of a request whose headers were just received.
+
+        A PRIORITY_UPDATE frame takes precedence over the `priority` header.
+        """
+        priority = self._priority_updates.pop(stream.stream_id, None)
+        if priority is not None:
+            stream.priority_update_received = True
+            self._set_stream_priority(stream.stream_id, priority, trigger="frame")
+        elif not stream.priority_update_received:
+            for key, value in headers:
+                if key == b"priority":
+                    priority = parse_priority(value)
+                    if priority is not None:
+                        self._set_stream_priority(
+                            stream.stream_id, priority, trigger="header"
+                        )
+                    break
+
     def _create_uni_stream(
         self, stream_type: int, push_id: Optional[int] = None
     ) -> int:
@@ -545,6 +702,14 @@ class H3Connection:
             push_id=push_id, stream_id=stream_id, stream_type=stream_type
         )
         self._quic.send_stream_data(stream_id, encode_uint_var(stream_type))
+
+        # critical streams must not be delayed behind request data
+        if stream_type in (
+            StreamType.CONTROL,
+            StreamType.QPACK_DECODER,
+            StreamType.QPACK_ENCODER,
+        ):
+            self._quic.set_stream_priority(stream_id, urgency=0)
         return stream_id
 
     def _decode_headers(self, stream_id: int, frame_data: Optional[bytes]) -> Headers:
@@ -624,7 +789,13 @@ class H3Connection:
             FrameType.DUPLICATE_PUSH,
         ):
             raise FrameUnexpected("Invalid frame type on control stream")
-        elif frame_type == FrameType.PRIORITY_UPDATE:
+        elif frame_type in (
+            FrameType.PRIORITY_UPDATE,
+            FrameType.PRIORITY_UPDATE_PUSH,
+        ):
+            if self._is_client:
+                raise FrameUnexpected("Servers must not send PRIORITY_UPDATE")
+
             # HTTP/3 PRIORITY_UPDATE Frame {
             #      Type (i) = 0xF0700..0xF0701,
             #      Length (i),
@@ -636,16 +807,22 @@ class H3Connection:
             elementID = buf.pull_uint_var()
             fieldValue = buf.pull_bytes( buf.capacity - buf.tell() )
 
-            logger.debug(f"PRIORITY_UPDATE frame received for stream {elementID} with value {frame_data.hex()} => { fieldValue.decode('ascii') }")
+            logger.debug(
+                f"PRIORITY_UPDATE frame received for stream {elementID} with value "
+                f"{frame_data.hex()} => { fieldValue.decode('ascii', 'replace') }"
+            )
 
             if self._quic_logger is not None:
                 self._quic_logger.log_event(
                     category="http",
                     event="frame_parsed",
                     data=self._quic_logger.encode_priority_update_frame(
-                        length=len(frame_data), elementID=elementID, fieldValue=fieldValue.decode("ascii"), stream_id=control_stream_id
+                        length=len(frame_data), elementID=elementID, fieldValue=fieldValue.decode("ascii", "replace"), stream_id=control_stream_id
                     ),
                 )
+
+            if frame_type == FrameType.PRIORITY_UPDATE:
+                self._receive_priority_update(elementID, fieldValue)
         else:
             logger.debug(f"Unknown frame received on control stream, ignoring: {hex(frame_type)} @ {frame_data.hex()}")
 
@@ -708,6 +885,8 @@ class H3Connection:
 
             # update state and emit headers
             if stream.headers_recv_state == HeadersState.INITIAL:
+                if not self._is_client and stream.push_id is None:
+                    self._apply_request_priority(stream, headers)
                 stream.headers_recv_state = HeadersState.AFTER_HEADERS
             else:
                 stream.headers_recv_state = HeadersState.AFTER_TRAILERS
@@ -824,6 +1003,31 @@ class H3Connection:
             raise ProtocolError("Could not parse flow ID")
         return [DatagramReceived(data=data[buf.tell() :], flow_id=flow_id)]
 
+    def _receive_priority_update(self, stream_id: int, value: bytes) -> None:
+        """
+        Handle a PRIORITY_UPDATE frame for a request stream.
+        """
+        if stream_is_unidirectional(stream_id) or stream_id & 1:
+            raise IdError("PRIORITY_UPDATE must reference a request stream")
+        if stream_id // 4 >= self._quic._local_max_streams_bidi.value:
+            raise IdError("PRIORITY_UPDATE references a stream above the limit")
+
+        priority = parse_priority(value)
+        if priority is None:
+            return
+
+        stream = self._stream.get(stream_id)
+        if stream is not None and stream.headers_recv_state != HeadersState.INITIAL:
+            # the request is open, apply the priority right away
+            stream.priority_update_received = True
+            self._set_stream_priority(stream_id, priority, trigger="frame")
+        elif (
+            stream_id in self._priority_updates
+            or len(self._priority_updates) < PRIORITY_UPDATES_MAX
+        ):
+            # the request is not open yet, keep the priority for later
+            self._priority_updates[stream_id] = priority
+
     def _receive_request_or_push_data(
         self, stream: H3Stream, data: bytes, stream_ended: bool
     ) -> List[H3Event]:
@@ -1123,6 +1327,29 @@ class H3Connection:
 
         return http_events
 
+    def _set_stream_priority(
+        self, stream_id: int, priority: Tuple[int, bool], trigger: str
+    ) -> None:
+        """
+        Pass the priority of a request stream down to the QUIC scheduler.
+        """
+        urgency, incremental = priority
+        self._quic.set_stream_priority(
+            stream_id, urgency=urgency, incremental=incremental
+        )
+
+        # log event
+        if self._quic_logger is not None:
+            self._quic_logger.log_event(
+                category="http",
+                event="priority_updated",
+                data={
+                    "new": "u=%d%s" % (urgency, ", i" if incremental else ""),
+                    "stream_id": stream_id,
+                    "trigger": trigger,
+                },
+            )
+
     def _validate_settings(self, settings: Dict[int, int]) -> None:
         for setting in [
             Setting.ENABLE_CONNECT_PROTOCOL,
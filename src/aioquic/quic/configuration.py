@@ -4,11 +4,14 @@ from re import split
 from typing import Any, List, Optional, TextIO, Union
 
 from ..tls import (
+    CertificateCache,
     CipherSuite,
+    KeySharePool,
     SessionTicket,
     load_pem_private_key,
     load_pem_x509_certificates,
 )
+from .connection_id import QuicConnectionIdGenerator
 from .logger import QuicLogger
 from .packet import QuicProtocolVersion
 
@@ -24,6 +27,25 @@ class QuicConfiguration:
     A list of supported ALPN protocols.
     """
 
+    certificate_cache: Optional[CertificateCache] = None
+    """
+    A cache for the encoded certificate chain of servers, and for the
+    certificate chains verified by clients.
+    """
+
+    congestion_control_algorithm: str = "reno"
+    """
+    The name of the congestion control algorithm: `"reno"`, `"cubic"` or `"bbr"`.
+
+    Other algorithms can be registered using
+    :func:`~aioquic.quic.congestion.base.register_congestion_control`.
+    """
+
+    connection_id_generator: Optional[QuicConnectionIdGenerator] = None
+    """
+    The generator for local connection IDs, which are random by default.
+    """
+
     connection_id_length: int = 8
     """
     The length in bytes of local connection IDs.
@@ -36,16 +58,37 @@ class QuicConfiguration:
     The connection is terminated if nothing is received for the given duration.
     """
 
+    incremental_stream_quantum: int = 16384
+    """
+    The number of bytes an incremental stream may send before yielding to the
+    next incremental stream of the same urgency.
+    """
+
     is_client: bool = True
     """
     Whether this is the client side of the QUIC connection.
     """
 
+    key_share_pool: Optional[KeySharePool] = None
+    """
+    A pool of pre-generated ephemeral keys for the TLS key exchange, which can
+    be shared by many connections.
+    """
+
     max_data: int = 1048576
     """
     Connection-wide flow control limit.
     """
 
+    max_datagram_size: int = 1280
+    """
+    The largest UDP payload in bytes which path MTU discovery may use.
+
+    Above the default, the path is probed for larger datagrams once the handshake
+    is confirmed, see :rfc:`8899`. The size is also bounded by the peer's
+    `max_udp_payload_size` transport parameter.
+    """
+
     max_stream_data: int = 1048576
     """
     Per-stream flow control limit.
@@ -75,6 +118,27 @@ class QuicConfiguration:
     The TLS session ticket which should be used for session resumption.
     """
 
+    token: bytes = b""
+    """
+    The address validation token which the server sent in a NEW_TOKEN frame
+    during a previous connection.
+
+    Presenting it in the Initial packet spares the client a Retry round trip.
+
+    .. note:: This is only used by clients.
+    """
+
+    token_secret: Optional[bytes] = None
+    """
+    The secret from which servers derive the keys protecting address validation
+    tokens, at least 16 bytes long.
+
+    Servers sharing the secret accept each other's tokens. If `None`, each
+    server generates a random secret.
+
+    .. note:: This is only used by servers.
+    """
+
     cadata: Optional[bytes] = None
     cafile: Optional[str] = None
     capath: Optional[str] = None
@@ -0,0 +1,276 @@
+import abc
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from ..packet_builder import QuicSentPacket
+
+K_GRANULARITY = 0.001  # seconds
+K_MAX_DATAGRAM_SIZE = 1280
+K_INITIAL_WINDOW = 10 * K_MAX_DATAGRAM_SIZE
+K_MINIMUM_WINDOW = 2 * K_MAX_DATAGRAM_SIZE
+
+# HyStart++, see https://datatracker.ietf.org/doc/html/rfc9406#section-4.3
+K_HYSTART_MIN_RTT_THRESH = 0.004  # seconds
+K_HYSTART_MAX_RTT_THRESH = 0.016  # seconds
+K_HYSTART_MIN_RTT_DIVISOR = 8
+K_HYSTART_N_RTT_SAMPLE = 8
+K_HYSTART_CSS_GROWTH_DIVISOR = 4
+K_HYSTART_CSS_ROUNDS = 5
+
+
+@dataclass
+class QuicRateSample:
+    """
+    A delivery rate sample, taken when an ACK acknowledges in-flight packets.
+    """
+
+    delivered: int
+    "The number of bytes delivered over the sampling interval."
+
+    interval: float
+    "The duration of the sampling interval, in seconds."
+
+    is_app_limited: bool
+    "Whether the sampled packet was sent while the sender was application-limited."
+
+    prior_delivered: int
+    "The number of bytes delivered when the sampled packet was sent."
+
+    rtt: float
+    "The round-trip time of the sampled packet, in seconds."
+
+    rtt_min: float
+    "The minimum round-trip time observed on the path, in seconds."
+
+    @property
+    def delivery_rate(self) -> float:
+        """
+        The delivery rate in bytes per second.
+        """
+        if self.interval <= 0:
+            return 0.0
+        return self.delivered / self.interval
+
+    @property
+    def is_reliable(self) -> bool:
+        """
+        Whether the sampling interval is long enough for the delivery rate to
+        be meaningful, that is at least the minimum round-trip time.
+        """
+        return self.interval > 0 and self.interval >= self.rtt_min
+
+
+class QuicCongestionControl(abc.ABC):
+    """
+    Base class for congestion control algorithms.
+
+    The loss recovery calls the `on_*` methods as packets are sent,
+    acknowledged, lost or discarded, and paces packets according to
+    :attr:`pacing_rate` or, if it is `None`, :attr:`congestion_window`.
+    """
+
+    def __init__(self) -> None:
+        self.bytes_in_flight = 0
+        "The number of bytes sent but neither acknowledged nor lost."
+
+        self.congestion_window = K_INITIAL_WINDOW
+        "The maximum number of bytes in flight."
+
+        self.max_datagram_size = K_MAX_DATAGRAM_SIZE
+        "The maximum datagram size, which path MTU discovery may raise."
+
+        self.ssthresh: Optional[int] = None
+        "The slow start threshold, or `None` while in the initial slow start."
+
+        self.pacing_rate: Optional[float] = None
+        "The pacing rate in bytes per second, or `None` to pace using the window."
+
+    @property
+    def congestion_state(self) -> str:
+        """
+        The state logged in qlog `congestion_state_updated` events.
+        """
+        if self.ssthresh is None:
+            return "slow_start"
+        return "congestion_avoidance"
+
+    @property
+    def minimum_window(self) -> int:
+        """
+        The smallest congestion window, in bytes.
+        """
+        return 2 * self.max_datagram_size
+
+    def get_log_data(self) -> Dict[str, Any]:
+        """
+        Return the metrics to log in qlog `metrics_updated` events.
+        """
+        data: Dict[str, Any] = {
+            "bytes_in_flight": self.bytes_in_flight,
+            "cwnd": self.congestion_window,
+        }
+        if self.ssthresh is not None:
+            data["ssthresh"] = self.ssthresh
+        if self.pacing_rate is not None:
+            data["pacing_rate"] = int(self.pacing_rate * 8)
+        return data
+
+    def on_congestion_experienced(self, sent_time: float, now: float) -> None:
+        """
+        Called when the peer reports packets marked ECN Congestion Experienced.
+
+        `sent_time` is the time the largest acknowledged packet was sent.
+        """
+
+    @abc.abstractmethod
+    def on_packet_acked(self, packet: QuicSentPacket, now: float) -> None:
+        """
+        Called when an in-flight packet is acknowledged.
+        """
+        ...  # pragma: no cover
+
+    def on_packet_sent(self, packet: QuicSentPacket) -> None:
+        """
+        Called when an in-flight packet is sent.
+        """
+        self.bytes_in_flight += packet.sent_bytes
+
+    def on_packets_expired(self, packets: Iterable[QuicSentPacket]) -> None:
+        """
+        Called when in-flight packets are discarded without being acknowledged
+        or lost, for instance because their packet number space was dropped.
+        """
+        for packet in packets:
+            self.bytes_in_flight -= packet.sent_bytes
+
+    @abc.abstractmethod
+    def on_packets_lost(self, packets: Iterable[QuicSentPacket], now: float) -> None:
+        """
+        Called when in-flight packets are declared lost.
+        """
+        ...  # pragma: no cover
+
+    def on_persistent_congestion(self, now: float) -> None:
+        """
+        Called after :meth:`on_packets_lost` when the lost packets span a
+        period of persistent congestion, which collapses the window.
+        """
+        self.congestion_window = self.minimum_window
+
+    def on_rate_sample(self, sample: QuicRateSample, now: float) -> None:
+        """
+        Called once per ACK with the delivery rate sample, after the
+        acknowledged packets were passed to :meth:`on_packet_acked`.
+        """
+
+    @abc.abstractmethod
+    def on_rtt_measurement(self, latest_rtt: float, now: float) -> None:
+        """
+        Called when a new round-trip time sample is available.
+        """
+        ...  # pragma: no cover
+
+
+class QuicHyStart:
+    """
+    HyStart++ slow start.
+
+    The minimum RTT is sampled over each round trip. When it increases, slow
+    start switches to conservative slow start, which grows the window four
+    times slower. If the RTT increase persists for 5 rounds, slow start is
+    over; if the RTT drops back, it was spurious and slow start resumes.
+
+    See: https://datatracker.ietf.org/doc/html/rfc9406
+    """
+
+    def __init__(self) -> None:
+        self.css_baseline_min_rtt = math.inf
+        self.css_rounds = 0
+        self.current_round_min_rtt = math.inf
+        self.last_round_min_rtt = math.inf
+        self.rtt_sample_count = 0
+
+        self._round_start: Optional[float] = None
+
+    @property
+    def in_css(self) -> bool:
+        """
+        Whether conservative slow start is in progress.
+        """
+        return self.css_baseline_min_rtt != math.inf
+
+    @property
+    def is_done(self) -> bool:
+        """
+        Whether slow start should end.
+        """
+        return self.css_rounds >= K_HYSTART_CSS_ROUNDS
+
+    def on_packet_acked(self, packet: QuicSentPacket, now: float) -> int:
+        """
+        Track round trips, and return the number of bytes by which the
+        congestion window should grow.
+        """
+        # a round ends when a packet sent after its start is acknowledged
+        if self._round_start is None or packet.sent_time >= self._round_start:
+            self._round_start = now
+            self.last_round_min_rtt = self.current_round_min_rtt
+            self.current_round_min_rtt = math.inf
+            self.rtt_sample_count = 0
+            if self.in_css:
+                self.css_rounds += 1
+
+        if self.in_css:
+            return packet.sent_bytes // K_HYSTART_CSS_GROWTH_DIVISOR
+        return packet.sent_bytes
+
+    def on_rtt_measurement(self, latest_rtt: float) -> None:
+        self.current_round_min_rtt = min(self.current_round_min_rtt, latest_rtt)
+        self.rtt_sample_count += 1
+        if self.rtt_sample_count < K_HYSTART_N_RTT_SAMPLE:
+            return
+
+        if not self.in_css:
+            if self.last_round_min_rtt != math.inf:
+                rtt_thresh = min(
+                    max(
+                        self.last_round_min_rtt / K_HYSTART_MIN_RTT_DIVISOR,
+                        K_HYSTART_MIN_RTT_THRESH,
+                    ),
+                    K_HYSTART_MAX_RTT_THRESH,
+                )
+                if self.current_round_min_rtt >= self.last_round_min_rtt + rtt_thresh:
+                    self.css_baseline_min_rtt = self.current_round_min_rtt
+        elif self.current_round_min_rtt < self.css_baseline_min_rtt:
+            # the RTT increase was spurious, resume slow start
+            self.css_baseline_min_rtt = math.inf
+            self.css_rounds = 0
+
+
+QuicCongestionControlFactory = Callable[[], QuicCongestionControl]
+
+_factories: Dict[str, QuicCongestionControlFactory] = {}
+
+
+def create_congestion_control(name: str) -> QuicCongestionControl:
+    """
+    Create an instance of the congestion control algorithm registered as `name`.
+    """
+    try:
+        factory = _factories[name]
+    except KeyError:
+        raise ValueError("Unknown congestion control algorithm %r" % name)
+    return factory()
+
+
+def register_congestion_control(
+    name: str, factory: QuicCongestionControlFactory
+) -> None:
+    """
+    Register a congestion control algorithm under the given `name`.
+
+    The algorithm can then be selected using
+    :attr:`~aioquic.quic.configuration.QuicConfiguration.congestion_control_algorithm`.
+    """
+    _factories[name] = factory
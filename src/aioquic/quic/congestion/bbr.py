@@ -0,0 +1,320 @@
+import math
+from random import Random
+from collections import deque
+from enum import Enum
+from typing import Deque, Iterable, Optional, Tuple
+
+from ..packet_builder import QuicSentPacket
+from .base import (
+    K_INITIAL_WINDOW,
+    QuicCongestionControl,
+    QuicRateSample,
+    register_congestion_control,
+)
+
+# gains
+K_HIGH_GAIN = 2 / math.log(2)
+K_DRAIN_GAIN = 1 / K_HIGH_GAIN
+K_CWND_GAIN = 2.0
+K_PACING_GAIN_CYCLE = [1.25, 0.75, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0]
+
+# model
+K_BTL_BW_FILTER_LENGTH = 10  # round trips
+K_RT_PROP_FILTER_LENGTH = 10.0  # seconds
+K_PROBE_RTT_DURATION = 0.2  # seconds
+K_MIN_PIPE_CWND = 4  # datagrams
+
+# startup
+K_FULL_BW_THRESHOLD = 1.25
+K_FULL_BW_COUNT = 3
+
+
+class BbrState(Enum):
+    STARTUP = 0
+    DRAIN = 1
+    PROBE_BW = 2
+    PROBE_RTT = 3
+
+
+class BbrCongestionControl(QuicCongestionControl):
+    """
+    BBR congestion control.
+
+    The sender builds a model of the path from delivery rate samples: the
+    bottleneck bandwidth is the maximum delivery rate over the last 10 round
+    trips, and the round-trip propagation time is the minimum RTT over the last
+    10 seconds. Packets are paced at a multiple of the bottleneck bandwidth and
+    the congestion window is capped to a multiple of the bandwidth-delay
+    product.
+
+    Upon loss, the window is reduced to the data in flight and grows with
+    packet conservation for one round trip, then is restored when the recovery
+    period ends.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._state = BbrState.STARTUP
+        self._cwnd_gain = K_HIGH_GAIN
+        self._pacing_gain = K_HIGH_GAIN
+        self._prior_cwnd = 0
+
+        # bottleneck bandwidth, as a windowed maximum of (round, rate) samples
+        self._btl_bw = 0.0
+        self._btl_bw_filter: Deque[Tuple[int, float]] = deque()
+
+        # round-trip propagation time
+        self._rt_prop = math.inf
+        self._rt_prop_expired = False
+        self._rt_prop_stamp = 0.0
+
+        # round trips
+        self._delivered = 0
+        self._next_round_delivered = 0
+        self._round_count = 0
+        self._round_start = False
+
+        # startup
+        self._filled_pipe = False
+        self._full_bw = 0.0
+        self._full_bw_count = 0
+
+        # probe bandwidth
+        self._cycle_index = 0
+        self._cycle_random = Random()
+        self._cycle_stamp = 0.0
+        self._has_losses = False
+
+        # probe RTT
+        self._probe_rtt_done_stamp: Optional[float] = None
+        self._probe_rtt_round_done = False
+
+        # loss recovery
+        self._packet_conservation = False
+        self._recovery_round = 0
+        self._recovery_start_time: Optional[float] = None
+
+    @property
+    def congestion_state(self) -> str:
+        return self._state.name.lower()
+
+    def on_packet_acked(self, packet: QuicSentPacket, now: float) -> None:
+        self.bytes_in_flight -= packet.sent_bytes
+
+        # a packet sent after the start of recovery ends it
+        if (
+            self._recovery_start_time is not None
+            and packet.sent_time > self._recovery_start_time
+        ):
+            self._recovery_start_time = None
+            self._packet_conservation = False
+            self._restore_cwnd()
+
+        target_cwnd = self._inflight(self._cwnd_gain)
+        if self._packet_conservation:
+            self.congestion_window = max(
+                self.congestion_window, self.bytes_in_flight + packet.sent_bytes
+            )
+        elif self._filled_pipe:
+            self.congestion_window = min(
+                self.congestion_window + packet.sent_bytes, target_cwnd
+            )
+        elif self.congestion_window < target_cwnd or self._delivered < K_INITIAL_WINDOW:
+            self.congestion_window += packet.sent_bytes
+        self._bound_cwnd()
+
+    def on_packets_lost(self, packets: Iterable[QuicSentPacket], now: float) -> None:
+        lost_bytes = 0
+        for packet in packets:
+            self.bytes_in_flight -= packet.sent_bytes
+            lost_bytes += packet.sent_bytes
+        self._has_losses = True
+
+        if self._recovery_start_time is None:
+            # start recovery, with packet conservation for one round trip
+            self._save_cwnd()
+            self._recovery_round = self._round_count
+            self._recovery_start_time = now
+            self._packet_conservation = True
+            self.congestion_window = self.bytes_in_flight + self.max_datagram_size
+        else:
+            self.congestion_window -= lost_bytes
+        self._bound_cwnd()
+
+    def on_rate_sample(self, sample: QuicRateSample, now: float) -> None:
+        self._update_round(sample)
+        self._update_btl_bw(sample)
+        self._update_rt_prop(sample, now=now)
+
+        if self._state == BbrState.PROBE_BW and self._is_next_cycle_phase(now):
+            self._advance_cycle_phase(now)
+        self._check_full_pipe(sample)
+        self._check_drain(now)
+        self._check_probe_rtt(now)
+        self._has_losses = False
+
+        if self._packet_conservation and self._round_count > self._recovery_round:
+            self._packet_conservation = False
+
+        # pace at the bottleneck bandwidth, but never slow down before the
+        # pipe is full
+        if self._btl_bw:
+            pacing_rate = self._pacing_gain * self._btl_bw
+            if (
+                self._filled_pipe
+                or self.pacing_rate is None
+                or pacing_rate > self.pacing_rate
+            ):
+                self.pacing_rate = pacing_rate
+
+    def on_rtt_measurement(self, latest_rtt: float, now: float) -> None:
+        pass
+
+    def _advance_cycle_phase(self, now: float) -> None:
+        self._cycle_index = (self._cycle_index + 1) % len(K_PACING_GAIN_CYCLE)
+        self._cycle_stamp = now
+        self._pacing_gain = K_PACING_GAIN_CYCLE[self._cycle_index]
+
+    def _bound_cwnd(self) -> None:
+        if self._state == BbrState.PROBE_RTT:
+            self.congestion_window = min(self.congestion_window, self._min_pipe_cwnd)
+        self.congestion_window = max(self.congestion_window, self._min_pipe_cwnd)
+
+    def _check_drain(self, now: float) -> None:
+        if self._state == BbrState.STARTUP and self._filled_pipe:
+            self._state = BbrState.DRAIN
+            self._pacing_gain = K_DRAIN_GAIN
+            self._cwnd_gain = K_HIGH_GAIN
+        if self._state == BbrState.DRAIN:
+            # the queue built during startup is gone
+            if self.bytes_in_flight <= self._inflight(1.0):
+                self._enter_probe_bw(now)
+
+    def _check_full_pipe(self, sample: QuicRateSample) -> None:
+        if self._filled_pipe or not self._round_start or sample.is_app_limited:
+            return
+
+        if self._btl_bw >= self._full_bw * K_FULL_BW_THRESHOLD:
+            # the bandwidth is still growing
+            self._full_bw = self._btl_bw
+            self._full_bw_count = 0
+        else:
+            self._full_bw_count += 1
+            if self._full_bw_count >= K_FULL_BW_COUNT:
+                self._filled_pipe = True
+
+    def _check_probe_rtt(self, now: float) -> None:
+        if self._state != BbrState.PROBE_RTT and self._rt_prop_expired:
+            self._save_cwnd()
+            self._state = BbrState.PROBE_RTT
+            self._pacing_gain = 1.0
+            self._cwnd_gain = 1.0
+            self._probe_rtt_done_stamp = None
+            self._bound_cwnd()
+
+        if self._state == BbrState.PROBE_RTT:
+            if (
+                self._probe_rtt_done_stamp is None
+                and self.bytes_in_flight <= self._min_pipe_cwnd
+            ):
+                self._probe_rtt_done_stamp = now + K_PROBE_RTT_DURATION
+                self._probe_rtt_round_done = False
+                self._next_round_delivered = self._delivered
+            elif self._probe_rtt_done_stamp is not None:
+                if self._round_start:
+                    self._probe_rtt_round_done = True
+                if self._probe_rtt_round_done and now > self._probe_rtt_done_stamp:
+                    self._rt_prop_stamp = now
+                    if self._filled_pipe:
+                        self._enter_probe_bw(now)
+                    else:
+                        self._state = BbrState.STARTUP
+                        self._pacing_gain = K_HIGH_GAIN
+                        self._cwnd_gain = K_HIGH_GAIN
+                    self._restore_cwnd()
+
+    def _enter_probe_bw(self, now: float) -> None:
+        self._state = BbrState.PROBE_BW
+        self._cwnd_gain = K_CWND_GAIN
+
+        # start at a random phase, other than the one which drains the queue
+        self._cycle_index = (
+            len(K_PACING_GAIN_CYCLE) - 1 - self._cycle_random.randrange(7)
+        )
+        self._advance_cycle_phase(now)
+
+    def _inflight(self, gain: float) -> int:
+        """
+        Return the given multiple of the bandwidth-delay product, plus some
+        headroom for delayed and aggregated ACKs.
+        """
+        if self._rt_prop == math.inf:
+            return K_INITIAL_WINDOW
+        return int(gain * self._btl_bw * self._rt_prop) + 3 * self.max_datagram_size
+
+    def _is_next_cycle_phase(self, now: float) -> bool:
+        is_full_length = now - self._cycle_stamp > self._rt_prop
+        if self._pacing_gain > 1:
+            # probe until the extra data is in flight, or there are losses
+            return is_full_length and (
+                self._has_losses
+                or self.bytes_in_flight >= self._inflight(self._pacing_gain)
+            )
+        elif self._pacing_gain < 1:
+            # drain until the queue built while probing is gone
+            return is_full_length or self.bytes_in_flight <= self._inflight(1.0)
+        return is_full_length
+
+    @property
+    def _min_pipe_cwnd(self) -> int:
+        return K_MIN_PIPE_CWND * self.max_datagram_size
+
+    def _restore_cwnd(self) -> None:
+        self.congestion_window = max(self.congestion_window, self._prior_cwnd)
+
+    def _save_cwnd(self) -> None:
+        if self._recovery_start_time is None and self._state != BbrState.PROBE_RTT:
+            self._prior_cwnd = self.congestion_window
+        else:
+            self._prior_cwnd = max(self._prior_cwnd, self.congestion_window)
+
+    def _update_btl_bw(self, sample: QuicRateSample) -> None:
+        # samples over less than a round trip are not reliable, but they still
+        # count towards round trips
+        if not sample.is_reliable:
+            return
+
+        # application-limited samples underestimate the bandwidth
+        delivery_rate = sample.delivery_rate
+        if delivery_rate < self._btl_bw and sample.is_app_limited:
+            return
+
+        btl_bw_filter = self._btl_bw_filter
+        while btl_bw_filter and btl_bw_filter[-1][1] <= delivery_rate:
+            btl_bw_filter.pop()
+        btl_bw_filter.append((self._round_count, delivery_rate))
+        while btl_bw_filter[0][0] + K_BTL_BW_FILTER_LENGTH <= self._round_count:
+            btl_bw_filter.popleft()
+        self._btl_bw = btl_bw_filter[0][1]
+
+    def _update_round(self, sample: QuicRateSample) -> None:
+        self._delivered = sample.prior_delivered + sample.delivered
+        if sample.prior_delivered >= self._next_round_delivered:
+            self._next_round_delivered = self._delivered
+            self._round_count += 1
+            self._round_start = True
+        else:
+            self._round_start = False
+
+    def _update_rt_prop(self, sample: QuicRateSample, now: float) -> None:
+        # the first sample starts the filter, it has nothing to expire
+        self._rt_prop_expired = (
+            self._rt_prop != math.inf
+            and now > self._rt_prop_stamp + K_RT_PROP_FILTER_LENGTH
+        )
+        if sample.rtt <= self._rt_prop or self._rt_prop_expired:
+            self._rt_prop = sample.rtt
+            self._rt_prop_stamp = now
+
+
+register_congestion_control("bbr", BbrCongestionControl)
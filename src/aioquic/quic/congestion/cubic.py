@@ -0,0 +1,139 @@
+from typing import Iterable, Optional
+
+from ..packet_builder import QuicSentPacket
+from .base import QuicCongestionControl, QuicHyStart, register_congestion_control
+
+# https://datatracker.ietf.org/doc/html/rfc9438#section-4
+K_CUBIC_C = 0.4
+K_CUBIC_BETA = 0.7
+K_CUBIC_ALPHA = 3 * (1 - K_CUBIC_BETA) / (1 + K_CUBIC_BETA)
+
+
+class CubicCongestionControl(QuicCongestionControl):
+    """
+    CUBIC congestion control.
+
+    After a congestion event, the window grows as a cubic function of the
+    time elapsed: quickly back towards the window at which the event
+    occurred, slowly around it, then increasingly faster beyond it. The
+    window never grows slower than New Reno would (the Reno-friendly region).
+
+    See: https://datatracker.ietf.org/doc/html/rfc9438
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._congestion_recovery_start_time = 0.0
+        self._congestion_stash = 0.0
+        self._cwnd_prior = 0
+        self._hystart = QuicHyStart()
+        self._k = 0.0
+        self._rtt = 0.0
+        self._t_epoch: Optional[float] = None
+        self._w_est = 0.0
+        self._w_max = 0.0
+
+    @property
+    def congestion_state(self) -> str:
+        if self.ssthresh is None and self._hystart.in_css:
+            return "conservative_slow_start"
+        return super().congestion_state
+
+    def on_congestion_experienced(self, sent_time: float, now: float) -> None:
+        self._on_congestion_event(sent_time, now=now)
+
+    def on_packet_acked(self, packet: QuicSentPacket, now: float) -> None:
+        self.bytes_in_flight -= packet.sent_bytes
+
+        # don't increase window in congestion recovery
+        if packet.sent_time <= self._congestion_recovery_start_time:
+            return
+
+        if self.ssthresh is None:
+            # slow start, which HyStart++ ends once the RTT increases
+            self.congestion_window += self._hystart.on_packet_acked(packet, now=now)
+            if self._hystart.is_done:
+                self.ssthresh = self.congestion_window
+            return
+        elif self.congestion_window < self.ssthresh:
+            # slow start
+            self.congestion_window += packet.sent_bytes
+            return
+
+        cwnd = self.congestion_window
+        if self._t_epoch is None:
+            # start of a congestion avoidance epoch
+            self._t_epoch = now
+            self._w_est = float(cwnd)
+            if cwnd < self._w_max:
+                self._k = (
+                    (self._w_max - cwnd) / (K_CUBIC_C * self.max_datagram_size)
+                ) ** (1 / 3)
+            else:
+                self._k = 0.0
+                self._w_max = float(cwnd)
+        t = now - self._t_epoch
+
+        # estimate the window New Reno would have, growing at the same
+        # rate as New Reno once the previous window is reached
+        alpha = 1.0 if self._w_est >= self._cwnd_prior else K_CUBIC_ALPHA
+        self._w_est += alpha * self.max_datagram_size * packet.sent_bytes / cwnd
+
+        if self._w_cubic(t) < self._w_est:
+            # Reno-friendly region
+            self.congestion_window = max(cwnd, int(self._w_est))
+        else:
+            # concave or convex region, aim for the window one RTT ahead
+            target = min(max(self._w_cubic(t + self._rtt), cwnd), 1.5 * cwnd)
+            self._congestion_stash += (target - cwnd) * packet.sent_bytes / cwnd
+            increase = int(self._congestion_stash)
+            if increase:
+                self._congestion_stash -= increase
+                self.congestion_window += increase
+
+    def on_packets_lost(self, packets: Iterable[QuicSentPacket], now: float) -> None:
+        lost_largest_time = 0.0
+        for packet in packets:
+            self.bytes_in_flight -= packet.sent_bytes
+            lost_largest_time = packet.sent_time
+
+        self._on_congestion_event(lost_largest_time, now=now)
+
+    def on_persistent_congestion(self, now: float) -> None:
+        super().on_persistent_congestion(now=now)
+        self._congestion_stash = 0.0
+        self._t_epoch = None
+
+    def on_rtt_measurement(self, latest_rtt: float, now: float) -> None:
+        self._rtt = latest_rtt
+        if self.ssthresh is None:
+            self._hystart.on_rtt_measurement(latest_rtt)
+
+    def _on_congestion_event(self, sent_time: float, now: float) -> None:
+        # start a new congestion event if packet was sent after the
+        # start of the previous congestion recovery period.
+        if sent_time > self._congestion_recovery_start_time:
+            self._congestion_recovery_start_time = now
+
+            # fast convergence: if the window stopped short of the previous
+            # maximum, release bandwidth for competing flows
+            cwnd = self.congestion_window
+            if cwnd < self._w_max:
+                self._w_max = cwnd * (1 + K_CUBIC_BETA) / 2
+            else:
+                self._w_max = float(cwnd)
+
+            self._congestion_stash = 0.0
+            self._cwnd_prior = cwnd
+            self._t_epoch = None
+            self.congestion_window = max(int(cwnd * K_CUBIC_BETA), self.minimum_window)
+            self.ssthresh = self.congestion_window
+
+    def _w_cubic(self, t: float) -> float:
+        """
+        Return the window in bytes, `t` seconds into the current epoch.
+        """
+        return K_CUBIC_C * (t - self._k) ** 3 * self.max_datagram_size + self._w_max
+
+
+register_congestion_control("cubic", CubicCongestionControl)
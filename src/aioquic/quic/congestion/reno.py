@@ -0,0 +1,80 @@
+from typing import Iterable
+
+from ..packet_builder import QuicSentPacket
+from .base import QuicCongestionControl, QuicHyStart, register_congestion_control
+
+K_LOSS_REDUCTION_FACTOR = 0.5
+
+
+class RenoCongestionControl(QuicCongestionControl):
+    """
+    New Reno congestion control.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._congestion_recovery_start_time = 0.0
+        self._congestion_stash = 0
+        self._hystart = QuicHyStart()
+
+    @property
+    def congestion_state(self) -> str:
+        if self.ssthresh is None and self._hystart.in_css:
+            return "conservative_slow_start"
+        return super().congestion_state
+
+    def on_congestion_experienced(self, sent_time: float, now: float) -> None:
+        self._on_congestion_event(sent_time, now=now)
+
+    def on_packet_acked(self, packet: QuicSentPacket, now: float) -> None:
+        self.bytes_in_flight -= packet.sent_bytes
+
+        # don't increase window in congestion recovery
+        if packet.sent_time <= self._congestion_recovery_start_time:
+            return
+
+        if self.ssthresh is None:
+            # slow start, which HyStart++ ends once the RTT increases
+            self.congestion_window += self._hystart.on_packet_acked(packet, now=now)
+            if self._hystart.is_done:
+                self.ssthresh = self.congestion_window
+        elif self.congestion_window < self.ssthresh:
+            # slow start
+            self.congestion_window += packet.sent_bytes
+        else:
+            # congestion avoidance
+            self._congestion_stash += packet.sent_bytes
+            count = self._congestion_stash // self.congestion_window
+            if count:
+                self._congestion_stash -= count * self.congestion_window
+                self.congestion_window += count * self.max_datagram_size
+
+    def on_packets_lost(self, packets: Iterable[QuicSentPacket], now: float) -> None:
+        lost_largest_time = 0.0
+        for packet in packets:
+            self.bytes_in_flight -= packet.sent_bytes
+            lost_largest_time = packet.sent_time
+
+        self._on_congestion_event(lost_largest_time, now=now)
+
+    def on_persistent_congestion(self, now: float) -> None:
+        super().on_persistent_congestion(now=now)
+        self._congestion_stash = 0
+
+    def on_rtt_measurement(self, latest_rtt: float, now: float) -> None:
+        if self.ssthresh is None:
+            self._hystart.on_rtt_measurement(latest_rtt)
+
+    def _on_congestion_event(self, sent_time: float, now: float) -> None:
+        # start a new congestion event if packet was sent after the
+        # start of the previous congestion recovery period.
+        if sent_time > self._congestion_recovery_start_time:
+            self._congestion_recovery_start_time = now
+            self.congestion_window = max(
+                int(self.congestion_window * K_LOSS_REDUCTION_FACTOR),
+                self.minimum_window,
+            )
+            self.ssthresh = self.congestion_window
+
+
+register_congestion_control("reno", RenoCongestionControl)
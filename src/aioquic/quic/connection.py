@@ -5,7 +5,19 @@ from collections import deque
 from dataclasses import dataclass
 from enum import Enum
 from functools import partial
-from typing import Any, Deque, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 from .. import tls
 from ..buffer import (
@@ -17,10 +29,16 @@ from ..buffer import (
 )
 from . import events
 from .configuration import QuicConfiguration
+from .connection_id import QuicConnectionIdGenerator
 from .crypto import CryptoError, CryptoPair, KeyUnavailableError
 from .logger import QuicLoggerTrace
 from .packet import (
     CONNECTION_ID_MAX_SIZE,
+    ECN_CE,
+    ECN_ECT0,
+    ECN_ECT1,
+    ECN_MASK,
+    ECN_NOT_ECT,
     NON_ACK_ELICITING_FRAME_TYPES,
     PACKET_TYPE_HANDSHAKE,
     PACKET_TYPE_INITIAL,
@@ -30,6 +48,7 @@ from .packet import (
     PROBING_FRAME_TYPES,
     RETRY_INTEGRITY_TAG_SIZE,
     STATELESS_RESET_TOKEN_SIZE,
+    QuicEcnCounts,
     QuicErrorCode,
     QuicFrameType,
     QuicProtocolVersion,
@@ -40,9 +59,11 @@ from .packet import (
     is_draft_version,
     is_long_header,
     pull_ack_frame,
+    pull_ecn_counts,
     pull_quic_header,
     pull_quic_transport_parameters,
     push_ack_frame,
+    push_ecn_counts,
     push_quic_transport_parameters,
 )
 from .packet_builder import (
@@ -50,9 +71,11 @@ from .packet_builder import (
     QuicDeliveryState,
     QuicPacketBuilder,
     QuicPacketBuilderStop,
+    QuicSentPacket,
 )
-from .recovery import K_GRANULARITY, QuicPacketRecovery, QuicPacketSpace
-from .stream import FinalSizeError, QuicStream, StreamFinishedError
+from .recovery import K_GRANULARITY, QuicEcnState, QuicPacketRecovery, QuicPacketSpace
+from .scheduler import URGENCY_COUNT, QuicStreamScheduler
+from .stream import FinalSizeError, QuicStream, QuicStreamProducer, StreamFinishedError
 
 logger = logging.getLogger("quic")
 
@@ -83,9 +106,12 @@ STREAM_COUNT_MAX = 0x1000000000000000
 UDP_HEADER_SIZE = 8
 
 NetworkAddress = Any
+QuicTokenHandler = Callable[[bytes], None]
+QuicTokenIssuer = Callable[[NetworkAddress], bytes]
 
 # frame sizes
 ACK_FRAME_CAPACITY = 64  # FIXME: this is arbitrary!
+ACK_ECN_FRAME_CAPACITY = ACK_FRAME_CAPACITY + 3 * UINT_VAR_MAX_SIZE
 APPLICATION_CLOSE_FRAME_CAPACITY = 1 + 2 * UINT_VAR_MAX_SIZE  # + reason length
 CONNECTION_LIMIT_FRAME_CAPACITY = 1 + UINT_VAR_MAX_SIZE
 HANDSHAKE_DONE_FRAME_CAPACITY = 1
@@ -230,6 +256,15 @@ class QuicConnection:
     - a timer firing (see :meth:`handle_timer`)
 
     :param configuration: The QUIC configuration to use.
+    :param token_handler: For clients, a callback which is invoked with the
+        address validation tokens received in NEW_TOKEN frames.
+    :param token_issuer: For servers, a callback which returns an address
+        validation token for the given client address. The token is sent in a
+        NEW_TOKEN frame once the handshake completes.
+    :param signature_request_handler: For servers, a callback which is invoked
+        with the data to sign for the CertificateVerify message and the
+        signature algorithm, instead of signing it synchronously. The handshake
+        resumes when the signature is passed to :meth:`handle_signature`.
     """
 
     def __init__(
@@ -240,6 +275,9 @@ class QuicConnection:
         retry_source_connection_id: Optional[bytes] = None,
         session_ticket_fetcher: Optional[tls.SessionTicketFetcher] = None,
         session_ticket_handler: Optional[tls.SessionTicketHandler] = None,
+        signature_request_handler: Optional[tls.SignatureRequestHandler] = None,
+        token_handler: Optional[QuicTokenHandler] = None,
+        token_issuer: Optional[QuicTokenIssuer] = None,
     ) -> None:
         if configuration.is_client:
             assert (
@@ -274,9 +312,14 @@ class QuicConnection:
         self._events: Deque[events.QuicEvent] = deque()
         self._handshake_complete = False
         self._handshake_confirmed = False
+        self._host_cid_generator = (
+            configuration.connection_id_generator or QuicConnectionIdGenerator()
+        )
         self._host_cids = [
             QuicConnectionId(
-                cid=os.urandom(configuration.connection_id_length),
+                cid=self._host_cid_generator.generate_connection_id(
+                    configuration.connection_id_length
+                ),
                 sequence_number=0,
                 stateless_reset_token=os.urandom(16) if not self._is_client else None,
                 was_sent=True,
@@ -313,7 +356,7 @@ class QuicConnection:
         )
         self._peer_cid_available: List[QuicConnectionId] = []
         self._peer_cid_sequence_numbers: Set[int] = set([0])
-        self._peer_token = b""
+        self._peer_token = configuration.token if configuration.is_client else b""
         self._quic_logger: Optional[QuicLoggerTrace] = None
         self._remote_ack_delay_exponent = 3
         self._remote_active_connection_id_limit = 2
@@ -327,6 +370,7 @@ class QuicConnection:
         self._remote_max_stream_data_uni = 0
         self._remote_max_streams_bidi = 0
         self._remote_max_streams_uni = 0
+        self._remote_max_udp_payload_size: Optional[int] = None
         self._retry_count = 0
         self._retry_source_connection_id = retry_source_connection_id
         self._spaces: Dict[tls.Epoch, QuicPacketSpace] = {}
@@ -337,6 +381,15 @@ class QuicConnection:
         self._streams_blocked_bidi: List[QuicStream] = []
         self._streams_blocked_uni: List[QuicStream] = []
         self._streams_finished: Set[int] = set()
+        self._streams_pending: Dict[int, QuicStream] = {}
+        self._streams_scheduler = QuicStreamScheduler(
+            quantum=configuration.incremental_stream_quantum
+        )
+        self._streams_write_paused: Set[int] = set()
+        self._write_buffer_full = False
+        self._write_buffer_high: Optional[int] = None
+        self._write_buffer_low = 0
+        self._write_buffer_size = 0
         self._version: Optional[int] = None
         self._version_negotiation_count = 0
 
@@ -359,6 +412,7 @@ class QuicConnection:
 
         # loss recovery
         self._loss = QuicPacketRecovery(
+            congestion_control_algorithm=configuration.congestion_control_algorithm,
             initial_rtt=configuration.initial_rtt,
             peer_completed_address_validation=not self._is_client,
             quic_logger=self._quic_logger,
@@ -370,6 +424,7 @@ class QuicConnection:
         self._close_pending = False
         self._datagrams_pending: Deque[bytes] = deque()
         self._handshake_done_pending = False
+        self._new_token_pending: Optional[bytes] = None
         self._ping_pending: List[int] = []
         self._probe_pending = False
         self._retire_connection_ids: List[int] = []
@@ -378,6 +433,9 @@ class QuicConnection:
         # callbacks
         self._session_ticket_fetcher = session_ticket_fetcher
         self._session_ticket_handler = session_ticket_handler
+        self._signature_request_handler = signature_request_handler
+        self._token_handler = token_handler
+        self._token_issuer = token_issuer
 
         # frame handlers
         self.__frame_handlers = {
@@ -420,6 +478,17 @@ class QuicConnection:
     def configuration(self) -> QuicConfiguration:
         return self._configuration
 
+    @property
+    def ecn_codepoint(self) -> int:
+        """
+        The ECN codepoint with which outgoing datagrams should be marked.
+
+        Datagrams are marked ECT(0) unless ECN validation failed.
+        """
+        if self._loss.ecn_state == QuicEcnState.FAILED:
+            return ECN_NOT_ECT
+        return ECN_ECT0
+
     @property
     def original_destination_connection_id(self) -> bytes:
         return self._original_destination_connection_id
@@ -497,11 +566,15 @@ class QuicConnection:
         if self._state in END_STATES:
             return []
 
+        # probe the path MTU, with a datagram of its own
+        probe_datagrams, probe_packets = self._build_pmtu_probe(network_path, now)
+
         # build datagrams
         builder = QuicPacketBuilder(
             host_cid=self.host_cid,
             is_client=self._is_client,
-            packet_number=self._packet_number,
+            max_datagram_size=self._loss.max_datagram_size,
+            packet_number=self._packet_number + len(probe_packets),
             peer_cid=self._peer_cid.cid,
             peer_token=self._peer_token,
             quic_logger=self._quic_logger,
@@ -537,10 +610,15 @@ class QuicConnection:
         else:
             # congestion control
             builder.max_flight_bytes = (
-                self._loss.congestion_window - self._loss.bytes_in_flight
+                self._loss.congestion_window
+                - self._loss.bytes_in_flight
+                - sum(map(len, probe_datagrams))
             )
-            if self._probe_pending and builder.max_flight_bytes < PACKET_MAX_SIZE:
-                builder.max_flight_bytes = PACKET_MAX_SIZE
+            if (
+                self._probe_pending
+                and builder.max_flight_bytes < self._loss.max_datagram_size
+            ):
+                builder.max_flight_bytes = self._loss.max_datagram_size
 
             # limit data on un-validated network paths
             if not network_path.is_validated:
@@ -557,6 +635,8 @@ class QuicConnection:
                 pass
 
         datagrams, packets = builder.flush()
+        datagrams = probe_datagrams + datagrams
+        packets = probe_packets + packets
 
         if datagrams:
             self._packet_number = builder.packet_number
@@ -650,6 +730,42 @@ class QuicConnection:
 
         return timer_at
 
+    def get_write_buffer_size(self, stream_id: Optional[int] = None) -> int:
+        """
+        Return the number of bytes which were written but not acknowledged yet.
+
+        :param stream_id: The stream's ID, or `None` for the whole connection.
+        """
+        if stream_id is None:
+            return self._write_buffer_size
+
+        stream = self._streams.get(stream_id, None)
+        if stream is None:
+            return 0
+        return stream.sender.buffered_size
+
+    def handle_signature(self, signature: bytes) -> None:
+        """
+        Resume the handshake with the CertificateVerify signature requested
+        from the `signature_request_handler`.
+
+        After calling this method call :meth:`datagrams_to_send` to retrieve data
+        which needs to be sent.
+
+        :param signature: The signature of the data passed to the handler.
+        """
+        if self._state in END_STATES or self._close_pending:
+            return
+        try:
+            self.tls.handle_signature(signature, self._crypto_buffers)
+            self._push_crypto_data()
+        except tls.Alert as exc:
+            self.close(
+                error_code=QuicErrorCode.CRYPTO_ERROR + int(exc.description),
+                frame_type=QuicFrameType.CRYPTO,
+                reason_phrase=str(exc),
+            )
+
     def handle_timer(self, now: float) -> None:
         """
         Handle the timer.
@@ -675,6 +791,18 @@ class QuicConnection:
             self._logger.debug("Loss detection triggered")
             self._loss.on_loss_detection_timeout(now=now)
 
+    def is_stream_writable(self, stream_id: int) -> bool:
+        """
+        Return whether data can be written to the specific stream without
+        exceeding the write buffer limits.
+
+        If this returns `False`, a :class:`~aioquic.quic.events.StreamWritable`
+        event is fired once enough data has been acknowledged.
+
+        :param stream_id: The stream's ID.
+        """
+        return stream_id not in self._streams_write_paused
+
     def next_event(self) -> Optional[events.QuicEvent]:
         """
         Retrieve the next event from the event buffer.
@@ -686,7 +814,9 @@ class QuicConnection:
         except IndexError:
             return None
 
-    def receive_datagram(self, data: bytes, addr: NetworkAddress, now: float) -> None:
+    def receive_datagram(
+        self, data: bytes, addr: NetworkAddress, now: float, ecn: int = ECN_NOT_ECT
+    ) -> None:
         """
         Handle an incoming datagram.
 
@@ -696,6 +826,7 @@ class QuicConnection:
         :param data: The datagram which was received.
         :param addr: The network address from which the datagram was received.
         :param now: The current time.
+        :param ecn: The ECN codepoint of the IP header which carried the datagram.
         """
         # stop handling packets when closing
         if self._state in END_STATES:
@@ -1043,6 +1174,17 @@ class QuicConnection:
                 if is_ack_eliciting and space.ack_at is None:
                     space.ack_at = now + self._ack_delay
 
+                # count ECN codepoints, reporting congestion immediately
+                ecn &= ECN_MASK
+                if ecn == ECN_ECT0:
+                    space.ecn_counts.ect0 += 1
+                elif ecn == ECN_ECT1:
+                    space.ecn_counts.ect1 += 1
+                elif ecn == ECN_CE:
+                    space.ecn_counts.ce += 1
+                    if is_ack_eliciting:
+                        space.ack_at = now
+
     def request_key_update(self) -> None:
         """
         Request an update of the encryption keys.
@@ -1058,7 +1200,7 @@ class QuicConnection:
         :param error_code: An error code indicating why the stream is being reset.
         """
         stream = self._get_or_create_stream_for_send(stream_id)
-        stream.sender.reset(error_code)
+        self._reset_stream_sender(stream, error_code)
 
     def send_ping(self, uid: int) -> None:
         """
@@ -1077,17 +1219,94 @@ class QuicConnection:
         self._datagrams_pending.append(data)
 
     def send_stream_data(
-        self, stream_id: int, data: bytes, end_stream: bool = False
+        self,
+        stream_id: int,
+        data: Union[bytes, QuicStreamProducer],
+        end_stream: bool = False,
     ) -> None:
         """
         Send data on the specific stream.
 
         :param stream_id: The stream's ID.
-        :param data: The data to be sent.
+        :param data: The data to be sent, or a
+                     :class:`~aioquic.quic.stream.QuicStreamProducer` which is
+                     read when the stream is ready to send more data.
         :param end_stream: If set to `True`, the FIN bit will be set.
         """
         stream = self._get_or_create_stream_for_send(stream_id)
+        buffered_size = stream.sender.buffered_size
         stream.sender.write(data, end_stream=end_stream)
+        self._write_buffer_size += stream.sender.buffered_size - buffered_size
+        if not stream.sender.buffer_is_empty:
+            self._streams_scheduler.add(stream)
+
+        # check the write buffer limits
+        if self._update_write_buffer_full(stream):
+            self._streams_write_paused.add(stream_id)
+
+    def set_stream_priority(
+        self, stream_id: int, urgency: int = 3, incremental: bool = False
+    ) -> None:
+        """
+        Set the priority with which data is sent on the specific stream.
+
+        Streams with a lower urgency are served first. Streams sharing an
+        urgency are served one at a time in stream ID order, unless they are
+        incremental in which case they share bandwidth in a round-robin fashion.
+
+        :param stream_id: The stream's ID.
+        :param urgency: The urgency, from 0 (highest) to 7 (lowest).
+        :param incremental: Whether the stream's data can be processed
+                            incrementally by the peer.
+        """
+        if urgency not in range(URGENCY_COUNT):
+            raise ValueError("Urgency must be between 0 and %d" % (URGENCY_COUNT - 1))
+
+        # the stream was created, but its state was since discarded
+        if stream_id in self._streams_finished:
+            return
+
+        stream = self._get_or_create_stream_for_send(stream_id)
+        self._streams_scheduler.update(
+            stream, urgency=urgency, incremental=bool(incremental)
+        )
+
+    def set_write_buffer_limits(
+        self,
+        high: Optional[int] = None,
+        low: Optional[int] = None,
+        stream_id: Optional[int] = None,
+    ) -> None:
+        """
+        Set the high and low watermarks for the write buffer.
+
+        Once more than `high` bytes are buffered, :meth:`is_stream_writable`
+        returns `False`. A :class:`~aioquic.quic.events.StreamWritable` event
+        is fired when no more than `low` bytes remain buffered.
+
+        :param high: The high watermark, which defaults to 64 KiB.
+        :param low: The low watermark, which defaults to a quarter of `high`.
+        :param stream_id: The stream's ID, or `None` for the whole connection.
+        """
+        if high is None:
+            high = 64 * 1024 if low is None else 4 * low
+        if low is None:
+            low = high // 4
+        if not high >= low >= 0:
+            raise ValueError(
+                "High watermark (%d) must be >= low watermark (%d) >= 0" % (high, low)
+            )
+
+        if stream_id is None:
+            self._write_buffer_high = high
+            self._write_buffer_low = low
+            candidates = list(self._streams_write_paused)
+        else:
+            stream = self._get_or_create_stream_for_send(stream_id)
+            stream.write_buffer_high = high
+            stream.write_buffer_low = low
+            candidates = [stream_id]
+        self._update_write_paused(candidates)
 
     def stop_stream(self, stream_id: int, error_code: int) -> None:
         """
@@ -1106,6 +1325,7 @@ class QuicConnection:
             raise ValueError("Cannot stop receiving on an unknown stream")
 
         stream.receiver.stop(error_code)
+        self._mark_stream_pending(stream)
 
     # Private
 
@@ -1137,6 +1357,43 @@ class QuicConnection:
                 reason_phrase="Stream is receive-only",
             )
 
+    def _build_pmtu_probe(
+        self, network_path: QuicNetworkPath, now: float
+    ) -> Tuple[List[bytes], List[QuicSentPacket]]:
+        """
+        Build a path MTU probe, if one is due and fits in the congestion window.
+        """
+        if (
+            self._close_pending
+            or not self._handshake_confirmed
+            or not network_path.is_validated
+        ):
+            return [], []
+
+        crypto = self._cryptos[tls.Epoch.ONE_RTT]
+        probe_size = self._loss.pmtu.get_probe_size(now=now)
+        if (
+            probe_size is None
+            or not crypto.send.is_valid()
+            or self._loss.congestion_window - self._loss.bytes_in_flight < probe_size
+        ):
+            return [], []
+
+        builder = QuicPacketBuilder(
+            host_cid=self.host_cid,
+            is_client=self._is_client,
+            max_datagram_size=probe_size,
+            packet_number=self._packet_number,
+            peer_cid=self._peer_cid.cid,
+            peer_token=self._peer_token,
+            quic_logger=self._quic_logger,
+            spin_bit=self._spin_bit,
+            version=self._version,
+        )
+        builder.start_packet(PACKET_TYPE_ONE_RTT, crypto, is_pmtu_probe=True)
+        self._write_ping_frame(builder, comment="path MTU probe")
+        return builder.flush()
+
     def _consume_peer_cid(self) -> None:
         """
         Update the destination connection ID by taking the next
@@ -1324,8 +1581,10 @@ class QuicConnection:
             verify_mode=self._configuration.verify_mode,
         )
         self.tls.certificate = self._configuration.certificate
+        self.tls.certificate_cache = self._configuration.certificate_cache
         self.tls.certificate_chain = self._configuration.certificate_chain
         self.tls.certificate_private_key = self._configuration.private_key
+        self.tls.key_share_pool = self._configuration.key_share_pool
         self.tls.handshake_extensions = [
             (
                 get_transport_parameters_extension(self._version),
@@ -1358,6 +1617,8 @@ class QuicConnection:
             self.tls.get_session_ticket_cb = self._session_ticket_fetcher
         if self._session_ticket_handler is not None:
             self.tls.new_session_ticket_cb = self._handle_session_ticket
+        if self._signature_request_handler is not None:
+            self.tls.signature_request_cb = self._signature_request_handler
         self.tls.update_traffic_key_cb = self._update_traffic_key
 
         # packet spaces
@@ -1415,15 +1676,17 @@ class QuicConnection:
         """
         ack_rangeset, ack_delay_encoded = pull_ack_frame(buf)
         if frame_type == QuicFrameType.ACK_ECN:
-            buf.pull_uint_var()
-            buf.pull_uint_var()
-            buf.pull_uint_var()
+            ecn_counts = pull_ecn_counts(buf)
+        else:
+            ecn_counts = None
         ack_delay = (ack_delay_encoded << self._remote_ack_delay_exponent) / 1000000
 
         # log frame
         if self._quic_logger is not None:
             context.quic_logger_frames.append(
-                self._quic_logger.encode_ack_frame(ack_rangeset, ack_delay)
+                self._quic_logger.encode_ack_frame(
+                    ack_rangeset, ack_delay, ecn_counts=ecn_counts
+                )
             )
 
         # check whether peer completed address validation
@@ -1437,6 +1700,7 @@ class QuicConnection:
             space=self._spaces[context.epoch],
             ack_rangeset=ack_rangeset,
             ack_delay=ack_delay,
+            ecn_counts=ecn_counts,
             now=context.time,
         )
 
@@ -1546,6 +1810,11 @@ class QuicConnection:
                     self._discard_epoch(tls.Epoch.HANDSHAKE)
                     self._handshake_confirmed = True
                     self._handshake_done_pending = True
+                    if self._token_issuer is not None:
+                        self._new_token_pending = self._token_issuer(
+                            context.network_path.addr
+                        )
+                    self._start_pmtu_discovery(now=context.time)
 
                 self._replenish_connection_ids()
                 self._events.append(
@@ -1645,6 +1914,7 @@ class QuicConnection:
             self._discard_epoch(tls.Epoch.HANDSHAKE)
             self._handshake_confirmed = True
             self._loss.peer_completed_address_validation = True
+            self._start_pmtu_discovery(now=context.time)
 
     def _handle_max_data_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
@@ -1859,6 +2129,9 @@ class QuicConnection:
                 reason_phrase="Clients must not send NEW_TOKEN frames",
             )
 
+        if self._token_handler is not None:
+            self._token_handler(token)
+
     def _handle_padding_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -1985,6 +2258,7 @@ class QuicConnection:
         if event is not None:
             self._events.append(event)
         self._local_max_data.used += newly_received
+        self._mark_stream_pending(stream)
 
     def _handle_retire_connection_id_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
@@ -2052,7 +2326,7 @@ class QuicConnection:
 
         # reset the stream
         stream = self._get_or_create_stream(frame_type, stream_id)
-        stream.sender.reset(error_code=QuicErrorCode.NO_ERROR)
+        self._reset_stream_sender(stream, QuicErrorCode.NO_ERROR)
 
     def _handle_stream_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
@@ -2116,6 +2390,7 @@ class QuicConnection:
         if event is not None:
             self._events.append(event)
         self._local_max_data.used += newly_received
+        self._mark_stream_pending(stream)
 
     def _handle_stream_data_blocked_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
@@ -2184,6 +2459,14 @@ class QuicConnection:
                 data={"key_type": key_type, "trigger": trigger},
             )
 
+    def _mark_stream_pending(self, stream: QuicStream) -> None:
+        """
+        Queue a stream whose control frames or state need to be looked at
+        when the next packet is built.
+        """
+        if stream.stream_id not in self._streams_finished:
+            self._streams_pending[stream.stream_id] = stream
+
     def _on_ack_delivery(
         self, delivery: QuicDeliveryState, space: QuicPacketSpace, highest_acked: int
     ) -> None:
@@ -2217,6 +2500,7 @@ class QuicConnection:
         """
         if delivery != QuicDeliveryState.ACKED:
             stream.max_stream_data_local_sent = 0
+            self._mark_stream_pending(stream)
 
     def _on_new_connection_id_delivery(
         self, delivery: QuicDeliveryState, connection_id: QuicConnectionId
@@ -2227,6 +2511,13 @@ class QuicConnection:
         if delivery != QuicDeliveryState.ACKED:
             connection_id.was_sent = False
 
+    def _on_new_token_delivery(self, delivery: QuicDeliveryState, token: bytes) -> None:
+        """
+        Callback when a NEW_TOKEN frame is acknowledged or lost.
+        """
+        if delivery != QuicDeliveryState.ACKED:
+            self._new_token_pending = token
+
     def _on_ping_delivery(
         self, delivery: QuicDeliveryState, uids: Sequence[int]
     ) -> None:
@@ -2240,6 +2531,15 @@ class QuicConnection:
         else:
             self._ping_pending.extend(uids)
 
+    def _on_reset_stream_delivery(
+        self, delivery: QuicDeliveryState, stream: QuicStream
+    ) -> None:
+        """
+        Callback when a RESET_STREAM frame is acknowledged or lost.
+        """
+        stream.sender.on_reset_delivery(delivery)
+        self._mark_stream_pending(stream)
+
     def _on_retire_connection_id_delivery(
         self, delivery: QuicDeliveryState, sequence_number: int
     ) -> None:
@@ -2249,6 +2549,45 @@ class QuicConnection:
         if delivery != QuicDeliveryState.ACKED:
             self._retire_connection_ids.append(sequence_number)
 
+    def _on_stop_sending_delivery(
+        self, delivery: QuicDeliveryState, stream: QuicStream
+    ) -> None:
+        """
+        Callback when a STOP_SENDING frame is acknowledged or lost.
+        """
+        stream.receiver.on_stop_sending_delivery(delivery)
+        if delivery != QuicDeliveryState.ACKED:
+            self._mark_stream_pending(stream)
+
+    def _on_stream_data_delivery(
+        self, delivery: QuicDeliveryState, stream: QuicStream, start: int, stop: int
+    ) -> None:
+        """
+        Callback when a STREAM frame is acknowledged or lost.
+        """
+        buffered_size = stream.sender.buffered_size
+        stream.sender.on_data_delivery(delivery, start, stop)
+        if stream.sender.buffered_size != buffered_size:
+            self._on_write_buffer_released(
+                stream, buffered_size - stream.sender.buffered_size
+            )
+        if stream.is_finished:
+            self._mark_stream_pending(stream)
+        elif not stream.sender.buffer_is_empty:
+            self._streams_scheduler.add(stream)
+
+    def _on_write_buffer_released(self, stream: QuicStream, size: int) -> None:
+        """
+        Account for `size` bytes leaving the write buffer of a stream.
+        """
+        self._write_buffer_size -= size
+        if self._write_buffer_full:
+            if self._write_buffer_size <= self._write_buffer_low:
+                # the connection went below its low watermark
+                self._update_write_paused(list(self._streams_write_paused))
+        elif stream.stream_id in self._streams_write_paused:
+            self._update_write_paused([stream.stream_id])
+
     def _payload_received(
         self, context: QuicReceiveContext, plain: bytes
     ) -> Tuple[bool, bool]:
@@ -2321,7 +2660,9 @@ class QuicConnection:
         while len(self._host_cids) < min(8, self._remote_active_connection_id_limit):
             self._host_cids.append(
                 QuicConnectionId(
-                    cid=os.urandom(self._configuration.connection_id_length),
+                    cid=self._host_cid_generator.generate_connection_id(
+                        self._configuration.connection_id_length
+                    ),
                     sequence_number=self._host_cid_seq,
                     stateless_reset_token=os.urandom(16),
                 )
@@ -2486,6 +2827,9 @@ class QuicConnection:
         self._remote_max_datagram_frame_size = (
             quic_transport_parameters.max_datagram_frame_size
         )
+        self._remote_max_udp_payload_size = (
+            quic_transport_parameters.max_udp_payload_size
+        )
         for param in [
             "max_data",
             "max_stream_data_bidi_local",
@@ -2539,10 +2883,31 @@ class QuicConnection:
         push_quic_transport_parameters(buf, quic_transport_parameters)
         return buf.data
 
+    def _reset_stream_sender(self, stream: QuicStream, error_code: int) -> None:
+        """
+        Abruptly terminate the sending part of a stream and queue RESET_STREAM.
+        """
+        buffered_size = stream.sender.buffered_size
+        stream.sender.reset(error_code)
+        self._streams_scheduler.remove(stream)
+        self._mark_stream_pending(stream)
+
+        # the buffered data is dropped, wake up any writer waiting on the stream
+        self._on_write_buffer_released(stream, buffered_size)
+
     def _set_state(self, state: QuicConnectionState) -> None:
         self._logger.debug("%s -> %s", self._state, state)
         self._state = state
 
+    def _start_pmtu_discovery(self, now: float) -> None:
+        """
+        Start searching for the largest datagram size the path supports.
+        """
+        max_size = self._configuration.max_datagram_size
+        if self._remote_max_udp_payload_size is not None:
+            max_size = min(max_size, self._remote_max_udp_payload_size)
+        self._loss.pmtu.start(max_size=max_size, now=now)
+
     def _stream_can_receive(self, stream_id: int) -> bool:
         return stream_is_client_initiated(
             stream_id
@@ -2553,6 +2918,25 @@ class QuicConnection:
             stream_id
         ) == self._is_client or not stream_is_unidirectional(stream_id)
 
+    def _update_write_buffer_full(self, stream: QuicStream) -> bool:
+        """
+        Record whether the write buffer of a stream or of the connection went
+        above its high watermark, and return whether the stream must pause.
+
+        Each stays full until it goes back below its own low watermark.
+        """
+        if (
+            stream.write_buffer_high is not None
+            and stream.sender.buffered_size > stream.write_buffer_high
+        ):
+            stream.write_buffer_full = True
+        if (
+            self._write_buffer_high is not None
+            and self._write_buffer_size > self._write_buffer_high
+        ):
+            self._write_buffer_full = True
+        return stream.write_buffer_full or self._write_buffer_full
+
     def _unblock_streams(self, is_unidirectional: bool) -> None:
         if is_unidirectional:
             max_stream_data_remote = self._remote_max_stream_data_uni
@@ -2601,6 +2985,37 @@ class QuicConnection:
                 cipher_suite=cipher_suite, secret=secret, version=self._version
             )
 
+    def _update_write_paused(self, stream_ids: List[int]) -> None:
+        """
+        Fire a StreamWritable event for the given streams if they were paused
+        and neither their write buffer nor the connection's is full.
+
+        The stream and connection limits are evaluated independently, so a
+        stream which was only paused by the connection resumes as soon as the
+        connection goes below its low watermark.
+        """
+        if self._write_buffer_full:
+            if (
+                self._write_buffer_high is not None
+                and self._write_buffer_size > self._write_buffer_low
+            ):
+                return
+            self._write_buffer_full = False
+
+        for stream_id in stream_ids:
+            if stream_id not in self._streams_write_paused:
+                continue
+            stream = self._streams.get(stream_id, None)
+            if stream is not None and stream.write_buffer_full:
+                if (
+                    stream.write_buffer_high is not None
+                    and stream.sender.buffered_size > stream.write_buffer_low
+                ):
+                    continue
+                stream.write_buffer_full = False
+            self._streams_write_paused.discard(stream_id)
+            self._events.append(events.StreamWritable(stream_id=stream_id))
+
     def _write_application(
         self, builder: QuicPacketBuilder, network_path: QuicNetworkPath, now: float
     ) -> None:
@@ -2618,7 +3033,7 @@ class QuicConnection:
 
         while True:
             # apply pacing, except if we have ACKs to send
-            if space.ack_at is None or space.ack_at >= now:
+            if space.ack_at is None or space.ack_at > now:
                 self._pacing_at = self._loss._pacer.next_send_time(now=now)
                 if self._pacing_at is not None:
                     break
@@ -2634,6 +3049,13 @@ class QuicConnection:
                     self._write_handshake_done_frame(builder=builder)
                     self._handshake_done_pending = False
 
+                # NEW_TOKEN
+                if self._new_token_pending is not None:
+                    self._write_new_token_frame(
+                        builder=builder, token=self._new_token_pending
+                    )
+                    self._new_token_pending = None
+
                 # PATH CHALLENGE
                 if (
                     not network_path.is_validated
@@ -2686,7 +3108,7 @@ class QuicConnection:
                 self._write_connection_limits(builder=builder, space=space)
 
             # stream-level limits
-            for stream in self._streams.values():
+            for stream in self._streams_pending.values():
                 self._write_stream_limits(builder=builder, space=space, stream=stream)
 
             # PING (user-request)
@@ -2717,12 +3139,15 @@ class QuicConnection:
                 except QuicPacketBuilderStop:
                     break
 
-            for stream in list(self._streams.values()):
+            for stream in list(self._streams_pending.values()):
                 # if the stream is finished, discard it
                 if stream.is_finished:
                     self._logger.debug("Stream %d discarded", stream.stream_id)
                     self._streams.pop(stream.stream_id)
                     self._streams_finished.add(stream.stream_id)
+                    self._streams_pending.pop(stream.stream_id)
+                    self._streams_scheduler.remove(stream)
+                    self._streams_write_paused.discard(stream.stream_id)
                     continue
 
                 if stream.receiver.stop_pending:
@@ -2732,9 +3157,14 @@ class QuicConnection:
                 if stream.sender.reset_pending:
                     # RESET_STREAM
                     self._write_reset_stream_frame(builder=builder, stream=stream)
-                elif not stream.is_blocked and not stream.sender.buffer_is_empty:
-                    # STREAM
-                    self._remote_max_data_used += self._write_stream_frame(
+
+                # all control frames were written, stop looking at the stream
+                self._streams_pending.pop(stream.stream_id)
+
+            # STREAM, in priority order
+            for stream in self._streams_scheduler:
+                if not stream.is_blocked and not stream.sender.buffer_is_empty:
+                    sent = self._write_stream_frame(
                         builder=builder,
                         space=space,
                         stream=stream,
@@ -2745,8 +3175,16 @@ class QuicConnection:
                             stream.max_stream_data_remote,
                         ),
                     )
+                    self._remote_max_data_used += sent
+                    if stream.priority_incremental:
+                        self._streams_scheduler.on_data_sent(stream, sent)
+                if stream.sender.buffer_is_empty:
+                    self._streams_scheduler.remove(stream)
 
             if builder.packet_is_empty:
+                # we ran out of data before filling the congestion window
+                if builder.remaining_flight_space >= builder.remaining_buffer_space:
+                    self._loss.on_application_limited()
                 break
             else:
                 self._loss._pacer.update_after_send(now=now)
@@ -2801,20 +3239,32 @@ class QuicConnection:
         ack_delay = now - space.largest_received_time
         ack_delay_encoded = int(ack_delay * 1000000) >> self._local_ack_delay_exponent
 
+        # report ECN counts once any ECN-marked packet was received
+        ecn_counts: Optional[QuicEcnCounts] = space.ecn_counts
+        if ecn_counts.ect0 or ecn_counts.ect1 or ecn_counts.ce:
+            frame_type = QuicFrameType.ACK_ECN
+            capacity = ACK_ECN_FRAME_CAPACITY
+        else:
+            ecn_counts = None
+            frame_type = QuicFrameType.ACK
+            capacity = ACK_FRAME_CAPACITY
+
         buf = builder.start_frame(
-            QuicFrameType.ACK,
-            capacity=ACK_FRAME_CAPACITY,
+            frame_type=frame_type,
+            capacity=capacity,
             handler=self._on_ack_delivery,
             handler_args=(space, space.largest_received_packet),
         )
         ranges = push_ack_frame(buf, space.ack_queue, ack_delay_encoded)
+        if ecn_counts is not None:
+            push_ecn_counts(buf, ecn_counts)
         space.ack_at = None
 
         # log frame
         if self._quic_logger is not None:
             builder.quic_logger_frames.append(
                 self._quic_logger.encode_ack_frame(
-                    ranges=space.ack_queue, delay=ack_delay
+                    ranges=space.ack_queue, delay=ack_delay, ecn_counts=ecn_counts
                 )
             )
 
@@ -2993,6 +3443,22 @@ class QuicConnection:
                 )
             )
 
+    def _write_new_token_frame(self, builder: QuicPacketBuilder, token: bytes) -> None:
+        buf = builder.start_frame(
+            QuicFrameType.NEW_TOKEN,
+            capacity=1 + size_uint_var(len(token)) + len(token),
+            handler=self._on_new_token_delivery,
+            handler_args=(token,),
+        )
+        buf.push_uint_var(len(token))
+        buf.push_bytes(token)
+
+        # log frame
+        if self._quic_logger is not None:
+            builder.quic_logger_frames.append(
+                self._quic_logger.encode_new_token_frame(token=token)
+            )
+
     def _write_path_challenge_frame(
         self, builder: QuicPacketBuilder, challenge: bytes
     ) -> None:
@@ -3048,7 +3514,8 @@ class QuicConnection:
         buf = builder.start_frame(
             frame_type=QuicFrameType.RESET_STREAM,
             capacity=RESET_STREAM_FRAME_CAPACITY,
-            handler=stream.sender.on_reset_delivery,
+            handler=self._on_reset_stream_delivery,
+            handler_args=(stream,),
         )
         frame = stream.sender.get_reset_frame()
         buf.push_uint_var(frame.stream_id)
@@ -3090,7 +3557,8 @@ class QuicConnection:
         buf = builder.start_frame(
             frame_type=QuicFrameType.STOP_SENDING,
             capacity=STOP_SENDING_FRAME_CAPACITY,
-            handler=stream.receiver.on_stop_sending_delivery,
+            handler=self._on_stop_sending_delivery,
+            handler_args=(stream,),
         )
         frame = stream.receiver.get_stop_frame()
         buf.push_uint_var(frame.stream_id)
@@ -3123,10 +3591,17 @@ class QuicConnection:
             )
         )
         previous_send_highest = stream.sender.highest_offset
+        buffered_size = stream.sender.buffered_size
         frame = stream.sender.get_frame(
             builder.remaining_flight_space - frame_overhead, max_offset
         )
 
+        # data read or sent from a producer enters the write buffer
+        if stream.sender.buffered_size != buffered_size:
+            self._write_buffer_size += stream.sender.buffered_size - buffered_size
+            if self._update_write_buffer_full(stream):
+                self._streams_write_paused.add(stream.stream_id)
+
         if frame is not None:
             frame_type = QuicFrameType.STREAM_BASE | 2  # length
             if frame.offset:
@@ -3136,8 +3611,8 @@ class QuicConnection:
             buf = builder.start_frame(
                 frame_type,
                 capacity=frame_overhead,
-                handler=stream.sender.on_data_delivery,
-                handler_args=(frame.offset, frame.offset + len(frame.data)),
+                handler=self._on_stream_data_delivery,
+                handler_args=(stream, frame.offset, frame.offset + len(frame.data)),
             )
             buf.push_uint_var(stream.stream_id)
             if frame.offset:
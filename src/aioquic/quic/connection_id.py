@@ -0,0 +1,168 @@
+import os
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+# the first octet of QUIC-LB connection IDs carries the config rotation bits
+# and the length of the connection ID
+LB_CONFIG_ID_MAX = 6
+LB_CONFIG_ID_SHIFT = 5
+LB_LENGTH_MASK = 0x1F
+LB_MIN_NONCE_LENGTH = 8
+
+# connection IDs are at most 20 bytes long
+CONNECTION_ID_MAX_SIZE = 20
+
+
+class QuicConnectionIdGenerator:
+    """
+    Generates the connection IDs which an endpoint issues to its peer.
+
+    The default implementation returns random bytes. Subclasses can encode
+    routing information, so that packets reach the right server process or
+    the right server behind a load balancer.
+    """
+
+    def generate_connection_id(self, length: int) -> bytes:
+        """
+        Return a new connection ID of `length` bytes.
+        """
+        return os.urandom(length)
+
+
+@dataclass
+class QuicLoadBalancerConfig:
+    """
+    A QUIC-LB configuration, shared by a load balancer and its servers.
+
+    See: https://datatracker.ietf.org/doc/draft-ietf-quic-load-balancers/
+    """
+
+    config_id: int
+    """
+    The config rotation codepoint, from 0 to 6.
+    """
+
+    server_id_length: int
+    """
+    The length in bytes of server IDs.
+    """
+
+    nonce_length: int
+    """
+    The length in bytes of the nonce which follows the server ID.
+    """
+
+    key: Optional[bytes] = None
+    """
+    A 16-byte AES key to encrypt connection IDs with the stream cipher
+    algorithm. If `None`, server IDs are in plaintext.
+    """
+
+    def __post_init__(self) -> None:
+        if not 0 <= self.config_id <= LB_CONFIG_ID_MAX:
+            raise ValueError("config_id must be between 0 and 6")
+        if self.server_id_length < 1 or self.nonce_length < 0:
+            raise ValueError("server ID and nonce lengths must be positive")
+        if self.connection_id_length > CONNECTION_ID_MAX_SIZE:
+            raise ValueError("connection IDs must be at most 20 bytes")
+        if self.key is not None:
+            if len(self.key) != 16:
+                raise ValueError("key must be 16 bytes")
+            if not LB_MIN_NONCE_LENGTH <= self.nonce_length <= 16:
+                raise ValueError("nonce_length must be between 8 and 16 with a key")
+
+    @property
+    def connection_id_length(self) -> int:
+        """
+        The length in bytes of connection IDs, which servers must use as their
+        :attr:`~aioquic.quic.configuration.QuicConfiguration.connection_id_length`.
+        """
+        return 1 + self.server_id_length + self.nonce_length
+
+
+class QuicLoadBalancerConnectionIdGenerator(QuicConnectionIdGenerator):
+    """
+    Generates connection IDs which a QUIC-LB load balancer routes to the
+    server with the given `server_id`.
+
+    The first octet holds the config rotation codepoint and the length of the
+    connection ID, and is followed by the server ID and a random nonce.
+
+    When the configuration has a key, the server ID and the nonce are
+    encrypted with the stream cipher algorithm: three passes of AES-ECB, each
+    XORing one half with the encryption of the other half padded with zeros.
+    """
+
+    def __init__(self, config: QuicLoadBalancerConfig, server_id: bytes) -> None:
+        if len(server_id) != config.server_id_length:
+            raise ValueError("server_id must be %d bytes" % config.server_id_length)
+        self.config = config
+        self.server_id = server_id
+
+    def generate_connection_id(self, length: int) -> bytes:
+        assert (
+            length == self.config.connection_id_length
+        ), "connection_id_length does not match the QUIC-LB configuration"
+        nonce = os.urandom(self.config.nonce_length)
+        return _first_octet(self.config) + _encrypt(self.config, self.server_id, nonce)
+
+
+def decode_server_id(
+    connection_id: bytes, configs: Sequence[QuicLoadBalancerConfig]
+) -> Optional[bytes]:
+    """
+    Return the server ID encoded in `connection_id`, or `None` if none of the
+    `configs` matches its config rotation codepoint.
+
+    This is the load balancer side of
+    :class:`QuicLoadBalancerConnectionIdGenerator`.
+    """
+    if not connection_id:
+        return None
+    config_id = connection_id[0] >> LB_CONFIG_ID_SHIFT
+    for config in configs:
+        if (
+            config.config_id == config_id
+            and len(connection_id) >= config.connection_id_length
+        ):
+            return _decrypt(config, connection_id[1 : config.connection_id_length])
+    return None
+
+
+def _encrypt_block(config: QuicLoadBalancerConfig, data: bytes) -> bytes:
+    encryptor = Cipher(algorithms.AES(config.key), modes.ECB()).encryptor()
+    return encryptor.update(data.ljust(16, b"\x00")) + encryptor.finalize()
+
+
+def _decrypt(config: QuicLoadBalancerConfig, data: bytes) -> bytes:
+    server_id = data[: config.server_id_length]
+    if config.key is None:
+        return server_id
+
+    nonce = data[config.server_id_length :]
+    server_id = _xor(server_id, _encrypt_block(config, nonce))
+    nonce = _xor(nonce, _encrypt_block(config, server_id))
+    return _xor(server_id, _encrypt_block(config, nonce))
+
+
+def _encrypt(config: QuicLoadBalancerConfig, server_id: bytes, nonce: bytes) -> bytes:
+    if config.key is not None:
+        server_id = _xor(server_id, _encrypt_block(config, nonce))
+        nonce = _xor(nonce, _encrypt_block(config, server_id))
+        server_id = _xor(server_id, _encrypt_block(config, nonce))
+    return server_id + nonce
+
+
+def _first_octet(config: QuicLoadBalancerConfig) -> bytes:
+    return bytes(
+        [
+            (config.config_id << LB_CONFIG_ID_SHIFT)
+            | ((config.connection_id_length - 1) & LB_LENGTH_MASK)
+        ]
+    )
+
+
+def _xor(data: bytes, mask: bytes) -> bytes:
+    return bytes(a ^ b for a, b in zip(data, mask))
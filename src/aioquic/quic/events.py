@@ -110,3 +110,14 @@ class StreamReset(QuicEvent):
 
     stream_id: int
     "The ID of the stream that was reset."
+
+
+@dataclass
+class StreamWritable(QuicEvent):
+    """
+    The StreamWritable event is fired when data can be written to a stream
+    again, after its write buffer had exceeded the high watermark.
+    """
+
+    stream_id: int
+    "The ID of the stream which is writable."
@@ -13,6 +13,7 @@ from .packet import (
     PACKET_TYPE_ONE_RTT,
     PACKET_TYPE_RETRY,
     PACKET_TYPE_ZERO_RTT,
+    QuicEcnCounts,
     QuicFrameType,
     QuicStreamFrame,
     QuicTransportParameters,
@@ -55,12 +56,23 @@ class QuicLoggerTrace:
 
     # QUIC
 
-    def encode_ack_frame(self, ranges: RangeSet, delay: float) -> Dict:
-        return {
+    def encode_ack_frame(
+        self,
+        ranges: RangeSet,
+        delay: float,
+        ecn_counts: Optional[QuicEcnCounts] = None,
+    ) -> Dict:
+        attrs = {
             "ack_delay": self.encode_time(delay),
             "acked_ranges": [[x.start, x.stop - 1] for x in ranges],
             "frame_type": "ack",
         }
+        if ecn_counts is not None:
+            attrs["ect0"] = ecn_counts.ect0
+            attrs["ect1"] = ecn_counts.ect1
+            attrs["ce"] = ecn_counts.ce
+
+        return attrs
 
     def encode_connection_close_frame(
         self, error_code: int, frame_type: Optional[int], reason_phrase: str
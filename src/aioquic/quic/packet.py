@@ -3,7 +3,7 @@ import ipaddress
 import os
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
@@ -30,6 +30,13 @@ RETRY_AEAD_NONCE_VERSION_1 = binascii.unhexlify("461599d35d632bf2239825bb")
 RETRY_INTEGRITY_TAG_SIZE = 16
 STATELESS_RESET_TOKEN_SIZE = 16
 
+# ECN codepoints, in the two low bits of the IP TOS / traffic class
+ECN_NOT_ECT = 0x00
+ECN_ECT1 = 0x01
+ECN_ECT0 = 0x02
+ECN_CE = 0x03
+ECN_MASK = 0x03
+
 
 class QuicErrorCode(IntEnum):
     NO_ERROR = 0x0
@@ -476,11 +483,18 @@ class QuicStopSendingFrame:
 
 @dataclass
 class QuicStreamFrame:
-    data: bytes = b""
+    data: Union[bytes, memoryview] = b""
     fin: bool = False
     offset: int = 0
 
 
+@dataclass
+class QuicEcnCounts:
+    ect0: int = 0
+    ect1: int = 0
+    ce: int = 0
+
+
 def pull_ack_frame(buf: Buffer) -> Tuple[RangeSet, int]:
     rangeset = RangeSet()
     end = buf.pull_uint_var()  # largest acknowledged
@@ -513,3 +527,15 @@ def push_ack_frame(buf: Buffer, rangeset: RangeSet, delay: int) -> int:
         buf.push_uint_var(r.stop - r.start - 1)
         start = r.start
     return ranges
+
+
+def pull_ecn_counts(buf: Buffer) -> QuicEcnCounts:
+    return QuicEcnCounts(
+        ect0=buf.pull_uint_var(), ect1=buf.pull_uint_var(), ce=buf.pull_uint_var()
+    )
+
+
+def push_ecn_counts(buf: Buffer, counts: QuicEcnCounts) -> None:
+    buf.push_uint_var(counts.ect0)
+    buf.push_uint_var(counts.ect1)
+    buf.push_uint_var(counts.ce)
@@ -41,6 +41,14 @@ class QuicSentPacket:
     packet_type: int
     sent_time: Optional[float] = None
     sent_bytes: int = 0
+    is_ecn_marked: bool = False
+    is_pmtu_probe: bool = False
+
+    # delivery rate estimation
+    delivered: int = 0
+    delivered_time: float = 0.0
+    first_sent_time: float = 0.0
+    is_app_limited: bool = False
 
     delivery_handlers: List[Tuple[QuicDeliveryHandler, Any]] = field(
         default_factory=list
@@ -64,6 +72,7 @@ class QuicPacketBuilder:
         peer_cid: bytes,
         version: int,
         is_client: bool,
+        max_datagram_size: int = PACKET_MAX_SIZE,
         packet_number: int = 0,
         peer_token: bytes = b"",
         quic_logger: Optional[QuicLoggerTrace] = None,
@@ -98,9 +107,9 @@ class QuicPacketBuilder:
         self._packet_start = 0
         self._packet_type = 0
 
-        self._buffer = Buffer(PACKET_MAX_SIZE)
-        self._buffer_capacity = PACKET_MAX_SIZE
-        self._flight_capacity = PACKET_MAX_SIZE
+        self._buffer = Buffer(max_datagram_size)
+        self._buffer_capacity = max_datagram_size
+        self._flight_capacity = max_datagram_size
 
     @property
     def packet_is_empty(self) -> bool:
@@ -183,9 +192,13 @@ class QuicPacketBuilder:
             self._packet.delivery_handlers.append((handler, handler_args))
         return self._buffer
 
-    def start_packet(self, packet_type: int, crypto: CryptoPair) -> None:
+    def start_packet(
+        self, packet_type: int, crypto: CryptoPair, is_pmtu_probe: bool = False
+    ) -> None:
         """
         Starts a new packet.
+
+        If `is_pmtu_probe` is set, the packet is padded to fill the datagram.
         """
         buf = self._buffer
 
@@ -243,6 +256,7 @@ class QuicPacketBuilder:
             in_flight=False,
             is_ack_eliciting=False,
             is_crypto_packet=False,
+            is_pmtu_probe=is_pmtu_probe,
             packet_number=self._packet_number,
             packet_type=packet_type,
         )
@@ -269,12 +283,16 @@ class QuicPacketBuilder:
                 - packet_size
             )
 
-            # padding for initial datagram
+            # padding for initial datagram and path MTU probes
             if (
-                self._is_client
-                and self._packet_type == PACKET_TYPE_INITIAL
-                and self._packet.is_ack_eliciting
-                and self.remaining_flight_space
+                (
+                    self._is_client
+                    and self._packet_type == PACKET_TYPE_INITIAL
+                    and self._packet.is_ack_eliciting
+                )
+                or self._packet.is_pmtu_probe
+            ) and (
+                self.remaining_flight_space
                 and self.remaining_flight_space > padding_size
             ):
                 padding_size = self.remaining_flight_space
@@ -0,0 +1,163 @@
+from enum import Enum
+from typing import Optional
+
+from .logger import QuicLoggerTrace
+from .packet_builder import PACKET_MAX_SIZE, QuicSentPacket
+
+# https://datatracker.ietf.org/doc/html/rfc8899#section-5.1
+K_PMTU_MAX_PROBES = 3
+K_PMTU_RAISE_TIMER = 600.0  # seconds
+
+# the search stops once the candidate sizes are this close
+K_PMTU_SEARCH_PRECISION = 20  # bytes
+
+# the path is a black hole for large datagrams if this many are lost with none
+# acknowledged, or after this many consecutive probe timeouts
+K_PMTU_BLACK_HOLE_LOSSES = 3
+
+
+class QuicPmtuState(Enum):
+    DISABLED = 0
+    SEARCHING = 1
+    SEARCH_COMPLETE = 2
+
+
+class QuicPathMtuDiscovery:
+    """
+    Datagram Packetization Layer Path MTU Discovery.
+
+    The search first probes the largest allowed size, then proceeds by
+    bisection. A size is confirmed when a probe is acknowledged, and rejected
+    once 3 probes of that size are lost. When the search completes below the
+    largest allowed size, it is resumed after 10 minutes.
+
+    If datagrams larger than the base size stop getting through, the size falls
+    back to the base size.
+
+    See: https://datatracker.ietf.org/doc/html/rfc8899
+    """
+
+    def __init__(
+        self,
+        base_size: int = PACKET_MAX_SIZE,
+        quic_logger: Optional[QuicLoggerTrace] = None,
+    ) -> None:
+        self.base_size = base_size
+        self.max_size = base_size
+        self.size = base_size
+        self.state = QuicPmtuState.DISABLED
+
+        self._black_hole_losses = 0
+        self._largest_acked_packet = -1
+        self._probe_count = 0
+        self._probe_in_flight = False
+        self._probe_size = base_size
+        self._quic_logger = quic_logger
+        self._raise_at: Optional[float] = None
+        self._search_high = base_size
+
+    def get_probe_size(self, now: float) -> Optional[int]:
+        """
+        Return the size of the probe to send, or `None` if no probe is needed.
+        """
+        if self._raise_at is not None and now >= self._raise_at:
+            # the path may support larger datagrams by now
+            self._raise_at = None
+            self._search_high = self.max_size
+            self._search(now=now)
+
+        if self.state != QuicPmtuState.SEARCHING or self._probe_in_flight:
+            return None
+        return self._probe_size
+
+    def on_packet_acked(self, packet: QuicSentPacket, now: float) -> None:
+        """
+        Called when a packet larger than the base size is acknowledged.
+        """
+        if packet.is_pmtu_probe:
+            self._probe_in_flight = False
+            if packet.sent_bytes > self.size:
+                self._set_size(packet.sent_bytes)
+            self._search(now=now)
+        else:
+            self._black_hole_losses = 0
+            self._largest_acked_packet = max(
+                self._largest_acked_packet, packet.packet_number
+            )
+
+    def on_packet_lost(self, packet: QuicSentPacket, now: float) -> None:
+        """
+        Called when a packet larger than the base size is lost.
+        """
+        if packet.is_pmtu_probe:
+            self._probe_in_flight = False
+            if packet.sent_bytes == self._probe_size:
+                self._probe_count += 1
+                if self._probe_count >= K_PMTU_MAX_PROBES:
+                    self._search_high = self._probe_size - 1
+                    self._search(now=now)
+        elif (
+            packet.sent_bytes > self.base_size
+            and packet.packet_number > self._largest_acked_packet
+        ):
+            # losses before the last acknowledged packet are plain congestion
+            self._black_hole_losses += 1
+            if self._black_hole_losses >= K_PMTU_BLACK_HOLE_LOSSES:
+                self._on_black_hole(now=now)
+
+    def on_loss_detection_timeout(self, pto_count: int, now: float) -> None:
+        """
+        Called when the probe timeout fires.
+        """
+        if pto_count >= K_PMTU_BLACK_HOLE_LOSSES and self.size > self.base_size:
+            self._on_black_hole(now=now)
+
+    def on_probe_sent(self) -> None:
+        """
+        Called when a probe is sent.
+        """
+        self._probe_in_flight = True
+
+    def start(self, max_size: int, now: float) -> None:
+        """
+        Start searching for the largest size up to `max_size` which the path
+        supports.
+        """
+        self.max_size = max(max_size, self.base_size)
+        self._search_high = self.max_size
+        self._search(now=now)
+
+    def _on_black_hole(self, now: float) -> None:
+        self._black_hole_losses = 0
+        self._probe_in_flight = False
+        self._set_size(self.base_size)
+        self.state = QuicPmtuState.SEARCH_COMPLETE
+        self._raise_at = now + K_PMTU_RAISE_TIMER
+
+    def _search(self, now: float) -> None:
+        """
+        Pick the next probe size, or complete the search.
+        """
+        self._probe_count = 0
+        if self._search_high - self.size < K_PMTU_SEARCH_PRECISION:
+            if self.state == QuicPmtuState.SEARCHING:
+                self.state = QuicPmtuState.SEARCH_COMPLETE
+                if self.size < self.max_size:
+                    self._raise_at = now + K_PMTU_RAISE_TIMER
+            return
+
+        if self._search_high == self.max_size and self.state != QuicPmtuState.SEARCHING:
+            # the largest allowed size is the most likely to succeed
+            self._probe_size = self._search_high
+        else:
+            self._probe_size = (self.size + self._search_high + 1) // 2
+        self.state = QuicPmtuState.SEARCHING
+
+    def _set_size(self, size: int) -> None:
+        if self._quic_logger is not None:
+            self._quic_logger.log_event(
+                category="connectivity",
+                event="mtu_updated",
+                data={"old": self.size, "new": size},
+            )
+        self.size = size
@@ -1,10 +1,19 @@
+from bisect import bisect_left, bisect_right
 from collections.abc import Sequence
-from typing import Any, Iterable, List, Optional
+from typing import Any, Iterable, Iterator, List, Optional
 
 
 class RangeSet(Sequence):
+    """
+    A sorted set of non-overlapping, non-adjacent integer ranges.
+
+    The ranges are stored as two parallel lists of start and stop offsets,
+    which allows lookups in O(log n) using binary search.
+    """
+
     def __init__(self, ranges: Iterable[range] = []):
-        self.__ranges: List[range] = []
+        self.__starts: List[int] = []
+        self.__stops: List[int] = []
         for r in ranges:
             assert r.step == 1
             self.add(r.start, r.stop)
@@ -14,85 +23,94 @@ class RangeSet(Sequence):
             stop = start + 1
         assert stop > start
 
-        for i, r in enumerate(self.__ranges):
-            # the added range is entirely before current item, insert here
-            if stop < r.start:
-                self.__ranges.insert(i, range(start, stop))
-                return
-
-            # the added range is entirely after current item, keep looking
-            if start > r.stop:
-                continue
-
-            # the added range touches the current item, merge it
-            start = min(start, r.start)
-            stop = max(stop, r.stop)
-            while i < len(self.__ranges) - 1 and self.__ranges[i + 1].start <= stop:
-                stop = max(self.__ranges[i + 1].stop, stop)
-                self.__ranges.pop(i + 1)
-            self.__ranges[i] = range(start, stop)
+        starts = self.__starts
+        stops = self.__stops
+
+        # fast paths: the added range is after or extends the last item
+        if not stops or start > stops[-1]:
+            starts.append(start)
+            stops.append(stop)
+            return
+        elif start >= starts[-1]:
+            if stop > stops[-1]:
+                stops[-1] = stop
             return
 
-        # the added range is entirely after all existing items, append it
-        self.__ranges.append(range(start, stop))
+        # find the items the added range touches
+        i = bisect_left(stops, start)
+        j = bisect_right(starts, stop, i)
+        if i == j:
+            # the added range touches no item, insert it
+            starts.insert(i, start)
+            stops.insert(i, stop)
+        else:
+            # the added range touches items i to j - 1, merge them
+            if starts[i] < start:
+                start = starts[i]
+            if stops[j - 1] > stop:
+                stop = stops[j - 1]
+            starts[i:j] = [start]
+            stops[i:j] = [stop]
 
     def bounds(self) -> range:
-        return range(self.__ranges[0].start, self.__ranges[-1].stop)
+        return range(self.__starts[0], self.__stops[-1])
 
     def shift(self) -> range:
-        return self.__ranges.pop(0)
+        return range(self.__starts.pop(0), self.__stops.pop(0))
 
     def subtract(self, start: int, stop: int) -> None:
         assert stop > start
 
-        i = 0
-        while i < len(self.__ranges):
-            r = self.__ranges[i]
-
-            # the removed range is entirely before current item, stop here
-            if stop <= r.start:
-                return
+        starts = self.__starts
+        stops = self.__stops
 
-            # the removed range is entirely after current item, keep looking
-            if start >= r.stop:
-                i += 1
-                continue
-
-            # the removed range completely covers the current item, remove it
-            if start <= r.start and stop >= r.stop:
-                self.__ranges.pop(i)
-                continue
-
-            # the removed range touches the current item
-            if start > r.start:
-                self.__ranges[i] = range(r.start, start)
-                if stop < r.stop:
-                    self.__ranges.insert(i + 1, range(stop, r.stop))
-            else:
-                self.__ranges[i] = range(stop, r.stop)
+        # find the items the removed range overlaps
+        i = bisect_right(stops, start)
+        j = bisect_left(starts, stop, i)
+        if i == j:
+            return
 
-            i += 1
+        # keep the parts of the first and last items outside the removed range
+        keep_starts = []
+        keep_stops = []
+        if starts[i] < start:
+            keep_starts.append(starts[i])
+            keep_stops.append(start)
+        if stops[j - 1] > stop:
+            keep_starts.append(stop)
+            keep_stops.append(stops[j - 1])
+        starts[i:j] = keep_starts
+        stops[i:j] = keep_stops
 
     def __bool__(self) -> bool:
         raise NotImplementedError
 
     def __contains__(self, val: Any) -> bool:
-        for r in self.__ranges:
-            if val in r:
-                return True
-        return False
+        i = bisect_right(self.__starts, val) - 1
+        return i >= 0 and val < self.__stops[i]
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, RangeSet):
             return NotImplemented
 
-        return self.__ranges == other.__ranges
+        return self.__starts == other.__starts and self.__stops == other.__stops
 
-    def __getitem__(self, key: Any) -> range:
-        return self.__ranges[key]
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, slice):
+            return [
+                range(start, stop)
+                for start, stop in zip(self.__starts[key], self.__stops[key])
+            ]
+        return range(self.__starts[key], self.__stops[key])
+
+    def __iter__(self) -> Iterator[range]:
+        return map(range, self.__starts, self.__stops)
 
     def __len__(self) -> int:
-        return len(self.__ranges)
+        return len(self.__starts)
 
     def __repr__(self) -> str:
-        return "RangeSet({})".format(repr(self.__ranges))
+        return "RangeSet({})".format(repr(list(self)))
+
+    def __reversed__(self) -> Iterator[range]:
+        return map(range, reversed(self.__starts), reversed(self.__stops))
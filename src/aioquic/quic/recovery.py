@@ -1,23 +1,38 @@
 import logging
 import math
-from typing import Any, Callable, Dict, Iterable, List, Optional
-
+from enum import Enum
+from itertools import takewhile
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .congestion import bbr, cubic, reno  # noqa
+from .congestion.base import (  # noqa
+    K_GRANULARITY,
+    K_MAX_DATAGRAM_SIZE,
+    QuicRateSample,
+    create_congestion_control,
+)
 from .logger import QuicLoggerTrace
+from .packet import QuicEcnCounts
 from .packet_builder import QuicDeliveryState, QuicSentPacket
+from .pmtu import QuicPathMtuDiscovery
 from .rangeset import RangeSet
 
 # loss detection
 K_PACKET_THRESHOLD = 3
-K_GRANULARITY = 0.001  # seconds
 K_TIME_THRESHOLD = 9 / 8
 K_MICRO_SECOND = 0.000001
+K_PERSISTENT_CONGESTION_THRESHOLD = 3
 K_SECOND = 1.0
 
-# congestion control
-K_MAX_DATAGRAM_SIZE = 1280
-K_INITIAL_WINDOW = 10 * K_MAX_DATAGRAM_SIZE
-K_MINIMUM_WINDOW = 2 * K_MAX_DATAGRAM_SIZE
-K_LOSS_REDUCTION_FACTOR = 0.5
+# ECN validation fails if this many marked packets are lost before any is
+# acknowledged, as the path might be dropping them
+K_ECN_TESTING_LOSSES = 3
+
+
+class QuicEcnState(Enum):
+    TESTING = 0
+    CAPABLE = 1
+    FAILED = 2
 
 
 class QuicPacketSpace:
@@ -25,6 +40,7 @@ class QuicPacketSpace:
         self.ack_at: Optional[float] = None
         self.ack_queue = RangeSet()
         self.discarded = False
+        self.ecn_counts = QuicEcnCounts()
         self.expected_packet_number = 0
         self.largest_received_packet = -1
         self.largest_received_time: Optional[float] = None
@@ -33,6 +49,7 @@ class QuicPacketSpace:
         self.ack_eliciting_in_flight = 0
         self.largest_acked_packet = 0
         self.loss_time: Optional[float] = None
+        self.peer_ecn_counts = QuicEcnCounts()
         self.sent_packets: Dict[int, QuicSentPacket] = {}
 
 
@@ -41,6 +58,7 @@ class QuicPacketPacer:
         self.bucket_max: float = 0.0
         self.bucket_time: float = 0.0
         self.evaluation_time: float = 0.0
+        self.max_datagram_size = K_MAX_DATAGRAM_SIZE
         self.packet_time: Optional[float] = None
 
     def next_send_time(self, now: float) -> float:
@@ -52,11 +70,10 @@ class QuicPacketPacer:
 
     def update_after_send(self, now: float) -> None:
         if self.packet_time is not None:
+            # a packet sent on a partially refilled bucket is paid for by
+            # the next refill, otherwise the rate would follow the ACK clock
             self.update_bucket(now=now)
-            if self.bucket_time < self.packet_time:
-                self.bucket_time = 0.0
-            else:
-                self.bucket_time -= self.packet_time
+            self.bucket_time -= self.packet_time
 
     def update_bucket(self, now: float) -> None:
         if now > self.evaluation_time:
@@ -65,16 +82,22 @@ class QuicPacketPacer:
             )
             self.evaluation_time = now
 
-    def update_rate(self, congestion_window: int, smoothed_rtt: float) -> None:
-        pacing_rate = congestion_window / max(smoothed_rtt, K_MICRO_SECOND)
+    def update_rate(
+        self,
+        congestion_window: int,
+        smoothed_rtt: float,
+        pacing_rate: Optional[float] = None,
+    ) -> None:
+        if pacing_rate is None:
+            pacing_rate = congestion_window / max(smoothed_rtt, K_MICRO_SECOND)
         self.packet_time = max(
-            K_MICRO_SECOND, min(K_MAX_DATAGRAM_SIZE / pacing_rate, K_SECOND)
+            K_MICRO_SECOND, min(self.max_datagram_size / pacing_rate, K_SECOND)
         )
 
         self.bucket_max = (
             max(
-                2 * K_MAX_DATAGRAM_SIZE,
-                min(congestion_window // 4, 16 * K_MAX_DATAGRAM_SIZE),
+                2 * self.max_datagram_size,
+                min(congestion_window // 4, 16 * self.max_datagram_size),
             )
             / pacing_rate
         )
@@ -82,69 +105,6 @@ class QuicPacketPacer:
             self.bucket_time = self.bucket_max
 
 
-class QuicCongestionControl:
-    """
-    New Reno congestion control.
-    """
-
-    def __init__(self) -> None:
-        self.bytes_in_flight = 0
-        self.congestion_window = K_INITIAL_WINDOW
-        self._congestion_recovery_start_time = 0.0
-        self._congestion_stash = 0
-        self._rtt_monitor = QuicRttMonitor()
-        self.ssthresh: Optional[int] = None
-
-    def on_packet_acked(self, packet: QuicSentPacket) -> None:
-        self.bytes_in_flight -= packet.sent_bytes
-
-        # don't increase window in congestion recovery
-        if packet.sent_time <= self._congestion_recovery_start_time:
-            return
-
-        if self.ssthresh is None or self.congestion_window < self.ssthresh:
-            # slow start
-            self.congestion_window += packet.sent_bytes
-        else:
-            # congestion avoidance
-            self._congestion_stash += packet.sent_bytes
-            count = self._congestion_stash // self.congestion_window
-            if count:
-                self._congestion_stash -= count * self.congestion_window
-                self.congestion_window += count * K_MAX_DATAGRAM_SIZE
-
-    def on_packet_sent(self, packet: QuicSentPacket) -> None:
-        self.bytes_in_flight += packet.sent_bytes
-
-    def on_packets_expired(self, packets: Iterable[QuicSentPacket]) -> None:
-        for packet in packets:
-            self.bytes_in_flight -= packet.sent_bytes
-
-    def on_packets_lost(self, packets: Iterable[QuicSentPacket], now: float) -> None:
-        lost_largest_time = 0.0
-        for packet in packets:
-            self.bytes_in_flight -= packet.sent_bytes
-            lost_largest_time = packet.sent_time
-
-        # start a new congestion event if packet was sent after the
-        # start of the previous congestion recovery period.
-        if lost_largest_time > self._congestion_recovery_start_time:
-            self._congestion_recovery_start_time = now
-            self.congestion_window = max(
-                int(self.congestion_window * K_LOSS_REDUCTION_FACTOR), K_MINIMUM_WINDOW
-            )
-            self.ssthresh = self.congestion_window
-
-        # TODO : collapse congestion window if persistent congestion
-
-    def on_rtt_measurement(self, latest_rtt: float, now: float) -> None:
-        # check whether we should exit slow start
-        if self.ssthresh is None and self._rtt_monitor.is_rtt_increasing(
-            latest_rtt, now
-        ):
-            self.ssthresh = self.congestion_window
-
-
 class QuicPacketRecovery:
     """
     Packet loss and congestion controller.
@@ -155,11 +115,14 @@ class QuicPacketRecovery:
         initial_rtt: float,
         peer_completed_address_validation: bool,
         send_probe: Callable[[], None],
+        congestion_control_algorithm: str = "reno",
         logger: Optional[logging.LoggerAdapter] = None,
         quic_logger: Optional[QuicLoggerTrace] = None,
     ) -> None:
+        self.ecn_state = QuicEcnState.TESTING
         self.max_ack_delay = 0.025
         self.peer_completed_address_validation = peer_completed_address_validation
+        self.pmtu = QuicPathMtuDiscovery(quic_logger=quic_logger)
         self.spaces: List[QuicPacketSpace] = []
 
         # callbacks
@@ -169,6 +132,7 @@ class QuicPacketRecovery:
 
         # loss detection
         self._pto_count = 0
+        self._rtt_first_sample_time: Optional[float] = None
         self._rtt_initial = initial_rtt
         self._rtt_initialized = False
         self._rtt_latest = 0.0
@@ -178,9 +142,19 @@ class QuicPacketRecovery:
         self._time_of_last_sent_ack_eliciting_packet = 0.0
 
         # congestion control
-        self._cc = QuicCongestionControl()
+        self._cc = create_congestion_control(congestion_control_algorithm)
+        self._congestion_state = self._cc.congestion_state
         self._pacer = QuicPacketPacer()
 
+        # ECN validation
+        self._ecn_testing_losses = 0
+
+        # delivery rate estimation
+        self._app_limited = 0
+        self._delivered = 0
+        self._delivered_time = 0.0
+        self._first_sent_time = 0.0
+
     @property
     def bytes_in_flight(self) -> int:
         return self._cc.bytes_in_flight
@@ -189,6 +163,10 @@ class QuicPacketRecovery:
     def congestion_window(self) -> int:
         return self._cc.congestion_window
 
+    @property
+    def max_datagram_size(self) -> int:
+        return self.pmtu.size
+
     def discard_space(self, space: QuicPacketSpace) -> None:
         assert space in self.spaces
 
@@ -238,29 +216,61 @@ class QuicPacketRecovery:
         ack_rangeset: RangeSet,
         ack_delay: float,
         now: float,
+        ecn_counts: Optional[QuicEcnCounts] = None,
     ) -> None:
         """
         Update metrics as the result of an ACK being received.
         """
+        ecn_marked_acked = 0
         is_ack_eliciting = False
         largest_acked = ack_rangeset.bounds().stop - 1
         largest_newly_acked = None
         largest_sent_time = None
+        pmtu_base_size = self.pmtu.base_size
+        rate_packet: Optional[QuicSentPacket] = None
 
         if largest_acked > space.largest_acked_packet:
             space.largest_acked_packet = largest_acked
 
-        for packet_number in sorted(space.sent_packets.keys()):
-            if packet_number > largest_acked:
+        sent_packets = space.sent_packets
+        for r in ack_rangeset:
+            if not sent_packets:
                 break
-            if packet_number in ack_rangeset:
-                # remove packet and update counters
-                packet = space.sent_packets.pop(packet_number)
+
+            # packets are sent in packet number order, so the first one is
+            # the smallest still awaiting acknowledgement
+            start = max(r.start, next(iter(sent_packets)))
+            if r.stop - start > len(sent_packets):
+                # the range is wider than the packets in flight, scan those instead
+                packet_numbers: Iterable[int] = [
+                    packet_number
+                    for packet_number in takewhile(
+                        lambda x: x < r.stop, sent_packets.keys()
+                    )
+                    if packet_number >= start
+                ]
+            else:
+                packet_numbers = range(start, r.stop)
+
+            for packet_number in packet_numbers:
+                packet = sent_packets.pop(packet_number, None)
+                if packet is None:
+                    continue
+
+                # update counters
                 if packet.is_ack_eliciting:
                     is_ack_eliciting = True
                     space.ack_eliciting_in_flight -= 1
+                if packet.is_ecn_marked:
+                    ecn_marked_acked += 1
+                if packet.sent_bytes > pmtu_base_size:
+                    self.pmtu.on_packet_acked(packet, now=now)
                 if packet.in_flight:
-                    self._cc.on_packet_acked(packet)
+                    self._cc.on_packet_acked(packet, now=now)
+                    self._delivered += packet.sent_bytes
+                    self._delivered_time = now
+                    if rate_packet is None or packet.delivered >= rate_packet.delivered:
+                        rate_packet = packet
                 largest_newly_acked = packet_number
                 largest_sent_time = packet.sent_time
 
@@ -287,6 +297,7 @@ class QuicPacketRecovery:
                 self._rtt_latest -= ack_delay
 
             if not self._rtt_initialized:
+                self._rtt_first_sample_time = now
                 self._rtt_initialized = True
                 self._rtt_variance = latest_rtt / 2
                 self._rtt_smoothed = latest_rtt
@@ -300,14 +311,31 @@ class QuicPacketRecovery:
 
             # inform congestion controller
             self._cc.on_rtt_measurement(latest_rtt, now=now)
-            self._pacer.update_rate(
-                congestion_window=self._cc.congestion_window,
-                smoothed_rtt=self._rtt_smoothed,
-            )
+            self._update_pacing_rate()
 
         else:
             log_rtt = False
 
+        if rate_packet is not None:
+            self._on_rate_sample(rate_packet, now=now)
+
+        if self.pmtu.size != self._cc.max_datagram_size:
+            self._update_max_datagram_size()
+
+        # reordered ACKs can carry stale ECN counts, skip them
+        if (
+            ecn_marked_acked
+            and largest_acked == largest_newly_acked
+            and self.ecn_state != QuicEcnState.FAILED
+        ):
+            self._on_ecn_counts(
+                space,
+                ecn_counts=ecn_counts,
+                ecn_marked_acked=ecn_marked_acked,
+                sent_time=largest_sent_time,
+                now=now,
+            )
+
         self._detect_loss(space, now=now)
 
         # reset PTO count
@@ -316,16 +344,29 @@ class QuicPacketRecovery:
         if self._quic_logger is not None:
             self._log_metrics_updated(log_rtt=log_rtt)
 
+    def on_application_limited(self) -> None:
+        """
+        Mark the sender as application-limited until the data currently in
+        flight has been acknowledged.
+        """
+        self._app_limited = max(self._delivered + self._cc.bytes_in_flight, 1)
+
     def on_loss_detection_timeout(self, now: float) -> None:
         loss_space = self._get_loss_space()
         if loss_space is not None:
             self._detect_loss(loss_space, now=now)
         else:
             self._pto_count += 1
+            self.pmtu.on_loss_detection_timeout(self._pto_count, now=now)
+            if self.pmtu.size != self._cc.max_datagram_size:
+                self._update_max_datagram_size()
             self.reschedule_data(now=now)
 
     def on_packet_sent(self, packet: QuicSentPacket, space: QuicPacketSpace) -> None:
         space.sent_packets[packet.packet_number] = packet
+        packet.is_ecn_marked = self.ecn_state != QuicEcnState.FAILED
+        if packet.is_pmtu_probe:
+            self.pmtu.on_probe_sent()
 
         if packet.is_ack_eliciting:
             space.ack_eliciting_in_flight += 1
@@ -333,6 +374,16 @@ class QuicPacketRecovery:
             if packet.is_ack_eliciting:
                 self._time_of_last_sent_ack_eliciting_packet = packet.sent_time
 
+            # snapshot the delivery state, to sample the delivery rate
+            # once the packet is acknowledged
+            if self._cc.bytes_in_flight == 0:
+                self._delivered_time = packet.sent_time
+                self._first_sent_time = packet.sent_time
+            packet.delivered = self._delivered
+            packet.delivered_time = self._delivered_time
+            packet.first_sent_time = self._first_sent_time
+            packet.is_app_limited = self._app_limited != 0
+
             # add packet to bytes in flight
             self._cc.on_packet_sent(packet)
 
@@ -368,7 +419,6 @@ class QuicPacketRecovery:
             else self._rtt_initial
         )
         packet_threshold = space.largest_acked_packet - K_PACKET_THRESHOLD
-        time_threshold = now - loss_delay
 
         lost_packets = []
         space.loss_time = None
@@ -376,14 +426,22 @@ class QuicPacketRecovery:
             if packet_number > space.largest_acked_packet:
                 break
 
-            if packet_number <= packet_threshold or packet.sent_time <= time_threshold:
+            # compute the loss time the same way it is armed, so that a timer
+            # firing exactly at `loss_time` declares the packet lost
+            packet_loss_time = packet.sent_time + loss_delay
+            if packet_number <= packet_threshold or packet_loss_time <= now:
                 lost_packets.append(packet)
-            else:
-                packet_loss_time = packet.sent_time + loss_delay
-                if space.loss_time is None or space.loss_time > packet_loss_time:
-                    space.loss_time = packet_loss_time
+            elif space.loss_time is None or space.loss_time > packet_loss_time:
+                space.loss_time = packet_loss_time
 
         self._on_packets_lost(lost_packets, space=space, now=now)
+        if self._is_persistent_congestion(lost_packets):
+            if self._logger is not None:
+                self._logger.debug("Persistent congestion detected")
+            self._cc.on_persistent_congestion(now=now)
+            self._update_pacing_rate()
+            if self._quic_logger is not None:
+                self._log_metrics_updated()
 
     def _get_loss_space(self) -> Optional[QuicPacketSpace]:
         loss_space = None
@@ -394,14 +452,57 @@ class QuicPacketRecovery:
                 loss_space = space
         return loss_space
 
+    def _is_persistent_congestion(self, packets: List[QuicSentPacket]) -> bool:
+        """
+        Return whether the lost packets, in packet number order, span a period
+        of persistent congestion: ack-eliciting packets sent over longer than
+        the persistent congestion duration, and none acknowledged in between.
+
+        See: https://datatracker.ietf.org/doc/html/rfc9002#section-7.6
+        """
+        if self._rtt_first_sample_time is None:
+            return False
+        duration = (
+            self._rtt_smoothed
+            + max(4 * self._rtt_variance, K_GRANULARITY)
+            + self.max_ack_delay
+        ) * K_PERSISTENT_CONGESTION_THRESHOLD
+
+        start_time: Optional[float] = None
+        previous_number: Optional[int] = None
+        for packet in packets:
+            # an acknowledged packet ends the period
+            if (
+                previous_number is not None
+                and packet.packet_number != previous_number + 1
+            ):
+                start_time = None
+            previous_number = packet.packet_number
+
+            # only packets sent after the first RTT sample count
+            if (
+                packet.in_flight
+                and packet.is_ack_eliciting
+                and not packet.is_pmtu_probe
+                and packet.sent_time >= self._rtt_first_sample_time
+            ):
+                if start_time is None:
+                    start_time = packet.sent_time
+                elif packet.sent_time - start_time > duration:
+                    return True
+        return False
+
     def _log_metrics_updated(self, log_rtt=False) -> None:
-        data: Dict[str, Any] = {
-            "bytes_in_flight": self._cc.bytes_in_flight,
-            "cwnd": self._cc.congestion_window,
-        }
-        if self._cc.ssthresh is not None:
-            data["ssthresh"] = self._cc.ssthresh
+        congestion_state = self._cc.congestion_state
+        if congestion_state != self._congestion_state:
+            self._quic_logger.log_event(
+                category="recovery",
+                event="congestion_state_updated",
+                data={"old": self._congestion_state, "new": congestion_state},
+            )
+            self._congestion_state = congestion_state
 
+        data = self._cc.get_log_data()
         if log_rtt:
             data.update(
                 {
@@ -416,19 +517,66 @@ class QuicPacketRecovery:
             category="recovery", event="metrics_updated", data=data
         )
 
+    def _on_ecn_counts(
+        self,
+        space: QuicPacketSpace,
+        ecn_counts: Optional[QuicEcnCounts],
+        ecn_marked_acked: int,
+        sent_time: float,
+        now: float,
+    ) -> None:
+        """
+        Validate the ECN counts reported by the peer, and react to packets
+        marked Congestion Experienced.
+        """
+        previous = space.peer_ecn_counts
+        if (
+            ecn_counts is None
+            or ecn_counts.ect0 < previous.ect0
+            or ecn_counts.ect1 != previous.ect1
+            or ecn_counts.ce < previous.ce
+            or (ecn_counts.ect0 - previous.ect0) + (ecn_counts.ce - previous.ce)
+            < ecn_marked_acked
+        ):
+            # the peer or the path does not report our ECT(0) marks
+            self._set_ecn_state(QuicEcnState.FAILED)
+            return
+
+        space.peer_ecn_counts = ecn_counts
+        self._set_ecn_state(QuicEcnState.CAPABLE)
+        if ecn_counts.ce > previous.ce:
+            self._cc.on_congestion_experienced(sent_time, now=now)
+            self._update_pacing_rate()
+
     def _on_packets_lost(
         self, packets: Iterable[QuicSentPacket], space: QuicPacketSpace, now: float
     ) -> None:
         lost_packets_cc = []
+        lost_probes = []
         for packet in packets:
             del space.sent_packets[packet.packet_number]
 
             if packet.in_flight:
-                lost_packets_cc.append(packet)
+                # a lost path MTU probe is not a sign of congestion
+                if packet.is_pmtu_probe:
+                    lost_probes.append(packet)
+                else:
+                    lost_packets_cc.append(packet)
 
             if packet.is_ack_eliciting:
                 space.ack_eliciting_in_flight -= 1
 
+            if packet.sent_bytes > self.pmtu.base_size:
+                self.pmtu.on_packet_lost(packet, now=now)
+            if (
+                packet.is_ecn_marked
+                and not packet.is_pmtu_probe
+                and self.ecn_state == QuicEcnState.TESTING
+            ):
+                self._ecn_testing_losses += 1
+                if self._ecn_testing_losses >= K_ECN_TESTING_LOSSES:
+                    self._set_ecn_state(QuicEcnState.FAILED)
+
             if self._quic_logger is not None:
                 self._quic_logger.log_event(
                     category="recovery",
@@ -445,66 +593,66 @@ class QuicPacketRecovery:
                 handler(QuicDeliveryState.LOST, *args)
 
         # inform congestion controller
+        if lost_probes:
+            self._cc.on_packets_expired(lost_probes)
         if lost_packets_cc:
             self._cc.on_packets_lost(lost_packets_cc, now=now)
-            self._pacer.update_rate(
-                congestion_window=self._cc.congestion_window,
-                smoothed_rtt=self._rtt_smoothed,
-            )
+            self._update_pacing_rate()
             if self._quic_logger is not None:
                 self._log_metrics_updated()
+        if self.pmtu.size != self._cc.max_datagram_size:
+            self._update_max_datagram_size()
 
+    def _on_rate_sample(self, packet: QuicSentPacket, now: float) -> None:
+        """
+        Sample the delivery rate using the most recently sent packet which
+        was acknowledged, and pass the sample to the congestion controller.
+        """
+        if self._app_limited and self._delivered > self._app_limited:
+            self._app_limited = 0
+        self._first_sent_time = packet.sent_time
+
+        # the sample covers the longest of the send and ACK intervals, which
+        # prevents ACK compression from inflating the delivery rate
+        interval = max(
+            packet.sent_time - packet.first_sent_time,
+            self._delivered_time - packet.delivered_time,
+        )
+        self._cc.on_rate_sample(
+            QuicRateSample(
+                delivered=self._delivered - packet.delivered,
+                interval=interval,
+                is_app_limited=packet.is_app_limited,
+                prior_delivered=packet.delivered,
+                rtt=now - packet.sent_time,
+                rtt_min=self._rtt_min,
+            ),
+            now=now,
+        )
+        if self._cc.pacing_rate is not None:
+            self._update_pacing_rate()
 
-class QuicRttMonitor:
-    """
-    Roundtrip time monitor for HyStart.
-    """
-
-    def __init__(self) -> None:
-        self._increases = 0
-        self._last_time = None
-        self._ready = False
-        self._size = 5
-
-        self._filtered_min: Optional[float] = None
-
-        self._sample_idx = 0
-        self._sample_max: Optional[float] = None
-        self._sample_min: Optional[float] = None
-        self._sample_time = 0.0
-        self._samples = [0.0 for i in range(self._size)]
-
-    def add_rtt(self, rtt: float) -> None:
-        self._samples[self._sample_idx] = rtt
-        self._sample_idx += 1
-
-        if self._sample_idx >= self._size:
-            self._sample_idx = 0
-            self._ready = True
-
-        if self._ready:
-            self._sample_max = self._samples[0]
-            self._sample_min = self._samples[0]
-            for sample in self._samples[1:]:
-                if sample < self._sample_min:
-                    self._sample_min = sample
-                elif sample > self._sample_max:
-                    self._sample_max = sample
-
-    def is_rtt_increasing(self, rtt: float, now: float) -> bool:
-        if now > self._sample_time + K_GRANULARITY:
-            self.add_rtt(rtt)
-            self._sample_time = now
-
-            if self._ready:
-                if self._filtered_min is None or self._filtered_min > self._sample_max:
-                    self._filtered_min = self._sample_max
-
-                delta = self._sample_min - self._filtered_min
-                if delta * 4 >= self._filtered_min:
-                    self._increases += 1
-                    if self._increases >= self._size:
-                        return True
-                elif delta > 0:
-                    self._increases = 0
-        return False
+    def _set_ecn_state(self, state: QuicEcnState) -> None:
+        if state != self.ecn_state:
+            if self._quic_logger is not None:
+                self._quic_logger.log_event(
+                    category="recovery",
+                    event="ecn_state_updated",
+                    data={
+                        "old": self.ecn_state.name.lower(),
+                        "new": state.name.lower(),
+                    },
+                )
+            self.ecn_state = state
+
+    def _update_max_datagram_size(self) -> None:
+        self._cc.max_datagram_size = self.pmtu.size
+        self._pacer.max_datagram_size = self.pmtu.size
+        self._update_pacing_rate()
+
+    def _update_pacing_rate(self) -> None:
+        self._pacer.update_rate(
+            congestion_window=self._cc.congestion_window,
+            pacing_rate=self._cc.pacing_rate,
+            smoothed_rtt=self._rtt_smoothed,
+        )
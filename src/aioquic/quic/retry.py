@@ -1,53 +1,229 @@
+import heapq
 import ipaddress
-from typing import Tuple
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Set, Tuple
 
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDFExpand
 
-from ..buffer import Buffer
+from ..buffer import Buffer, BufferReadError
 from ..tls import pull_opaque, push_opaque
 from .connection import NetworkAddress
 
+# retry tokens are only used once, right after the Retry packet is sent, while
+# tokens sent in NEW_TOKEN frames are used by future connections
+NEW_TOKEN_LIFETIME = 86400.0
+RETRY_TOKEN_LIFETIME = 10.0
+
+# the nonces of used NEW_TOKEN tokens are remembered until the tokens expire,
+# if there are too many of them the tokens are rejected
+NEW_TOKEN_MAX_USED = 65536
+
+TOKEN_KEY_LABEL = b"aioquic token key "
+TOKEN_NONCE_SIZE = 12
+TOKEN_HEADER_SIZE = 2 + TOKEN_NONCE_SIZE
+TOKEN_TYPE_NEW_TOKEN = 1
+TOKEN_TYPE_RETRY = 0
+
 
 def encode_address(addr: NetworkAddress) -> bytes:
     return ipaddress.ip_address(addr[0]).packed + bytes([addr[1] >> 8, addr[1] & 0xFF])
 
 
 class QuicRetryTokenHandler:
-    def __init__(self) -> None:
-        self._key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+    """
+    Creates and validates address validation tokens, which are sealed with
+    AES-128-GCM.
+
+    Tokens sent in Retry packets expire after `lifetime` seconds, and tokens
+    sent in NEW_TOKEN frames after `new_token_lifetime` seconds.
+
+    The keys are derived from `secret` and rotated as often as the tokens
+    expire, so that servers sharing the secret, for instance in several
+    processes, accept each other's tokens. If `secret` is `None`, a random
+    secret is generated.
+
+    A token from a NEW_TOKEN frame is only accepted once. Up to
+    `max_used_new_tokens` used tokens are remembered until they expire, and
+    while that many are remembered further tokens are rejected. Servers
+    sharing the secret do not share the used tokens, so a token may be used
+    once per server.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[bytes] = None,
+        lifetime: float = RETRY_TOKEN_LIFETIME,
+        new_token_lifetime: float = NEW_TOKEN_LIFETIME,
+        max_used_new_tokens: int = NEW_TOKEN_MAX_USED,
+    ) -> None:
+        if secret is None:
+            secret = os.urandom(32)
+        elif len(secret) < 16:
+            raise ValueError("secret must be at least 16 bytes")
+        self._keys: Dict[Tuple[int, int], AESGCM] = {}
+        self._lifetimes = {
+            TOKEN_TYPE_NEW_TOKEN: new_token_lifetime,
+            TOKEN_TYPE_RETRY: lifetime,
+        }
+        self._max_used_new_tokens = max_used_new_tokens
+        self._secret = secret
+        self._used_new_tokens: Set[bytes] = set()
+        self._used_new_tokens_expiry: List[Tuple[float, bytes]] = []
+
+    def create_new_token(
+        self, addr: NetworkAddress, now: Optional[float] = None
+    ) -> bytes:
+        """
+        Create a token to send in a NEW_TOKEN frame.
+
+        Clients usually connect again from another port, so only the IP address
+        is bound to the token.
+        """
+        return self._seal(
+            TOKEN_TYPE_NEW_TOKEN, ipaddress.ip_address(addr[0]).packed, now=now
+        )
 
     def create_token(
         self,
         addr: NetworkAddress,
         original_destination_connection_id: bytes,
         retry_source_connection_id: bytes,
+        now: Optional[float] = None,
     ) -> bytes:
+        """
+        Create a token to send in a Retry packet.
+        """
         buf = Buffer(capacity=512)
         push_opaque(buf, 1, encode_address(addr))
         push_opaque(buf, 1, original_destination_connection_id)
         push_opaque(buf, 1, retry_source_connection_id)
-        return self._key.public_key().encrypt(
-            buf.data,
-            padding.OAEP(
-                mgf=padding.MGF1(hashes.SHA256()), algorithm=hashes.SHA256(), label=None
-            ),
-        )
+        return self._seal(TOKEN_TYPE_RETRY, buf.data, now=now)
 
-    def validate_token(self, addr: NetworkAddress, token: bytes) -> Tuple[bytes, bytes]:
-        buf = Buffer(
-            data=self._key.decrypt(
-                token,
-                padding.OAEP(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None,
-                ),
-            )
+    def is_retry_token(self, token: bytes) -> bool:
+        """
+        Return whether the token was sent in a Retry packet, rather than in a
+        NEW_TOKEN frame.
+        """
+        return token[:1] == bytes([TOKEN_TYPE_RETRY])
+
+    def validate_new_token(
+        self, addr: NetworkAddress, token: bytes, now: Optional[float] = None
+    ) -> bool:
+        """
+        Return whether the token is a valid token from a NEW_TOKEN frame,
+        which has not been used before.
+
+        See: https://datatracker.ietf.org/doc/html/rfc9000#section-8.1.4
+        """
+        if now is None:
+            now = time.time()
+        try:
+            issued_at, plain = self._open(TOKEN_TYPE_NEW_TOKEN, token, now=now)
+        except ValueError:
+            return False
+        if plain != ipaddress.ip_address(addr[0]).packed:
+            return False
+
+        # forget the tokens which have expired
+        expiry = self._used_new_tokens_expiry
+        while expiry and expiry[0][0] <= now:
+            self._used_new_tokens.discard(heapq.heappop(expiry)[1])
+
+        nonce = token[2:TOKEN_HEADER_SIZE]
+        if (
+            nonce in self._used_new_tokens
+            or len(self._used_new_tokens) >= self._max_used_new_tokens
+        ):
+            return False
+        self._used_new_tokens.add(nonce)
+        heapq.heappush(
+            expiry, (issued_at + self._lifetimes[TOKEN_TYPE_NEW_TOKEN], nonce)
         )
-        encoded_addr = pull_opaque(buf, 1)
-        original_destination_connection_id = pull_opaque(buf, 1)
-        retry_source_connection_id = pull_opaque(buf, 1)
+        return True
+
+    def validate_token(
+        self, addr: NetworkAddress, token: bytes, now: Optional[float] = None
+    ) -> Tuple[bytes, bytes]:
+        """
+        Validate a token from a Retry packet, and return the original
+        destination and retry source connection IDs.
+        """
+        _, plain = self._open(TOKEN_TYPE_RETRY, token, now=now)
+        buf = Buffer(data=plain)
+        try:
+            encoded_addr = pull_opaque(buf, 1)
+            original_destination_connection_id = pull_opaque(buf, 1)
+            retry_source_connection_id = pull_opaque(buf, 1)
+        except BufferReadError:
+            raise ValueError("Token is not valid.")
         if encoded_addr != encode_address(addr):
             raise ValueError("Remote address does not match.")
         return original_destination_connection_id, retry_source_connection_id
+
+    def _get_key(self, token_type: int, key_id: int) -> AESGCM:
+        key = self._keys.get((token_type, key_id))
+        if key is None:
+            # only the current and previous keys are needed
+            for old in [
+                k for k in self._keys if k[0] == token_type and k[1] < key_id - 1
+            ]:
+                del self._keys[old]
+            key = AESGCM(
+                HKDFExpand(
+                    algorithm=hashes.SHA256(),
+                    length=16,
+                    info=TOKEN_KEY_LABEL + struct.pack("!BQ", token_type, key_id),
+                ).derive(self._secret)
+            )
+            self._keys[(token_type, key_id)] = key
+        return key
+
+    def _open(
+        self, token_type: int, token: bytes, now: Optional[float]
+    ) -> Tuple[float, bytes]:
+        """
+        Decrypt a token of the given type, check that it has not expired and
+        return the time it was issued at along with its contents.
+        """
+        if now is None:
+            now = time.time()
+        lifetime = self._lifetimes[token_type]
+        if len(token) <= TOKEN_HEADER_SIZE or token[0] != token_type:
+            raise ValueError("Token is not valid.")
+
+        # tokens are sealed with the current key or the previous one, the low
+        # byte of the key ID tells them apart
+        key_id = int(now // lifetime)
+        if token[1] != key_id & 0xFF:
+            key_id -= 1
+            if token[1] != key_id & 0xFF:
+                raise ValueError("Token is not valid.")
+
+        header = token[:TOKEN_HEADER_SIZE]
+        try:
+            plain = self._get_key(token_type, key_id).decrypt(
+                header[2:], token[TOKEN_HEADER_SIZE:], header
+            )
+        except InvalidTag:
+            raise ValueError("Token is not valid.")
+        issued_at = struct.unpack_from("!Q", plain)[0] / 1000
+        if not issued_at <= now < issued_at + lifetime:
+            raise ValueError("Token has expired.")
+        return issued_at, plain[8:]
+
+    def _seal(self, token_type: int, plain: bytes, now: Optional[float]) -> bytes:
+        """
+        Encrypt a token of the given type, prefixed with the current time.
+        """
+        if now is None:
+            now = time.time()
+        key_id = int(now // self._lifetimes[token_type])
+        header = bytes([token_type, key_id & 0xFF]) + os.urandom(TOKEN_NONCE_SIZE)
+        return header + self._get_key(token_type, key_id).encrypt(
+            header[2:], struct.pack("!Q", int(now * 1000)) + plain, header
+        )
@@ -0,0 +1,145 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterator, List
+
+if TYPE_CHECKING:
+    from .stream import QuicStream
+
+# https://datatracker.ietf.org/doc/html/rfc9218#section-4
+URGENCY_COUNT = 8
+URGENCY_DEFAULT = 3
+INCREMENTAL_DEFAULT = False
+
+# number of bytes an incremental stream may send before yielding its turn
+QUANTUM_DEFAULT = 16384
+
+
+class QuicStreamBucket:
+    """
+    The streams sharing a given urgency.
+    """
+
+    def __init__(self) -> None:
+        # non-incremental streams, served one at a time in stream ID order
+        self.sequential: List["QuicStream"] = []
+        self.sequential_ids: List[int] = []
+
+        # incremental streams, served round-robin
+        self.incremental: "OrderedDict[int, QuicStream]" = OrderedDict()
+
+    def __bool__(self) -> bool:
+        return bool(self.sequential_ids) or bool(self.incremental)
+
+
+class QuicStreamScheduler:
+    """
+    Send scheduler implementing the extensible prioritization scheme.
+
+    Streams are grouped into eight buckets by urgency, lowest urgency value
+    first. Within a bucket, non-incremental streams are served sequentially in
+    stream ID order, then incremental streams share the remaining capacity
+    in a round-robin fashion, yielding their turn once they have sent
+    `quantum` bytes.
+
+    See: https://datatracker.ietf.org/doc/html/rfc9218
+    """
+
+    def __init__(self, quantum: int = QUANTUM_DEFAULT) -> None:
+        assert quantum > 0, "quantum must be positive"
+        self._buckets = [QuicStreamBucket() for i in range(URGENCY_COUNT)]
+        self._credits: Dict[int, int] = {}
+        self._quantum = quantum
+
+    def add(self, stream: "QuicStream") -> None:
+        """
+        Start scheduling the given stream.
+        """
+        bucket = self._buckets[stream.priority_urgency]
+        if stream.priority_incremental:
+            if stream.stream_id not in bucket.incremental:
+                bucket.incremental[stream.stream_id] = stream
+                self._credits[stream.stream_id] = 0
+        else:
+            index = bisect_left(bucket.sequential_ids, stream.stream_id)
+            if (
+                index == len(bucket.sequential_ids)
+                or bucket.sequential_ids[index] != stream.stream_id
+            ):
+                bucket.sequential_ids.insert(index, stream.stream_id)
+                bucket.sequential.insert(index, stream)
+
+    def on_data_sent(self, stream: "QuicStream", size: int) -> None:
+        """
+        Account for `size` bytes sent on an incremental stream.
+        """
+        if stream.stream_id not in self._credits:
+            return
+
+        credit = self._credits[stream.stream_id] + size
+        if credit >= self._quantum:
+            # the stream has used up its turn, move it to the back of the queue
+            self._buckets[stream.priority_urgency].incremental.move_to_end(
+                stream.stream_id
+            )
+            credit = 0
+        self._credits[stream.stream_id] = credit
+
+    def remove(self, stream: "QuicStream") -> None:
+        """
+        Stop scheduling the given stream.
+        """
+        bucket = self._buckets[stream.priority_urgency]
+        if stream.priority_incremental:
+            bucket.incremental.pop(stream.stream_id, None)
+            self._credits.pop(stream.stream_id, None)
+        else:
+            index = bisect_left(bucket.sequential_ids, stream.stream_id)
+            if (
+                index < len(bucket.sequential_ids)
+                and bucket.sequential_ids[index] == stream.stream_id
+            ):
+                del bucket.sequential_ids[index]
+                del bucket.sequential[index]
+
+    def update(self, stream: "QuicStream", urgency: int, incremental: bool) -> None:
+        """
+        Change the priority of the given stream.
+        """
+        if (
+            urgency == stream.priority_urgency
+            and incremental == stream.priority_incremental
+        ):
+            return
+
+        scheduled = stream in self
+        if scheduled:
+            self.remove(stream)
+        stream.priority_urgency = urgency
+        stream.priority_incremental = incremental
+        if scheduled:
+            self.add(stream)
+
+    def __contains__(self, stream: "QuicStream") -> bool:
+        bucket = self._buckets[stream.priority_urgency]
+        if stream.priority_incremental:
+            return stream.stream_id in bucket.incremental
+        index = bisect_left(bucket.sequential_ids, stream.stream_id)
+        return (
+            index < len(bucket.sequential_ids)
+            and bucket.sequential_ids[index] == stream.stream_id
+        )
+
+    def __iter__(self) -> Iterator["QuicStream"]:
+        """
+        Iterate over the streams in the order in which they should be served.
+        """
+        for bucket in self._buckets:
+            if bucket:
+                yield from list(bucket.sequential)
+                yield from list(bucket.incremental.values())
+
+    def __len__(self) -> int:
+        return sum(
+            len(bucket.sequential_ids) + len(bucket.incremental)
+            for bucket in self._buckets
+        )
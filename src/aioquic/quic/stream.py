@@ -1,4 +1,6 @@
-from typing import Optional
+import os
+from bisect import bisect_right
+from typing import IO, Callable, List, Optional, Union
 
 from . import events
 from .packet import (
@@ -9,6 +11,7 @@ from .packet import (
 )
 from .packet_builder import QuicDeliveryState
 from .rangeset import RangeSet
+from .scheduler import INCREMENTAL_DEFAULT, URGENCY_DEFAULT
 
 
 class FinalSizeError(Exception):
@@ -19,6 +22,108 @@ class StreamFinishedError(Exception):
     pass
 
 
+class QuicStreamProducer:
+    """
+    A source of stream data which is read on demand, when the stream is ready
+    to send more data.
+
+    If `size` is known, the producer must support reads at any offset: data is
+    read again whenever it needs to be retransmitted, so it is never buffered.
+    Otherwise the producer is read sequentially and the data it returns is
+    buffered until it is acknowledged.
+    """
+
+    size: Optional[int] = None
+
+    def close(self) -> None:
+        """
+        Release the resources held by the producer once it is no longer used.
+        """
+
+    def read(self, offset: int, size: int) -> Union[bytes, memoryview]:
+        """
+        Read up to `size` bytes starting at `offset`.
+
+        Producers with a known size must return exactly `size` bytes, other
+        producers return an empty result once they are exhausted.
+        """
+        raise NotImplementedError
+
+
+class QuicBufferProducer(QuicStreamProducer):
+    """
+    Produce stream data from a buffer such as an :class:`mmap.mmap`, without
+    copying it.
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]) -> None:
+        self._view = memoryview(buffer).cast("B")
+        self.size = len(self._view)
+
+    def read(self, offset: int, size: int) -> memoryview:
+        return self._view[offset : offset + size]
+
+
+class QuicCallbackProducer(QuicStreamProducer):
+    """
+    Produce stream data by calling `callback(size)`, which returns up to `size`
+    bytes or an empty result once all the data has been produced.
+    """
+
+    def __init__(self, callback: Callable[[int], bytes]) -> None:
+        self._callback = callback
+
+    def read(self, offset: int, size: int) -> bytes:
+        return self._callback(size)
+
+
+class QuicFileProducer(QuicStreamProducer):
+    """
+    Produce stream data from a region of a file.
+
+    The file is read using its descriptor with positional reads, so its
+    current position is left untouched.
+
+    :param file: A file object or a file descriptor.
+    :param offset: The offset at which the region starts.
+    :param size: The size of the region, by default up to the end of the file.
+    :param closefd: Whether to close the file once it is no longer used.
+    """
+
+    def __init__(
+        self,
+        file: Union[int, IO],
+        offset: int = 0,
+        size: Optional[int] = None,
+        closefd: bool = False,
+    ) -> None:
+        self._closefd = closefd
+        self._file = file
+        self._fd = file if isinstance(file, int) else file.fileno()
+        self._offset = offset
+        if size is None:
+            size = os.fstat(self._fd).st_size - offset
+        self.size = size
+
+    def close(self) -> None:
+        if self._closefd:
+            self._closefd = False
+            if isinstance(self._file, int):
+                os.close(self._file)
+            else:
+                self._file.close()
+
+    def read(self, offset: int, size: int) -> bytes:
+        if hasattr(os, "pread"):
+            data = os.pread(self._fd, size, self._offset + offset)
+        else:
+            os.lseek(self._fd, self._offset + offset, os.SEEK_SET)
+            data = os.read(self._fd, size)
+        if len(data) != size:
+            raise ValueError("File is shorter than expected")
+        return data
+
+
 class QuicStreamReceiver:
     """
     The receive part of a QUIC stream.
@@ -34,10 +139,11 @@ class QuicStreamReceiver:
         self.is_finished = False
         self.stop_pending = False
 
-        self._buffer = bytearray()
         self._buffer_start = 0  # the offset for the start of the buffer
         self._final_size: Optional[int] = None
-        self._ranges = RangeSet()
+        self._segments: List[Union[bytes, memoryview]] = []  # out-of-order data
+        self._segment_starts: List[int] = []  # the offset for the start of each segment
+        self._segment_stops: List[int] = []  # the offset for the stop of each segment
         self._stream_id = stream_id
         self._stop_error_code: Optional[int] = None
 
@@ -70,13 +176,13 @@ class QuicStreamReceiver:
             self.highest_offset = frame_end
 
         # fast path: new in-order chunk
-        if pos == 0 and count and not self._buffer:
+        if pos == 0 and count and not self._segments:
             self._buffer_start += count
             if frame.fin:
                 # all data up to the FIN has been received, we're done receiving
                 self.is_finished = True
             return events.StreamDataReceived(
-                data=frame.data, end_stream=frame.fin, stream_id=self._stream_id
+                data=bytes(frame.data), end_stream=frame.fin, stream_id=self._stream_id
             )
 
         # discard duplicate data
@@ -86,15 +192,9 @@ class QuicStreamReceiver:
             pos = 0
             count = len(frame.data)
 
-        # marked received range
-        if frame_end > frame.offset:
-            self._ranges.add(frame.offset, frame_end)
-
-        # add new data
-        gap = pos - len(self._buffer)
-        if gap > 0:
-            self._buffer += bytearray(gap)
-        self._buffer[pos : pos + count] = frame.data
+        # store new data
+        if count:
+            self._add_segment(frame.offset, bytes(frame.data))
 
         # return data from the front of the buffer
         data = self._pull_data()
@@ -137,22 +237,60 @@ class QuicStreamReceiver:
         self._stop_error_code = error_code
         self.stop_pending = True
 
+    def _add_segment(self, start: int, data: bytes) -> None:
+        """
+        Store out-of-order data, without the parts which were already received.
+        """
+        starts = self._segment_starts
+        stops = self._segment_stops
+        stop = start + len(data)
+
+        # fast path: the data does not overlap any segment
+        i = bisect_right(stops, start)
+        if i == len(starts) or starts[i] >= stop:
+            starts.insert(i, start)
+            stops.insert(i, stop)
+            self._segments.insert(i, data)
+            return
+
+        # fill the holes between the segments the data overlaps
+        view = memoryview(data)
+        pos = start
+        while pos < stop:
+            if i < len(starts) and starts[i] <= pos:
+                pos = max(pos, stops[i])
+                i += 1
+                continue
+
+            hole_stop = min(stop, starts[i]) if i < len(starts) else stop
+            starts.insert(i, pos)
+            stops.insert(i, hole_stop)
+            self._segments.insert(i, view[pos - start : hole_stop - start])
+            pos = hole_stop
+            i += 1
+
     def _pull_data(self) -> bytes:
         """
-        Remove data from the front of the buffer.
+        Remove contiguous data from the front of the buffer.
         """
-        try:
-            has_data_to_read = self._ranges[0].start == self._buffer_start
-        except IndexError:
-            has_data_to_read = False
-        if not has_data_to_read:
+        starts = self._segment_starts
+        stops = self._segment_stops
+        if not starts or starts[0] != self._buffer_start:
             return b""
 
-        r = self._ranges.shift()
-        pos = r.stop - r.start
-        data = bytes(self._buffer[:pos])
-        del self._buffer[:pos]
-        self._buffer_start = r.stop
+        # find the segments which directly follow each other
+        count = 1
+        while count < len(starts) and starts[count] == stops[count - 1]:
+            count += 1
+
+        if count == 1:
+            data = bytes(self._segments[0])
+        else:
+            data = b"".join(self._segments[:count])
+        self._buffer_start = stops[count - 1]
+        del self._segments[:count]
+        del starts[:count]
+        del stops[:count]
         return data
 
 
@@ -173,14 +311,31 @@ class QuicStreamSender:
         self.reset_pending = False
 
         self._acked = RangeSet()
-        self._buffer = bytearray()
         self._buffer_fin: Optional[int] = None
         self._buffer_start = 0  # the offset for the start of the buffer
         self._buffer_stop = 0  # the offset for the stop of the buffer
+        self._chunks: List[Union[memoryview, QuicStreamProducer]] = []
+        self._chunk_starts: List[int] = []  # the offset for the start of each chunk
+        self._chunk_stops: List[int] = []  # the offset for the stop of each chunk
         self._pending = RangeSet()
         self._pending_eof = False
+        self._producer: Optional[QuicStreamProducer] = None
+        self._producer_fin = False
         self._reset_error_code: Optional[int] = None
         self._stream_id = stream_id
+        self._unsent_producer_size = 0  # bytes of producers never sent yet
+
+    @property
+    def buffered_size(self) -> int:
+        """
+        The number of bytes which were written but not acknowledged yet.
+
+        The data of producers with a known size is only counted once it has
+        been sent, as it is never held in memory.
+        """
+        if self._reset_error_code is not None:
+            return 0
+        return self._buffer_stop - self._buffer_start - self._unsent_producer_size
 
     @property
     def next_offset(self) -> int:
@@ -200,6 +355,10 @@ class QuicStreamSender:
         """
         Get a frame of data to send.
         """
+        # read more data from the producer if needed
+        if self._producer is not None and not len(self._pending):
+            self._read_producer(max_size, max_offset)
+
         # get the first pending data range
         try:
             r = self._pending[0]
@@ -209,7 +368,8 @@ class QuicStreamSender:
                 self._pending_eof = False
                 return QuicStreamFrame(fin=True, offset=self._buffer_fin)
 
-            self.buffer_is_empty = True
+            if self._producer is None:
+                self.buffer_is_empty = True
             return None
 
         # apply flow control
@@ -221,16 +381,15 @@ class QuicStreamSender:
             return None
 
         # create frame
-        frame = QuicStreamFrame(
-            data=bytes(
-                self._buffer[start - self._buffer_start : stop - self._buffer_start]
-            ),
-            offset=start,
-        )
+        frame = QuicStreamFrame(data=self._get_data(start, stop), offset=start)
         self._pending.subtract(start, stop)
 
         # track the highest offset ever sent
         if stop > self.highest_offset:
+            if self._unsent_producer_size:
+                self._unsent_producer_size -= self._get_producer_size(
+                    max(start, self.highest_offset), stop
+                )
             self.highest_offset = stop
 
         # if the buffer is empty and EOF was written, set the FIN bit
@@ -254,25 +413,25 @@ class QuicStreamSender:
         """
         Callback when sent data is ACK'd.
         """
-        self.buffer_is_empty = False
         if delivery == QuicDeliveryState.ACKED:
             if stop > start:
                 self._acked.add(start, stop)
                 first_range = self._acked[0]
                 if first_range.start == self._buffer_start:
-                    size = first_range.stop - first_range.start
                     self._acked.shift()
-                    self._buffer_start += size
-                    del self._buffer[:size]
+                    self._buffer_start = first_range.stop
+                    self._release_chunks()
 
             if self._buffer_start == self._buffer_fin:
                 # all date up to the FIN has been ACK'd, we're done sending
                 self.is_finished = True
-        else:
+        elif self._reset_error_code is None:
+            # once the stream is reset, data is never retransmitted
             if stop > start:
+                self.buffer_is_empty = False
                 self._pending.add(start, stop)
             if stop == self._buffer_fin:
-                self.send_buffer_empty = False
+                self.buffer_is_empty = False
                 self._pending_eof = True
 
     def on_reset_delivery(self, delivery: QuicDeliveryState) -> None:
@@ -293,23 +452,156 @@ class QuicStreamSender:
         self._reset_error_code = error_code
         self.reset_pending = True
 
-    def write(self, data: bytes, end_stream: bool = False) -> None:
+        # prevent any more data from being sent or re-sent
+        self.buffer_is_empty = True
+        if self._producer is not None:
+            self._producer.close()
+            self._producer = None
+        for chunk in self._chunks:
+            if isinstance(chunk, QuicStreamProducer):
+                chunk.close()
+        self._chunks.clear()
+        self._chunk_starts.clear()
+        self._chunk_stops.clear()
+
+    def write(
+        self,
+        data: Union[bytes, bytearray, memoryview, QuicStreamProducer],
+        end_stream: bool = False,
+    ) -> None:
         """
         Write some data bytes to the QUIC stream.
+
+        `bytes` and read-only `memoryview` objects are referenced without being
+        copied, so they must not be modified until they are acknowledged.
+        Other buffers are copied.
+
+        If `data` is a :class:`QuicStreamProducer`, it is read when the
+        stream is ready to send more data.
         """
         assert self._buffer_fin is None, "cannot call write() after FIN"
         assert self._reset_error_code is None, "cannot call write() after reset()"
-        size = len(data)
+        assert self._producer is None, "cannot call write() while a producer is used"
+
+        if isinstance(data, QuicStreamProducer):
+            if data.size is None:
+                # the producer is read sequentially, until it is exhausted
+                self.buffer_is_empty = False
+                self._producer = data
+                self._producer_fin = end_stream
+                return
+            self._append_chunk(data, data.size)
+        else:
+            self._append_chunk(data, None)
+        if end_stream:
+            self.buffer_is_empty = False
+            self._buffer_fin = self._buffer_stop
+            self._pending_eof = True
+
+    def _append_chunk(
+        self,
+        data: Union[bytes, bytearray, memoryview, QuicStreamProducer],
+        size: Optional[int],
+    ) -> None:
+        """
+        Append a chunk of data, or a producer of known `size`, to the buffer.
+        """
+        chunk: Union[memoryview, QuicStreamProducer]
+        if isinstance(data, QuicStreamProducer):
+            assert size is not None, "producers must have a known size"
+            chunk = data
+            self._unsent_producer_size += size
+        else:
+            view = memoryview(data)
+            if not view.readonly:
+                view = memoryview(bytes(view))
+            elif view.format != "B" or view.ndim != 1:
+                view = view.cast("B")
+            chunk = view
+            size = len(view)
 
         if size:
             self.buffer_is_empty = False
             self._pending.add(self._buffer_stop, self._buffer_stop + size)
-            self._buffer += data
+            self._chunks.append(chunk)
+            self._chunk_starts.append(self._buffer_stop)
+            self._chunk_stops.append(self._buffer_stop + size)
             self._buffer_stop += size
-        if end_stream:
-            self.buffer_is_empty = False
-            self._buffer_fin = self._buffer_stop
-            self._pending_eof = True
+        elif isinstance(data, QuicStreamProducer):
+            data.close()
+
+    def _get_data(self, start: int, stop: int) -> Union[bytes, memoryview]:
+        """
+        Return the buffered data between offsets `start` and `stop`.
+
+        If the data is contained in a single chunk, it is returned without
+        being copied.
+        """
+        index = bisect_right(self._chunk_starts, start) - 1
+        pieces = []
+        while start < stop:
+            chunk = self._chunks[index]
+            chunk_start = self._chunk_starts[index]
+            chunk_stop = min(stop, self._chunk_stops[index])
+            if isinstance(chunk, QuicStreamProducer):
+                pieces.append(chunk.read(start - chunk_start, chunk_stop - start))
+            else:
+                pieces.append(chunk[start - chunk_start : chunk_stop - chunk_start])
+            start = chunk_stop
+            index += 1
+
+        if len(pieces) == 1:
+            return pieces[0]
+        return b"".join(pieces)
+
+    def _get_producer_size(self, start: int, stop: int) -> int:
+        """
+        Return how many bytes between offsets `start` and `stop` belong to
+        producers rather than to buffered data.
+        """
+        index = bisect_right(self._chunk_starts, start) - 1
+        size = 0
+        while start < stop:
+            chunk_stop = min(stop, self._chunk_stops[index])
+            if isinstance(self._chunks[index], QuicStreamProducer):
+                size += chunk_stop - start
+            start = chunk_stop
+            index += 1
+        return size
+
+    def _read_producer(self, max_size: int, max_offset: Optional[int]) -> None:
+        """
+        Read data from the producer into the buffer.
+        """
+        size = max_size
+        if max_offset is not None:
+            size = min(size, max_offset - self._buffer_stop)
+        if size <= 0:
+            return
+
+        data = self._producer.read(self._buffer_stop, size)
+        if len(data):
+            self._append_chunk(data, None)
+        else:
+            # the producer is exhausted
+            self._producer.close()
+            self._producer = None
+            if self._producer_fin:
+                self._buffer_fin = self._buffer_stop
+                self._pending_eof = True
+
+    def _release_chunks(self) -> None:
+        """
+        Drop the chunks which have been entirely acknowledged.
+        """
+        count = bisect_right(self._chunk_stops, self._buffer_start)
+        if count:
+            for chunk in self._chunks[:count]:
+                if isinstance(chunk, QuicStreamProducer):
+                    chunk.close()
+            del self._chunks[:count]
+            del self._chunk_starts[:count]
+            del self._chunk_stops[:count]
 
 
 class QuicStream:
@@ -325,9 +617,14 @@ class QuicStream:
         self.max_stream_data_local = max_stream_data_local
         self.max_stream_data_local_sent = max_stream_data_local
         self.max_stream_data_remote = max_stream_data_remote
+        self.priority_incremental = INCREMENTAL_DEFAULT
+        self.priority_urgency = URGENCY_DEFAULT
         self.receiver = QuicStreamReceiver(stream_id=stream_id, readable=readable)
         self.sender = QuicStreamSender(stream_id=stream_id, writable=writable)
         self.stream_id = stream_id
+        self.write_buffer_full = False
+        self.write_buffer_high: Optional[int] = None
+        self.write_buffer_low = 0
 
     @property
     def is_finished(self) -> bool:
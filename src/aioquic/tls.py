@@ -3,6 +3,8 @@ import logging
 import os
 import ssl
 import struct
+import threading
+from collections import OrderedDict, deque
 from contextlib import contextmanager
 from dataclasses import dataclass, field
 from enum import Enum, IntEnum
@@ -10,6 +12,7 @@ from functools import partial
 from typing import (
     Any,
     Callable,
+    Deque,
     Dict,
     Generator,
     List,
@@ -144,6 +147,7 @@ class State(Enum):
     SERVER_EXPECT_CLIENT_HELLO = 8
     SERVER_EXPECT_FINISHED = 9
     SERVER_POST_HANDSHAKE = 10
+    SERVER_EXPECT_SIGNATURE = 11
 
 
 def hkdf_label(label: bytes, hash_value: bytes, length: int) -> bytes:
@@ -846,6 +850,18 @@ def push_certificate(buf: Buffer, certificate: Certificate) -> None:
         )
 
 
+def encode_certificate(
+    certificate: x509.Certificate, chain: List[x509.Certificate]
+) -> bytes:
+    """
+    Encode the Certificate message for the given certificate and chain.
+    """
+    certificates = [(x.public_bytes(Encoding.DER), b"") for x in [certificate] + chain]
+    buf = Buffer(capacity=16 + sum(len(x[0]) + 5 for x in certificates))
+    push_certificate(buf, Certificate(request_context=b"", certificates=certificates))
+    return buf.data
+
+
 @dataclass
 class CertificateVerify:
     algorithm: int
@@ -1023,6 +1039,17 @@ def encode_public_key(
     )
 
 
+def generate_private_key(group: int) -> Any:
+    """
+    Generate an ephemeral private key for the given key exchange group.
+    """
+    if group == Group.X25519:
+        return x25519.X25519PrivateKey.generate()
+    elif group == Group.X448:
+        return x448.X448PrivateKey.generate()
+    return ec.generate_private_key(GROUP_TO_CURVE[group]())
+
+
 def negotiate(
     supported: List[T], offered: Optional[List[Any]], exc: Optional[Alert] = None
 ) -> T:
@@ -1093,9 +1120,225 @@ class SessionTicket:
         return (age + self.age_add) % (1 << 32)
 
 
+class KeySharePool:
+    """
+    A pool of ephemeral private keys for the TLS key exchange, generated ahead
+    of the handshakes.
+
+    Up to `size` keys are kept for each of the `groups`, and each key is handed
+    out to a single handshake. When the pool runs dry, keys are generated on
+    the spot. The pool is refilled by calling :meth:`fill`, for instance when
+    the event loop is idle, or by a background thread started with
+    :meth:`start`.
+
+    The keys are discarded in child processes, so that forked processes never
+    share them, and the background thread is started again if it was running
+    in the parent process.
+    """
+
+    def __init__(self, groups: Optional[List[int]] = None, size: int = 16) -> None:
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        if groups is None:
+            groups = [Group.SECP256R1]
+            if default_backend().x25519_supported():
+                groups.append(Group.X25519)
+            if default_backend().x448_supported():
+                groups.append(Group.X448)
+
+        self.hits = 0
+        "The number of keys which were taken from the pool."
+
+        self.misses = 0
+        "The number of keys which were generated because the pool was empty."
+
+        self._condition = threading.Condition()
+        self._keys: Dict[int, Deque[Any]] = {group: deque() for group in groups}
+        self._pid = os.getpid()
+        self._size = size
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self._keys.values())
+
+    def close(self) -> None:
+        """
+        Stop the background thread, if it was started.
+        """
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+
+    def fill(self) -> int:
+        """
+        Generate keys until the pool is full, and return how many were generated.
+        """
+        self._check_pid()
+        count = 0
+        for group, keys in self._keys.items():
+            while len(keys) < self._size:
+                keys.append(generate_private_key(group))
+                count += 1
+        return count
+
+    def get(self, group: int) -> Any:
+        """
+        Return an unused private key for the given group.
+        """
+        self._check_pid()
+        keys = self._keys.get(group)
+        if keys is None:
+            return generate_private_key(group)
+        try:
+            key = keys.popleft()
+        except IndexError:
+            self.misses += 1
+            return generate_private_key(group)
+
+        self.hits += 1
+        if self._thread is not None:
+            with self._condition:
+                self._condition.notify()
+        return key
+
+    def start(self) -> None:
+        """
+        Start a background thread which refills the pool as keys are taken.
+        """
+        assert self._thread is None, "the background thread is already started"
+        self._thread = threading.Thread(
+            target=self._run, name="aioquic-key-share-pool", daemon=True
+        )
+        self._thread.start()
+
+    def _check_pid(self) -> None:
+        pid = os.getpid()
+        if pid != self._pid:
+            for keys in self._keys.values():
+                keys.clear()
+            self._pid = pid
+
+            # the parent's thread does not exist in the child, and its lock
+            # may have been held when the process forked
+            self._condition = threading.Condition()
+            was_running = self._thread is not None
+            self._thread = None
+            if was_running:
+                self.start()
+
+    def _is_full(self) -> bool:
+        return all(len(keys) >= self._size for keys in self._keys.values())
+
+    def _run(self) -> None:
+        thread = threading.current_thread()
+        while True:
+            self.fill()
+            with self._condition:
+                while self._thread is thread and self._is_full():
+                    self._condition.wait()
+                if self._thread is not thread:
+                    return
+
+
+class CertificateCache:
+    """
+    A cache for the certificate work of the handshakes which share a
+    configuration.
+
+    Servers encode their Certificate message once. Clients remember up to
+    `max_size` certificate chains which were successfully verified for a server
+    name, until the first certificate of the chain expires.
+    """
+
+    def __init__(self, max_size: int = 256) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.hits = 0
+        "The number of certificate chains which were found in the cache."
+
+        self.misses = 0
+        "The number of certificate chains which were verified."
+
+        self._encoded: Optional[
+            Tuple[x509.Certificate, Tuple[x509.Certificate, ...], bytes]
+        ] = None
+        self._max_size = max_size
+        self._verified: OrderedDict[Tuple, datetime.datetime] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._verified)
+
+    def encode_certificate(
+        self, certificate: x509.Certificate, chain: List[x509.Certificate]
+    ) -> bytes:
+        """
+        Return the Certificate message for the given certificate and chain.
+        """
+        encoded = self._encoded
+        if (
+            encoded is None
+            or encoded[0] is not certificate
+            or encoded[1] != tuple(chain)
+        ):
+            encoded = (
+                certificate,
+                tuple(chain),
+                encode_certificate(certificate, chain),
+            )
+            self._encoded = encoded
+        return encoded[2]
+
+    def verify_certificate(
+        self,
+        certificate: x509.Certificate,
+        chain: List[x509.Certificate] = [],
+        server_name: Optional[str] = None,
+        cadata: Optional[bytes] = None,
+        cafile: Optional[str] = None,
+        capath: Optional[str] = None,
+    ) -> None:
+        """
+        Verify a certificate chain as :func:`verify_certificate` does, unless it
+        was already verified for the same server name and certificate
+        authorities.
+        """
+        key = (
+            tuple(x.fingerprint(hashes.SHA256()) for x in [certificate] + chain),
+            server_name,
+            cadata,
+            cafile,
+            capath,
+        )
+        not_valid_after = self._verified.get(key)
+        if not_valid_after is not None:
+            if utcnow() <= not_valid_after:
+                self._verified.move_to_end(key)
+                self.hits += 1
+                return
+            del self._verified[key]
+
+        self.misses += 1
+        verify_certificate(
+            certificate=certificate,
+            chain=chain,
+            server_name=server_name,
+            cadata=cadata,
+            cafile=cafile,
+            capath=capath,
+        )
+
+        self._verified[key] = min(x.not_valid_after for x in [certificate] + chain)
+        if len(self._verified) > self._max_size:
+            self._verified.popitem(last=False)
+
+
 AlpnHandler = Callable[[str], None]
 SessionTicketFetcher = Callable[[bytes], Optional[SessionTicket]]
 SessionTicketHandler = Callable[[SessionTicket], None]
+SignatureRequestHandler = Callable[[bytes, SignatureAlgorithm], None]
 
 
 class Context:
@@ -1118,11 +1361,13 @@ class Context:
         self._cafile = cafile
         self._capath = capath
         self.certificate: Optional[x509.Certificate] = None
+        self.certificate_cache: Optional[CertificateCache] = None
         self.certificate_chain: List[x509.Certificate] = []
         self.certificate_private_key: Optional[
             Union[dsa.DSAPrivateKey, ec.EllipticCurvePrivateKey, rsa.RSAPrivateKey]
         ] = None
         self.handshake_extensions: List[Extension] = []
+        self.key_share_pool: Optional[KeySharePool] = None
         self._max_early_data = max_early_data
         self.session_ticket: Optional[SessionTicket] = None
         self._server_name = server_name
@@ -1135,6 +1380,7 @@ class Context:
         self.alpn_cb: Optional[AlpnHandler] = None
         self.get_session_ticket_cb: Optional[SessionTicketFetcher] = None
         self.new_session_ticket_cb: Optional[SessionTicketHandler] = None
+        self.signature_request_cb: Optional[SignatureRequestHandler] = None
         self.update_traffic_key_cb: Callable[
             [Direction, Epoch, CipherSuite, bytes], None
         ] = lambda d, e, c, s: None
@@ -1179,6 +1425,9 @@ class Context:
         self._peer_certificate_chain: List[x509.Certificate] = []
         self._receive_buffer = b""
         self._session_resumed = False
+        self._signature_pending: Optional[
+            Tuple[SignatureAlgorithm, Optional[int]]
+        ] = None
         self._enc_key: Optional[bytes] = None
         self._dec_key: Optional[bytes] = None
         self.__logger = logger
@@ -1203,6 +1452,28 @@ class Context:
         """
         return self._session_resumed
 
+    def handle_signature(
+        self, signature: bytes, output_buf: Dict[Epoch, Buffer]
+    ) -> None:
+        """
+        Resume the handshake with the signature requested from
+        `signature_request_cb`, then handle the messages received meanwhile.
+        """
+        assert self.state == State.SERVER_EXPECT_SIGNATURE, "no signature expected"
+        signature_algorithm, psk_key_exchange_mode = self._signature_pending
+        self._signature_pending = None
+
+        handshake_buf = output_buf[Epoch.HANDSHAKE]
+        with push_message(self.key_schedule, handshake_buf):
+            push_certificate_verify(
+                handshake_buf,
+                CertificateVerify(algorithm=signature_algorithm, signature=signature),
+            )
+        self._server_send_finished(
+            handshake_buf, output_buf[Epoch.ONE_RTT], psk_key_exchange_mode
+        )
+        self.handle_message(b"", output_buf)
+
     def handle_message(
         self, input_data: bytes, output_buf: Dict[Epoch, Buffer]
     ) -> None:
@@ -1212,6 +1483,10 @@ class Context:
 
         self._receive_buffer += input_data
         while len(self._receive_buffer) >= 4:
+            # keep the messages until the pending signature is available
+            if self.state == State.SERVER_EXPECT_SIGNATURE:
+                break
+
             # determine message length
             message_type = self._receive_buffer[0]
             message_length = 4 + int.from_bytes(
@@ -1314,19 +1589,17 @@ class Context:
 
         for group in self._supported_groups:
             if group == Group.SECP256R1:
-                self._ec_private_key = ec.generate_private_key(
-                    GROUP_TO_CURVE[Group.SECP256R1]()
-                )
+                self._ec_private_key = self._generate_private_key(Group.SECP256R1)
                 key_share.append(encode_public_key(self._ec_private_key.public_key()))
                 supported_groups.append(Group.SECP256R1)
             elif group == Group.X25519:
-                self._x25519_private_key = x25519.X25519PrivateKey.generate()
+                self._x25519_private_key = self._generate_private_key(Group.X25519)
                 key_share.append(
                     encode_public_key(self._x25519_private_key.public_key())
                 )
                 supported_groups.append(Group.X25519)
             elif group == Group.X448:
-                self._x448_private_key = x448.X448PrivateKey.generate()
+                self._x448_private_key = self._generate_private_key(Group.X448)
                 key_share.append(encode_public_key(self._x448_private_key.public_key()))
                 supported_groups.append(Group.X448)
             elif group == Group.GREASE:
@@ -1511,7 +1784,12 @@ class Context:
 
         # check certificate
         if self._verify_mode != ssl.CERT_NONE:
-            verify_certificate(
+            verify_certificate_fn = (
+                self.certificate_cache.verify_certificate
+                if self.certificate_cache is not None
+                else verify_certificate
+            )
+            verify_certificate_fn(
                 cadata=self._cadata,
                 cafile=self._cafile,
                 capath=self._capath,
@@ -1705,19 +1983,17 @@ class Context:
         for key_share in peer_hello.key_share:
             peer_public_key = decode_public_key(key_share)
             if isinstance(peer_public_key, x25519.X25519PublicKey):
-                self._x25519_private_key = x25519.X25519PrivateKey.generate()
+                self._x25519_private_key = self._generate_private_key(Group.X25519)
                 public_key = self._x25519_private_key.public_key()
                 shared_key = self._x25519_private_key.exchange(peer_public_key)
                 break
             elif isinstance(peer_public_key, x448.X448PublicKey):
-                self._x448_private_key = x448.X448PrivateKey.generate()
+                self._x448_private_key = self._generate_private_key(Group.X448)
                 public_key = self._x448_private_key.public_key()
                 shared_key = self._x448_private_key.exchange(peer_public_key)
                 break
             elif isinstance(peer_public_key, ec.EllipticCurvePublicKey):
-                self._ec_private_key = ec.generate_private_key(
-                    GROUP_TO_CURVE[key_share[0]]()
-                )
+                self._ec_private_key = self._generate_private_key(key_share[0])
                 public_key = self._ec_private_key.public_key()
                 shared_key = self._ec_private_key.exchange(ec.ECDH(), peer_public_key)
                 break
@@ -1757,24 +2033,30 @@ class Context:
 
         if pre_shared_key is None:
             # send certificate
-            with push_message(self.key_schedule, handshake_buf):
-                push_certificate(
-                    handshake_buf,
-                    Certificate(
-                        request_context=b"",
-                        certificates=[
-                            (x.public_bytes(Encoding.DER), b"")
-                            for x in [self.certificate] + self.certificate_chain
-                        ],
-                    ),
+            if self.certificate_cache is not None:
+                certificate_message = self.certificate_cache.encode_certificate(
+                    self.certificate, self.certificate_chain
                 )
+            else:
+                certificate_message = encode_certificate(
+                    self.certificate, self.certificate_chain
+                )
+            with push_message(self.key_schedule, handshake_buf):
+                handshake_buf.push_bytes(certificate_message)
 
             # send certificate verify
+            verify_data = self.key_schedule.certificate_verify_data(
+                b"TLS 1.3, server CertificateVerify"
+            )
+            if self.signature_request_cb is not None:
+                # the handshake resumes in handle_signature()
+                self._signature_pending = (signature_algorithm, psk_key_exchange_mode)
+                self._set_state(State.SERVER_EXPECT_SIGNATURE)
+                self.signature_request_cb(verify_data, signature_algorithm)
+                return
+
             signature = self.certificate_private_key.sign(
-                self.key_schedule.certificate_verify_data(
-                    b"TLS 1.3, server CertificateVerify"
-                ),
-                *signature_algorithm_params(signature_algorithm),
+                verify_data, *signature_algorithm_params(signature_algorithm)
             )
             with push_message(self.key_schedule, handshake_buf):
                 push_certificate_verify(
@@ -1784,6 +2066,14 @@ class Context:
                     ),
                 )
 
+        self._server_send_finished(handshake_buf, onertt_buf, psk_key_exchange_mode)
+
+    def _server_send_finished(
+        self,
+        handshake_buf: Buffer,
+        onertt_buf: Buffer,
+        psk_key_exchange_mode: Optional[int],
+    ) -> None:
         # send finished
         with push_message(self.key_schedule, handshake_buf):
             push_finished(
@@ -1849,6 +2139,11 @@ class Context:
 
         self._set_state(State.SERVER_POST_HANDSHAKE)
 
+    def _generate_private_key(self, group: int) -> Any:
+        if self.key_share_pool is not None:
+            return self.key_share_pool.get(group)
+        return generate_private_key(group)
+
     def _setup_traffic_protection(
         self, direction: Direction, epoch: Epoch, label: bytes
     ) -> None:
@@ -1,18 +1,38 @@
 import asyncio
 import binascii
 import contextlib
+import errno
+import multiprocessing
 import random
 import socket
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from unittest import TestCase, skipIf
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 from cryptography.hazmat.primitives import serialization
 
 from aioquic.asyncio.client import connect
 from aioquic.asyncio.protocol import QuicConnectionProtocol
-from aioquic.asyncio.server import serve
+from aioquic.asyncio.server import QuicServer, serve
+from aioquic.asyncio.timer import QuicTimerWheel
+from aioquic.asyncio.transport import (
+    ECN_SUPPORTED,
+    SOL_UDP,
+    UDP_SEGMENT,
+    create_datagram_endpoint,
+)
+from aioquic.asyncio.workers import _serve_worker, serve_workers
 from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.connection_id import (
+    QuicLoadBalancerConfig,
+    QuicLoadBalancerConnectionIdGenerator,
+)
 from aioquic.quic.logger import QuicLogger
+from aioquic.quic.packet import ECN_ECT0, ECN_NOT_ECT
+from aioquic.quic.recovery import QuicEcnState
+from aioquic.quic.stream import QuicFileProducer
 
 from .utils import (
     SERVER_CACERTFILE,
@@ -26,9 +46,27 @@ from .utils import (
     generate_ed25519_certificate,
 )
 
+real_sendmsg = socket.socket.sendmsg
 real_sendto = socket.socket.sendto
 
 
+def sendmsg_with_loss(self, buffers, *args):
+    """
+    Simulate 25% packet loss.
+    """
+    if random.random() > 0.25:
+        real_sendmsg(self, buffers, *args)
+
+
+def sendmsg_without_gso(self, buffers, ancdata=(), *args):
+    """
+    Simulate an interface which cannot segment datagrams.
+    """
+    if any(kind == UDP_SEGMENT for level, kind, value in ancdata):
+        raise OSError(errno.EIO, "Input/output error")
+    return real_sendmsg(self, buffers, ancdata, *args)
+
+
 def sendto_with_loss(self, data, addr=None):
     """
     Simulate 25% packet loss.
@@ -175,6 +213,92 @@ class HighLevelTest(TestCase):
             response = await self.run_client(port=server_port, request=data)
             self.assertEqual(response, data)
 
+    @skipIf(not ECN_SUPPORTED, "UDP segmentation is only supported on Linux")
+    @asynctest
+    async def test_connect_and_serve_large_with_gso(self):
+        segment_counts = []
+
+        def sendmsg(sock, buffers, *args):
+            segment_counts.append(len(buffers))
+            return real_sendmsg(sock, buffers, *args)
+
+        data = b"Z" * 2097152
+        async with self.run_server() as server_port:
+            with patch("socket.socket.sendmsg", new=sendmsg):
+                response = await self.run_client(port=server_port, request=data)
+            self.assertEqual(response, data)
+
+        # runs of datagrams were sent in a single system call
+        self.assertGreater(max(segment_counts), 1)
+
+    @skipIf(not ECN_SUPPORTED, "batched reads are only supported on Linux")
+    @asynctest
+    async def test_connect_and_serve_large_with_batched_receive(self):
+        batch_sizes = []
+        real_datagrams_received = QuicConnectionProtocol.datagrams_received
+
+        def datagrams_received(protocol, datagrams):
+            batch_sizes.append(len(datagrams))
+            return real_datagrams_received(protocol, datagrams)
+
+        data = b"Z" * 2097152
+        async with self.run_server() as server_port:
+            with patch.object(
+                QuicConnectionProtocol, "datagrams_received", new=datagrams_received
+            ):
+                response = await self.run_client(port=server_port, request=data)
+            self.assertEqual(response, data)
+
+        # connections processed several datagrams before sending
+        self.assertGreater(max(batch_sizes), 1)
+
+    @skipIf(not ECN_SUPPORTED, "batched reads are only supported on Linux")
+    @asynctest
+    async def test_connect_and_serve_with_datagram_received_override(self):
+        server_datagrams = []
+        protocol_datagrams = []
+
+        class CountingServer(QuicServer):
+            def datagram_received(self, data, addr, ecn=ECN_NOT_ECT):
+                server_datagrams.append(data)
+                super().datagram_received(data, addr, ecn=ecn)
+
+        class CountingProtocol(QuicConnectionProtocol):
+            def datagram_received(self, data, addr, ecn=ECN_NOT_ECT):
+                protocol_datagrams.append(data)
+                super().datagram_received(data, addr, ecn=ecn)
+
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        _, server = await create_datagram_endpoint(
+            lambda: CountingServer(
+                configuration=configuration,
+                create_protocol=CountingProtocol,
+                stream_handler=handle_stream,
+            ),
+            local_addr=("::", 0),
+        )
+        try:
+            response = await self.run_client(
+                port=server._transport.get_extra_info("sockname")[1]
+            )
+            self.assertEqual(response, b"gnip")
+        finally:
+            server.close()
+
+        # batched datagrams went through the overridden methods
+        self.assertGreater(len(server_datagrams), 0)
+        self.assertEqual(protocol_datagrams, server_datagrams)
+
+    @skipIf(not ECN_SUPPORTED, "UDP segmentation is only supported on Linux")
+    @patch("socket.socket.sendmsg", new_callable=lambda: sendmsg_without_gso)
+    @asynctest
+    async def test_connect_and_serve_large_without_gso(self, mock_sendmsg):
+        data = b"Z" * 2097152
+        async with self.run_server() as server_port:
+            response = await self.run_client(port=server_port, request=data)
+            self.assertEqual(response, data)
+
     @asynctest
     async def test_connect_and_serve_without_client_configuration(self):
         async with self.run_server() as server_port:
@@ -199,10 +323,65 @@ class HighLevelTest(TestCase):
                 response = await reader.read()
                 self.assertEqual(response, b"5432109876543210")
 
+    @asynctest
+    async def test_connect_and_serve_drain(self):
+        async with self.run_server() as server_port:
+            configuration = QuicConfiguration(is_client=True)
+            configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+            async with connect(
+                self.server_host, server_port, configuration=configuration
+            ) as client:
+                reader, writer = await client.create_stream()
+                writer.transport.set_write_buffer_limits(high=8192, low=2048)
+
+                paused = 0
+                for i in range(64):
+                    writer.write(b"Z" * 1024)
+                    if writer.transport.get_write_buffer_size() > 8192:
+                        paused += 1
+
+                    # drain() waits for the buffer to go below the low watermark
+                    await writer.drain()
+                    self.assertLessEqual(writer.transport.get_write_buffer_size(), 8192)
+                self.assertGreater(paused, 0)
+                writer.write_eof()
+
+                response = await reader.read()
+                self.assertEqual(response, b"Z" * 65536)
+
+    @asynctest
+    async def test_connect_and_serve_drain_producer(self):
+        async with self.run_server() as server_port:
+            configuration = QuicConfiguration(is_client=True)
+            configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+            async with connect(
+                self.server_host, server_port, configuration=configuration
+            ) as client:
+                client._quic.set_write_buffer_limits(high=65536)
+
+                with tempfile.TemporaryFile() as fp:
+                    fp.write(b"Z" * 10000000)
+                    fp.flush()
+
+                    # a large file is not buffered up front
+                    _, writer = await client.create_stream()
+                    writer.write(QuicFileProducer(fp))
+                    await asyncio.wait_for(writer.drain(), timeout=1)
+
+                    # so it does not block writers on other streams
+                    reader, writer = await client.create_stream()
+                    writer.write(b"ping")
+                    await asyncio.wait_for(writer.drain(), timeout=1)
+                    writer.write_eof()
+
+                    response = await reader.read()
+                    self.assertEqual(response, b"gnip")
+
     @skipIf("loss" in SKIP_TESTS, "Skipping loss tests")
+    @patch("socket.socket.sendmsg", new_callable=lambda: sendmsg_with_loss)
     @patch("socket.socket.sendto", new_callable=lambda: sendto_with_loss)
     @asynctest
-    async def test_connect_and_serve_with_packet_loss(self, mock_sendto):
+    async def test_connect_and_serve_with_packet_loss(self, mock_sendto, mock_sendmsg):
         """
         This test ensures handshake success and stream data is successfully sent
         and received in the presence of packet loss (randomized 25% in each direction).
@@ -223,6 +402,110 @@ class HighLevelTest(TestCase):
             )
         self.assertEqual(response, data)
 
+    @patch("socket.socket.sendmsg", new_callable=lambda: sendmsg_with_loss)
+    @patch("socket.socket.sendto", new_callable=lambda: sendto_with_loss)
+    @asynctest
+    async def test_connect_and_serve_with_timer_wheel(self, mock_sendto, mock_sendmsg):
+        """
+        The server's loss recovery timers run on the timer wheel.
+        """
+        data = b"Z" * 65536
+
+        async with self.run_server(timer_wheel=True) as server_port:
+            response = await self.run_client(port=server_port, request=data)
+        self.assertEqual(response, data)
+
+    @asynctest
+    async def test_serve_passes_timer_wheel_to_protocol(self):
+        timer_wheels = []
+
+        def create_protocol(quic, **kwargs):
+            timer_wheels.append(kwargs.get("timer_wheel"))
+            return QuicConnectionProtocol(quic, **kwargs)
+
+        async with self.run_server(create_protocol=create_protocol) as server_port:
+            await self.run_client(port=server_port)
+        async with self.run_server(
+            create_protocol=create_protocol, timer_wheel=True
+        ) as server_port:
+            await self.run_client(port=server_port)
+
+        # the wheel is only passed when it is enabled
+        self.assertEqual(len(timer_wheels), 2)
+        self.assertIsNone(timer_wheels[0])
+        self.assertIsInstance(timer_wheels[1], QuicTimerWheel)
+
+    @asynctest
+    async def test_serve_close_with_timer_wheel(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        server = await serve(
+            host="::",
+            port=0,
+            configuration=configuration,
+            stream_handler=handle_stream,
+            timer_wheel=True,
+        )
+        server_port = server._transport.get_extra_info("sockname")[1]
+        client_configuration = QuicConfiguration(is_client=True)
+        client_configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+        async with connect(
+            self.server_host, server_port, configuration=client_configuration
+        ) as client:
+            await client.ping()
+            self.assertGreater(len(server._timer_wheel), 0)
+
+            # closing the server cancels the timers of its connections
+            server.close()
+            self.assertEqual(len(server._timer_wheel), 0)
+            self.assertIsNone(server._timer_wheel._handle)
+
+    @asynctest
+    async def test_connect_and_serve_with_signing_process_pool(self):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            async with self.run_server(signing_executor=executor) as server_port:
+                response = await self.run_client(port=server_port)
+                self.assertEqual(response, b"gnip")
+
+    @patch("socket.socket.sendmsg", new_callable=lambda: sendmsg_with_loss)
+    @patch("socket.socket.sendto", new_callable=lambda: sendto_with_loss)
+    @asynctest
+    async def test_connect_and_serve_with_signing_thread_pool(
+        self, mock_sendto, mock_sendmsg
+    ):
+        """
+        The handshakes resume when the signatures are ready, despite packet loss.
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            async with self.run_server(signing_executor=executor) as server_port:
+                responses = await asyncio.gather(
+                    *[self.run_client(port=server_port) for i in range(4)]
+                )
+                self.assertEqual(responses, [b"gnip"] * 4)
+
+    @patch("aioquic.asyncio.server._sign_certificate_verify")
+    @asynctest
+    async def test_connect_and_serve_with_signing_error(self, mock_sign):
+        mock_sign.side_effect = ValueError("Signing failed.")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            async with self.run_server(signing_executor=executor) as server_port:
+                with self.assertRaises(ConnectionError):
+                    await self.run_client(port=server_port)
+
+    @asynctest
+    async def test_serve_signature_received(self):
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(b"signature")
+        protocol = Mock()
+
+        # events raised by the resumed handshake are processed before sending
+        QuicServer._signature_received(Mock(), future, protocol)
+        self.assertEqual(
+            [name for name, args, kwargs in protocol.mock_calls],
+            ["_quic.handle_signature", "_process_events", "transmit"],
+        )
+
     @asynctest
     async def test_connect_and_serve_with_session_ticket(self):
         client_ticket = None
@@ -259,6 +542,35 @@ class HighLevelTest(TestCase):
             response = await self.run_client(port=server_port)
             self.assertEqual(response, b"gnip")
 
+    @asynctest
+    async def test_connect_and_serve_with_retry_and_new_token(self):
+        retry_source_connection_ids = []
+        tokens = []
+
+        def create_protocol(quic, **kwargs):
+            retry_source_connection_ids.append(quic._retry_source_connection_id)
+            return QuicConnectionProtocol(quic, **kwargs)
+
+        async with self.run_server(
+            create_protocol=create_protocol, retry=True
+        ) as server_port:
+            response = await self.run_client(
+                port=server_port, token_handler=tokens.append
+            )
+            self.assertEqual(response, b"gnip")
+            self.assertEqual(len(tokens), 1)
+
+            # the next connection presents the token and skips the retry
+            response = await self.run_client(
+                configuration=QuicConfiguration(is_client=True, token=tokens[0]),
+                port=server_port,
+            )
+            self.assertEqual(response, b"gnip")
+
+        self.assertEqual(len(retry_source_connection_ids), 2)
+        self.assertIsNotNone(retry_source_connection_ids[0])
+        self.assertIsNone(retry_source_connection_ids[1])
+
     @asynctest
     async def test_connect_and_serve_with_retry_bad_original_destination_connection_id(
         self,
@@ -388,6 +700,22 @@ class HighLevelTest(TestCase):
                 await client.ping()
                 await client.ping()
 
+    @skipIf(not ECN_SUPPORTED, "ECN is only supported on Linux")
+    @asynctest
+    async def test_ping_with_ecn(self):
+        async with self.run_server() as server_port:
+            configuration = QuicConfiguration(is_client=True)
+            configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+            async with connect(
+                self.server_host, server_port, configuration=configuration
+            ) as client:
+                await client.ping()
+                await client.ping()
+
+                # the server reported our ECT(0) marks
+                self.assertEqual(client._quic._loss.ecn_state, QuicEcnState.CAPABLE)
+                self.assertEqual(client._quic.ecn_codepoint, ECN_ECT0)
+
     @asynctest
     async def test_ping_parallel(self):
         async with self.run_server() as server_port:
@@ -399,6 +727,99 @@ class HighLevelTest(TestCase):
                 coros = [client.ping() for x in range(16)]
                 await asyncio.gather(*coros)
 
+    @skipIf(not ECN_SUPPORTED, "workers are only supported on Linux")
+    @asynctest
+    async def test_serve_workers(self):
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as sock:
+            sock.bind(("::", 0))
+            server_port = sock.getsockname()[1]
+
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        process = multiprocessing.get_context("fork").Process(
+            target=serve_workers,
+            args=("::", server_port),
+            kwargs={
+                "configuration": configuration,
+                "stream_handler": handle_stream,
+                "workers": 2,
+            },
+        )
+        process.start()
+        try:
+            for i in range(4):
+                response = await self.run_client(port=server_port)
+                self.assertEqual(response, b"gnip")
+        finally:
+            process.terminate()
+            process.join()
+        self.assertEqual(process.exitcode, 0)
+
+    def test_serve_workers_with_connection_id_generator(self):
+        configuration = QuicConfiguration(
+            is_client=False,
+            connection_id_generator=QuicLoadBalancerConnectionIdGenerator(
+                QuicLoadBalancerConfig(config_id=0, server_id_length=2, nonce_length=6),
+                b"\x00\x01",
+            ),
+        )
+        with self.assertRaises(ValueError) as cm:
+            serve_workers("::", 0, configuration=configuration, workers=2)
+        self.assertEqual(
+            str(cm.exception),
+            "Workers generate their own connection IDs, "
+            "connection_id_generator must not be set",
+        )
+
+    @skipIf(not ECN_SUPPORTED, "workers are only supported on Linux")
+    @asynctest
+    async def test_serve_workers_forward(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+
+        with tempfile.TemporaryDirectory() as socket_dir:
+            workers = []
+            server_port = 0
+            for worker_index in range(2):
+                worker = await _serve_worker(
+                    host="::",
+                    port=server_port,
+                    configuration=configuration,
+                    socket_dir=socket_dir,
+                    worker_count=2,
+                    worker_index=worker_index,
+                )
+                server_port = worker._transport.get_extra_info("sockname")[1]
+                workers.append(worker)
+
+            try:
+                client_configuration = QuicConfiguration(is_client=True)
+                client_configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+                async with connect(
+                    self.server_host, server_port, configuration=client_configuration
+                ) as client:
+                    await client.ping()
+
+                    # connection IDs carry the index of the owning worker
+                    owner, other = workers if workers[0]._protocols else workers[::-1]
+                    self.assertEqual(client._quic._peer_cid.cid[0], owner._worker_index)
+                    server_protocol = list(owner._protocols.values())[0]
+                    client_addr = server_protocol._quic._network_paths[0].addr
+
+                    # the client's packets reach the other worker, which forwards
+                    # them to the owner
+                    def sendto_many(datagrams, ecn):
+                        other.datagrams_received(
+                            [(data, client_addr, ecn) for data, addr in datagrams]
+                        )
+
+                    with patch.object(client._transport, "sendto_many", sendto_many):
+                        await asyncio.wait_for(client.ping(), timeout=1)
+                    self.assertEqual(other._protocols, {})
+            finally:
+                for worker in workers:
+                    worker.close()
+
     @asynctest
     async def test_server_receives_garbage(self):
         configuration = QuicConfiguration(is_client=False)
@@ -409,8 +830,67 @@ class HighLevelTest(TestCase):
             configuration=configuration,
         )
         server.datagram_received(binascii.unhexlify("c00000000080"), ("1.2.3.4", 1234))
+        server.datagrams_received(
+            [(binascii.unhexlify("c00000000080"), ("1.2.3.4", 1234), ECN_NOT_ECT)]
+        )
         server.close()
 
+    @skipIf(not ECN_SUPPORTED, "batched reads are only supported on Linux")
+    @asynctest
+    async def test_transport_splits_coalesced_datagrams(self):
+        class BatchProtocol(asyncio.DatagramProtocol):
+            def __init__(self):
+                self.batches = []
+                self.received = asyncio.Event()
+
+            def datagrams_received(self, datagrams):
+                self.batches.append(datagrams)
+                self.received.set()
+
+        transport, protocol = await create_datagram_endpoint(
+            BatchProtocol, local_addr=("127.0.0.1", 0)
+        )
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # send three datagrams with a single system call
+            sock.sendmsg(
+                [b"a" * 1200, b"b" * 1200, b"c" * 50],
+                [(SOL_UDP, UDP_SEGMENT, struct.pack("@H", 1200))],
+                0,
+                transport.get_extra_info("sockname"),
+            )
+            await asyncio.wait_for(protocol.received.wait(), timeout=1)
+        finally:
+            sock.close()
+            transport.close()
+
+        datagrams = [data for batch in protocol.batches for data, addr, ecn in batch]
+        self.assertEqual(datagrams, [b"a" * 1200, b"b" * 1200, b"c" * 50])
+
+    @asynctest
+    async def test_transport_plain_protocol(self):
+        class PlainProtocol(asyncio.DatagramProtocol):
+            def __init__(self):
+                self.datagrams = []
+                self.received = asyncio.Event()
+
+            def datagram_received(self, data, addr):
+                self.datagrams.append(data)
+                self.received.set()
+
+        transport, protocol = await create_datagram_endpoint(
+            PlainProtocol, local_addr=("127.0.0.1", 0)
+        )
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # protocols without a datagrams_received method get no ECN codepoint
+            sock.sendto(b"ping", transport.get_extra_info("sockname"))
+            await asyncio.wait_for(protocol.received.wait(), timeout=1)
+        finally:
+            sock.close()
+            transport.close()
+        self.assertEqual(protocol.datagrams, [b"ping"])
+
     @asynctest
     async def test_combined_key(self):
         config1 = QuicConfiguration()
@@ -419,3 +899,160 @@ class HighLevelTest(TestCase):
         config2.load_cert_chain(SERVER_COMBINEDFILE)
 
         self.assertEqual(config1.certificate, config2.certificate)
+
+
+class FakeLoop:
+    def __init__(self):
+        self.handles = []
+        self.now = 0.0
+
+    def call_at(self, when, callback):
+        handle = asyncio.TimerHandle(when, callback, (), self)
+        self.handles.append(handle)
+        return handle
+
+    def get_debug(self):
+        return False
+
+    def run_until(self, now):
+        """
+        Run the due callbacks, as the event loop would until `now`.
+        """
+        while True:
+            due = [h for h in self.handles if not h.cancelled() and h.when() <= now]
+            if not due:
+                break
+            handle = min(due, key=lambda h: h.when())
+            self.handles.remove(handle)
+            self.now = max(self.now, handle.when())
+            handle._run()
+        self.now = now
+        self.handles = [h for h in self.handles if not h.cancelled()]
+
+    def time(self):
+        return self.now
+
+    def _timer_handle_cancelled(self, handle):
+        pass
+
+
+class QuicTimerWheelTest(TestCase):
+    def setUp(self):
+        self.fired = []
+        self.loop = FakeLoop()
+        self.wheel = QuicTimerWheel(self.loop)
+
+    def call_at(self, when, label):
+        return self.wheel.call_at(when, lambda: self.fired.append((label, self.now())))
+
+    def now(self):
+        return round(self.loop.time(), 3)
+
+    def test_batches_expirations(self):
+        for i in range(100):
+            self.call_at(0.0101 + i * 0.000001, i)
+        self.assertEqual(len(self.wheel), 100)
+
+        # a single event loop timer is armed
+        self.assertEqual(len(self.loop.handles), 1)
+        self.loop.run_until(0.0105)
+        self.assertEqual(self.fired, [])
+
+        # all timers are rounded up to the same millisecond
+        self.loop.run_until(0.011)
+        self.assertEqual(sorted(self.fired), [(i, 0.011) for i in range(100)])
+        self.assertEqual(len(self.wheel), 0)
+        self.assertEqual(self.loop.handles, [])
+
+    def test_cancel(self):
+        handle = self.call_at(0.002, "a")
+        self.call_at(0.005, "b")
+        handle.cancel()
+        handle.cancel()
+        self.assertEqual(len(self.wheel), 1)
+
+        self.loop.run_until(1.0)
+        self.assertEqual(self.fired, [("b", 0.005)])
+
+    def test_cancel_from_callback(self):
+        handles = []
+        self.wheel.call_at(0.002, lambda: handles[0].cancel())
+        handles.append(self.call_at(0.002, "a"))
+        self.loop.run_until(1.0)
+
+        # the timers fire in any order, but a cancelled timer never fires
+        self.assertIn(self.fired, [[], [("a", 0.002)]])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cascade(self):
+        # timers on every level of the wheel
+        for when in [0.003, 0.070, 0.5, 5.0, 100.0, 300.0, 20000.0]:
+            self.call_at(when, when)
+        self.call_at(0.0, "now")
+
+        self.loop.run_until(30000.0)
+        self.assertEqual(
+            self.fired,
+            [
+                ("now", 0.0),
+                (0.003, 0.003),
+                (0.070, 0.070),
+                (0.5, 0.5),
+                (5.0, 5.0),
+                (100.0, 100.0),
+                (300.0, 300.0),
+                (20000.0, 20000.0),
+            ],
+        )
+
+    def test_earlier_timer_rearms(self):
+        self.call_at(1.0, "late")
+        self.call_at(0.010, "early")
+        self.assertEqual(len([h for h in self.loop.handles if not h.cancelled()]), 1)
+
+        self.loop.run_until(2.0)
+        self.assertEqual(self.fired, [("early", 0.010), ("late", 1.0)])
+
+    def test_schedule_from_callback(self):
+        def callback():
+            self.fired.append(("first", self.now()))
+            self.call_at(self.loop.time(), "again")
+            self.call_at(self.loop.time() + 0.064, "later")
+
+        self.wheel.call_at(0.010, callback)
+        self.call_at(0.020, "other")
+        self.loop.run_until(1.0)
+
+        # timers due during a tick fire on the next one
+        self.assertEqual(
+            self.fired,
+            [
+                ("first", 0.010),
+                ("again", 0.011),
+                ("other", 0.020),
+                ("later", 0.074),
+            ],
+        )
+
+    def test_late_loop(self):
+        self.call_at(0.001, "a")
+        self.call_at(0.100, "b")
+
+        # the event loop was busy
+        self.loop.run_until(0.5)
+        self.assertEqual(self.fired, [("a", 0.001), ("b", 0.1)])
+
+        # the wheel catches up when it is empty
+        self.loop.run_until(10.0)
+        self.call_at(0.0, "c")
+        self.loop.run_until(10.0)
+        self.assertEqual(self.fired[-1], ("c", 10.0))
+
+    def test_close(self):
+        handle = self.call_at(0.010, "a")
+        self.wheel.close()
+        self.assertEqual(len(self.wheel), 0)
+        self.loop.run_until(1.0)
+        self.assertEqual(self.fired, [])
+        handle.cancel()
+        self.assertEqual(len(self.wheel), 0)
@@ -85,6 +85,12 @@ class BufferTest(TestCase):
         self.assertEqual(buf.data, b"\x08\x07\x06")
         self.assertEqual(buf.tell(), 3)
 
+    def test_push_bytes_memoryview(self):
+        buf = Buffer(capacity=3)
+        buf.push_bytes(memoryview(b"\x09\x08\x07\x06")[1:])
+        self.assertEqual(buf.data, b"\x08\x07\x06")
+        self.assertEqual(buf.tell(), 3)
+
     def test_push_bytes_truncated(self):
         buf = Buffer(capacity=3)
         with self.assertRaises(BufferWriteError):
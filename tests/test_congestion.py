@@ -0,0 +1,480 @@
+import random
+from collections import deque
+from unittest import TestCase
+
+from aioquic import tls
+from aioquic.quic.congestion.base import (
+    K_HYSTART_CSS_ROUNDS,
+    K_INITIAL_WINDOW,
+    K_MAX_DATAGRAM_SIZE,
+    K_MINIMUM_WINDOW,
+    QuicCongestionControl,
+    QuicHyStart,
+    QuicRateSample,
+    create_congestion_control,
+    register_congestion_control,
+)
+from aioquic.quic.congestion.bbr import (
+    K_MIN_PIPE_CWND,
+    K_PACING_GAIN_CYCLE,
+    BbrCongestionControl,
+)
+from aioquic.quic.congestion.cubic import CubicCongestionControl
+from aioquic.quic.congestion.reno import RenoCongestionControl
+from aioquic.quic.logger import QuicLoggerTrace
+from aioquic.quic.packet import PACKET_TYPE_ONE_RTT
+from aioquic.quic.packet_builder import QuicSentPacket
+from aioquic.quic.rangeset import RangeSet
+from aioquic.quic.recovery import QuicPacketRecovery, QuicPacketSpace
+
+BANDWIDTH = 1000000
+RTT = 0.05
+
+
+def create_packet(packet_number, sent_time):
+    return QuicSentPacket(
+        epoch=tls.Epoch.ONE_RTT,
+        in_flight=True,
+        is_ack_eliciting=True,
+        is_crypto_packet=False,
+        packet_number=packet_number,
+        packet_type=PACKET_TYPE_ONE_RTT,
+        sent_bytes=K_MAX_DATAGRAM_SIZE,
+        sent_time=sent_time,
+    )
+
+
+def send_and_ack(cc, count, sent_time, now):
+    """
+    Send `count` packets, then acknowledge them.
+    """
+    packets = [create_packet(i, sent_time) for i in range(count)]
+    for packet in packets:
+        cc.on_packet_sent(packet)
+    for packet in packets:
+        cc.on_packet_acked(packet, now=now)
+
+
+class DummyCongestionControl(QuicCongestionControl):
+    def on_packet_acked(self, packet, now):
+        self.bytes_in_flight -= packet.sent_bytes
+
+    def on_packets_lost(self, packets, now):
+        for packet in packets:
+            self.bytes_in_flight -= packet.sent_bytes
+
+    def on_rtt_measurement(self, latest_rtt, now):
+        pass
+
+
+class CongestionControlRegistryTest(TestCase):
+    def test_create(self):
+        self.assertIsInstance(create_congestion_control("bbr"), BbrCongestionControl)
+        self.assertIsInstance(create_congestion_control("reno"), RenoCongestionControl)
+        self.assertIsInstance(
+            create_congestion_control("cubic"), CubicCongestionControl
+        )
+
+    def test_create_unknown(self):
+        with self.assertRaises(ValueError) as cm:
+            create_congestion_control("bogus")
+        self.assertEqual(
+            str(cm.exception), "Unknown congestion control algorithm 'bogus'"
+        )
+
+    def test_register(self):
+        register_congestion_control("dummy", DummyCongestionControl)
+        recovery = QuicPacketRecovery(
+            congestion_control_algorithm="dummy",
+            initial_rtt=0.1,
+            peer_completed_address_validation=True,
+            send_probe=lambda: None,
+        )
+        self.assertIsInstance(recovery._cc, DummyCongestionControl)
+        self.assertEqual(recovery.congestion_window, K_INITIAL_WINDOW)
+
+
+class QuicHyStartTest(TestCase):
+    def round_trip(self, hystart, rtt, now):
+        """
+        Acknowledge a round of packets with the given RTT, and return the
+        window increase.
+        """
+        increase = 0
+        for i in range(10):
+            packet = create_packet(i, sent_time=now - rtt)
+            increase += hystart.on_packet_acked(packet, now=now)
+            hystart.on_rtt_measurement(rtt)
+        return increase
+
+    def test_conservative_slow_start(self):
+        hystart = QuicHyStart()
+        now = 0.0
+        for i in range(3):
+            now += 0.05
+            self.assertEqual(self.round_trip(hystart, 0.05, now), 10 * 1280)
+        self.assertFalse(hystart.in_css)
+
+        # the RTT increases by more than 1/8th, the window grows slower
+        now += 0.06
+        self.round_trip(hystart, 0.06, now)
+        self.assertTrue(hystart.in_css)
+        for i in range(K_HYSTART_CSS_ROUNDS - 1):
+            now += 0.06
+            self.assertEqual(self.round_trip(hystart, 0.06, now), 10 * 320)
+            self.assertFalse(hystart.is_done)
+
+        # slow start ends
+        now += 0.06
+        self.round_trip(hystart, 0.06, now)
+        self.assertTrue(hystart.is_done)
+
+    def test_spurious(self):
+        hystart = QuicHyStart()
+        self.round_trip(hystart, 0.05, now=0.05)
+        self.round_trip(hystart, 0.06, now=0.11)
+        self.assertTrue(hystart.in_css)
+
+        # the RTT drops back, slow start resumes
+        self.round_trip(hystart, 0.05, now=0.16)
+        self.assertFalse(hystart.in_css)
+        self.assertEqual(self.round_trip(hystart, 0.05, now=0.21), 10 * 1280)
+
+    def test_small_increase(self):
+        hystart = QuicHyStart()
+        self.round_trip(hystart, 0.01, now=0.01)
+
+        # the threshold is at least 4ms
+        self.round_trip(hystart, 0.0135, now=0.0235)
+        self.assertFalse(hystart.in_css)
+        self.round_trip(hystart, 0.0175, now=0.041)
+        self.assertTrue(hystart.in_css)
+
+
+class RenoCongestionControlTest(TestCase):
+    def test_slow_start_and_loss(self):
+        cc = RenoCongestionControl()
+
+        # slow start, the window grows by the acknowledged bytes
+        send_and_ack(cc, 10, sent_time=0.01, now=0.1)
+        self.assertEqual(cc.bytes_in_flight, 0)
+        self.assertEqual(cc.congestion_window, 2 * K_INITIAL_WINDOW)
+
+        # loss, the window is halved
+        packet = create_packet(10, sent_time=0.1)
+        cc.on_packet_sent(packet)
+        cc.on_packets_lost([packet], now=0.2)
+        self.assertEqual(cc.bytes_in_flight, 0)
+        self.assertEqual(cc.congestion_window, K_INITIAL_WINDOW)
+        self.assertEqual(cc.ssthresh, K_INITIAL_WINDOW)
+        self.assertEqual(
+            cc.get_log_data(),
+            {"bytes_in_flight": 0, "cwnd": K_INITIAL_WINDOW, "ssthresh": 12800},
+        )
+
+        # congestion avoidance, the window grows by one datagram per window
+        send_and_ack(cc, 10, sent_time=0.3, now=0.4)
+        self.assertEqual(cc.congestion_window, K_INITIAL_WINDOW + K_MAX_DATAGRAM_SIZE)
+
+    def test_congestion_experienced(self):
+        cc = RenoCongestionControl()
+        send_and_ack(cc, 10, sent_time=0.01, now=0.1)
+
+        # a CE mark halves the window, like a loss
+        cc.on_congestion_experienced(0.1, now=0.2)
+        self.assertEqual(cc.congestion_window, K_INITIAL_WINDOW)
+        self.assertEqual(cc.ssthresh, K_INITIAL_WINDOW)
+
+        # further marks within the same recovery period are ignored
+        cc.on_congestion_experienced(0.15, now=0.25)
+        self.assertEqual(cc.congestion_window, K_INITIAL_WINDOW)
+
+
+class CubicCongestionControlTest(TestCase):
+    def test_loss(self):
+        cc = CubicCongestionControl()
+        send_and_ack(cc, 90, sent_time=0.01, now=0.1)
+        self.assertEqual(cc.congestion_window, 100 * K_MAX_DATAGRAM_SIZE)
+
+        # loss, the window is reduced by 30%
+        packet = create_packet(90, sent_time=0.1)
+        cc.on_packet_sent(packet)
+        cc.on_packets_lost([packet], now=0.2)
+        self.assertEqual(cc.congestion_window, 70 * K_MAX_DATAGRAM_SIZE)
+        self.assertEqual(cc.ssthresh, 70 * K_MAX_DATAGRAM_SIZE)
+        self.assertEqual(cc._w_max, 100 * K_MAX_DATAGRAM_SIZE)
+
+        # a loss within the same recovery period is ignored
+        packet = create_packet(91, sent_time=0.15)
+        cc.on_packet_sent(packet)
+        cc.on_packets_lost([packet], now=0.25)
+        self.assertEqual(cc.congestion_window, 70 * K_MAX_DATAGRAM_SIZE)
+
+        # fast convergence, a loss below the previous maximum lowers it further
+        packet = create_packet(92, sent_time=0.3)
+        cc.on_packet_sent(packet)
+        cc.on_packets_lost([packet], now=0.4)
+        self.assertEqual(cc.congestion_window, 62719)
+        self.assertEqual(cc._w_max, 59.5 * K_MAX_DATAGRAM_SIZE)
+
+    def test_congestion_experienced(self):
+        cc = CubicCongestionControl()
+        send_and_ack(cc, 90, sent_time=0.01, now=0.1)
+
+        # a CE mark reduces the window by 30%, like a loss
+        cc.on_congestion_experienced(0.1, now=0.2)
+        self.assertEqual(cc.congestion_window, 70 * K_MAX_DATAGRAM_SIZE)
+        self.assertEqual(cc._w_max, 100 * K_MAX_DATAGRAM_SIZE)
+
+        # further marks within the same recovery period are ignored
+        cc.on_congestion_experienced(0.15, now=0.25)
+        self.assertEqual(cc.congestion_window, 70 * K_MAX_DATAGRAM_SIZE)
+
+    def test_minimum_window(self):
+        cc = CubicCongestionControl()
+        for i in range(10):
+            packet = create_packet(i, sent_time=i + 0.5)
+            cc.on_packet_sent(packet)
+            cc.on_packets_lost([packet], now=i + 1)
+        self.assertEqual(cc.congestion_window, K_MINIMUM_WINDOW)
+
+    def test_congestion_avoidance(self):
+        cc = CubicCongestionControl()
+        cc.on_rtt_measurement(0.1, now=0.0)
+        send_and_ack(cc, 90, sent_time=0.01, now=0.1)
+        packet = create_packet(90, sent_time=0.1)
+        cc.on_packet_sent(packet)
+        cc.on_packets_lost([packet], now=0.2)
+
+        # K is the time needed to grow back to the previous maximum
+        send_and_ack(cc, 1, sent_time=0.3, now=0.4)
+        self.assertAlmostEqual(cc._k, 4.217, places=3)
+
+        # one window per RTT, the window is concave towards the previous maximum
+        windows = []
+        now = 0.4
+        while now < 10.0:
+            count = cc.congestion_window // K_MAX_DATAGRAM_SIZE
+            send_and_ack(cc, count, sent_time=now, now=now + 0.1)
+            windows.append(cc.congestion_window // K_MAX_DATAGRAM_SIZE)
+            now += 0.1
+        self.assertEqual(windows, sorted(windows))
+        self.assertEqual(windows[10], 88)
+        self.assertEqual(windows[41], 99)
+        self.assertEqual(windows[51], 100)
+
+        # then it grows faster and faster, beyond the previous maximum
+        self.assertGreater(windows[-1], 150)
+
+    def test_reno_friendly(self):
+        cc = CubicCongestionControl()
+        cc.on_rtt_measurement(0.001, now=0.0)
+        send_and_ack(cc, 90, sent_time=0.0005, now=0.001)
+        packet = create_packet(90, sent_time=0.001)
+        cc.on_packet_sent(packet)
+        cc.on_packets_lost([packet], now=0.002)
+
+        # with a very short RTT, the cubic function barely grows and the
+        # window follows the Reno-friendly estimate instead
+        now = 0.003
+        for i in range(100):
+            count = cc.congestion_window // K_MAX_DATAGRAM_SIZE
+            send_and_ack(cc, count, sent_time=now, now=now + 0.001)
+            now += 0.001
+        self.assertGreater(cc._w_est, cc._w_cubic(now - cc._t_epoch))
+        self.assertEqual(cc.congestion_window, int(cc._w_est))
+
+
+class PathTestCase(TestCase):
+    """
+    The sender is connected to a path with a bottleneck of 1 MB/s, a deep
+    buffer and a round-trip propagation time of 50ms.
+    """
+
+    congestion_control_algorithm = "reno"
+
+    def setUp(self):
+        self.acks = deque()
+        self.departure = 0.0
+        self.now = 0.0
+        self.packet_number = 0
+        self.quic_logger = QuicLoggerTrace(is_client=True, odcid=b"")
+        self.recovery = QuicPacketRecovery(
+            congestion_control_algorithm=self.congestion_control_algorithm,
+            initial_rtt=0.1,
+            peer_completed_address_validation=True,
+            quic_logger=self.quic_logger,
+            send_probe=lambda: None,
+        )
+        self.space = QuicPacketSpace()
+        self.recovery.spaces = [self.space]
+        self.cc = self.recovery._cc
+
+    def transfer(self, duration, lost=()):
+        """
+        Send as fast as the congestion window and the pacer allow, and return
+        the states visited.
+        """
+        end = self.now + duration
+        states = []
+        while self.now < end:
+            pacing_at = None
+            while (
+                self.recovery.bytes_in_flight + K_MAX_DATAGRAM_SIZE
+                <= self.recovery.congestion_window
+            ):
+                pacing_at = self.recovery._pacer.next_send_time(now=self.now)
+                if pacing_at is not None:
+                    break
+                self.recovery._pacer.update_after_send(now=self.now)
+
+                # packets are queued at the bottleneck link
+                packet = create_packet(self.packet_number, sent_time=self.now)
+                self.recovery.on_packet_sent(packet, self.space)
+                self.departure = (
+                    max(self.departure, self.now) + K_MAX_DATAGRAM_SIZE / BANDWIDTH
+                )
+                if self.packet_number not in lost:
+                    self.acks.append((self.departure + RTT, self.packet_number))
+                self.packet_number += 1
+
+            if pacing_at is not None and pacing_at < self.acks[0][0]:
+                self.now = pacing_at
+                continue
+
+            self.now, packet_number = self.acks.popleft()
+            self.recovery.on_ack_received(
+                self.space,
+                ack_rangeset=RangeSet([range(packet_number, packet_number + 1)]),
+                ack_delay=0.0,
+                now=self.now,
+            )
+            if not states or states[-1] != self.cc.congestion_state:
+                states.append(self.cc.congestion_state)
+        return states
+
+    def congestion_states(self):
+        """
+        Return the states logged in qlog.
+        """
+        return [
+            (event["data"]["old"], event["data"]["new"])
+            for event in self.quic_logger.to_dict()["events"]
+            if event["name"] == "recovery:congestion_state_updated"
+        ]
+
+
+class HyStartPathTest(PathTestCase):
+    def test_exit_slow_start(self):
+        self.transfer(duration=2.0)
+
+        # the queue at the bottleneck increases the RTT, which ends slow
+        # start before the buffer overflows
+        self.assertEqual(
+            self.congestion_states(),
+            [
+                ("slow_start", "conservative_slow_start"),
+                ("conservative_slow_start", "congestion_avoidance"),
+            ],
+        )
+        self.assertIsNotNone(self.cc.ssthresh)
+
+
+class HyStartCubicPathTest(HyStartPathTest):
+    congestion_control_algorithm = "cubic"
+
+
+class BbrCongestionControlTest(PathTestCase):
+    congestion_control_algorithm = "bbr"
+
+    def test_startup(self):
+        states = self.transfer(duration=2.0)
+        self.assertEqual(states, ["startup", "drain", "probe_bw"])
+
+        # the model matches the path
+        self.assertAlmostEqual(self.cc._btl_bw / 1000000, 1.0, places=2)
+        self.assertAlmostEqual(self.cc._rt_prop, 0.05128, places=5)
+
+        # the window is twice the bandwidth-delay product, and packets are
+        # paced at the bottleneck bandwidth
+        self.assertAlmostEqual(
+            self.cc.congestion_window / (2 * 1000000 * 0.05128 + 3 * 1280),
+            1.0,
+            places=2,
+        )
+        self.assertEqual(self.cc.pacing_rate, self.cc._pacing_gain * self.cc._btl_bw)
+        self.assertEqual(
+            self.cc.get_log_data()["pacing_rate"], int(self.cc.pacing_rate * 8)
+        )
+        self.assertEqual(self.cc.congestion_state, "probe_bw")
+
+    def test_startup_late_clock(self):
+        # the clock is not relative to the start of the connection
+        self.now = 12345.0
+        states = self.transfer(duration=2.0)
+        self.assertEqual(states, ["startup", "drain", "probe_bw"])
+        self.assertAlmostEqual(self.cc._rt_prop, 0.05128, places=5)
+
+    def test_loss(self):
+        self.transfer(duration=2.0)
+        cwnd = self.cc.congestion_window
+        btl_bw = self.cc._btl_bw
+
+        # losses enter recovery with packet conservation, but do not change
+        # the model
+        lost = range(self.packet_number, self.packet_number + 5)
+        while self.cc._recovery_start_time is None:
+            self.transfer(duration=0.001, lost=lost)
+        self.assertTrue(self.cc._packet_conservation)
+        self.assertLess(self.cc.congestion_window, cwnd)
+        self.assertAlmostEqual(self.cc._btl_bw / btl_bw, 1.0, places=2)
+
+        # recovery ends, the window is restored
+        self.transfer(duration=0.5)
+        self.assertIsNone(self.cc._recovery_start_time)
+        self.assertFalse(self.cc._packet_conservation)
+        self.assertGreaterEqual(self.cc.congestion_window, cwnd)
+
+    def test_rate_sample_short_interval(self):
+        cc = BbrCongestionControl()
+
+        # the sample is too short to measure the bandwidth, but ends a round
+        cc.on_rate_sample(
+            QuicRateSample(
+                delivered=12800,
+                interval=0.001,
+                is_app_limited=False,
+                prior_delivered=0,
+                rtt=0.05,
+                rtt_min=0.05,
+            ),
+            now=1.0,
+        )
+        self.assertEqual(cc._round_count, 1)
+        self.assertEqual(cc._btl_bw, 0.0)
+        self.assertEqual(cc._rt_prop, 0.05)
+
+    def test_probe_bw_random_phase(self):
+        # the global random generator is left untouched
+        random.seed(1)
+        state = random.getstate()
+        self.cc._enter_probe_bw(now=0.0)
+        self.assertEqual(random.getstate(), state)
+        self.assertNotEqual(K_PACING_GAIN_CYCLE[self.cc._cycle_index], 0.75)
+
+    def test_probe_rtt(self):
+        self.transfer(duration=2.0)
+        cwnd = self.cc.congestion_window
+
+        # the minimum RTT was not refreshed for 10 seconds
+        self.cc._rt_prop_stamp = self.now - 11.0
+        states = self.transfer(duration=0.01)
+        self.assertEqual(states, ["probe_rtt"])
+        self.assertEqual(
+            self.cc.congestion_window, K_MIN_PIPE_CWND * K_MAX_DATAGRAM_SIZE
+        )
+
+        # after 200ms and a round trip, probing resumes
+        states = self.transfer(duration=0.5)
+        self.assertEqual(states, ["probe_rtt", "probe_bw"])
+        self.assertGreaterEqual(self.cc.congestion_window, cwnd)
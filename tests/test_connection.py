@@ -1,6 +1,7 @@
 import binascii
 import contextlib
 import io
+import tempfile
 import time
 from typing import List, Tuple
 from unittest import TestCase, skipIf
@@ -9,6 +10,8 @@ from aioquic import tls
 from aioquic.buffer import UINT_VAR_MAX, Buffer, encode_uint_var
 from aioquic.quic import events
 from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.congestion.base import K_INITIAL_WINDOW
+from aioquic.quic.congestion.cubic import CubicCongestionControl
 from aioquic.quic.connection import (
     STREAM_COUNT_MAX,
     NetworkAddress,
@@ -17,9 +20,13 @@ from aioquic.quic.connection import (
     QuicNetworkPath,
     QuicReceiveContext,
 )
+from aioquic.quic.connection_id import QuicConnectionIdGenerator
 from aioquic.quic.crypto import CryptoPair
 from aioquic.quic.logger import QuicLogger
 from aioquic.quic.packet import (
+    ECN_CE,
+    ECN_ECT0,
+    ECN_NOT_ECT,
     PACKET_TYPE_INITIAL,
     QuicErrorCode,
     QuicFrameType,
@@ -27,10 +34,17 @@ from aioquic.quic.packet import (
     QuicTransportParameters,
     encode_quic_retry,
     encode_quic_version_negotiation,
+    pull_quic_header,
     push_quic_transport_parameters,
 )
-from aioquic.quic.packet_builder import QuicDeliveryState, QuicPacketBuilder
-from aioquic.quic.recovery import QuicPacketPacer
+from aioquic.quic.packet_builder import (
+    PACKET_MAX_SIZE,
+    QuicDeliveryState,
+    QuicPacketBuilder,
+)
+from aioquic.quic.pmtu import QuicPmtuState
+from aioquic.quic.recovery import QuicEcnState, QuicPacketPacer
+from aioquic.quic.stream import QuicFileProducer
 
 from .utils import (
     SERVER_CACERTFILE,
@@ -75,6 +89,17 @@ def consume_events(connection):
             break
 
 
+def received_stream_ids(connection):
+    stream_ids = []
+    while True:
+        event = connection.next_event()
+        if event is None:
+            break
+        elif isinstance(event, events.StreamDataReceived):
+            stream_ids.append(event.stream_id)
+    return stream_ids
+
+
 def create_standalone_client(self, **client_options):
     client = QuicConnection(
         configuration=QuicConfiguration(
@@ -187,6 +212,24 @@ def transfer(sender, receiver):
     return datagrams
 
 
+def transfer_with_ecn(sender, receiver, ecn=None):
+    """
+    Send datagrams from `sender` to `receiver` over a path which preserves the
+    ECN codepoint, or which sets it to `ecn`.
+    """
+    datagrams = 0
+    from_addr = CLIENT_ADDR if sender._is_client else SERVER_ADDR
+    for data, addr in sender.datagrams_to_send(now=time.time()):
+        datagrams += 1
+        receiver.receive_datagram(
+            data,
+            from_addr,
+            now=time.time(),
+            ecn=sender.ecn_codepoint if ecn is None else ecn,
+        )
+    return datagrams
+
+
 class QuicConnectionTest(TestCase):
     def check_handshake(self, client, server, alpn_protocol=None):
         """
@@ -265,6 +308,36 @@ class QuicConnectionTest(TestCase):
             # check handshake completed
             self.check_handshake(client=client, server=server, alpn_protocol="hq-25")
 
+    def test_connect_with_congestion_control_algorithm(self):
+        with client_and_server(
+            client_options={"congestion_control_algorithm": "cubic"},
+            server_options={"congestion_control_algorithm": "cubic"},
+        ) as (client, server):
+            self.assertIsInstance(client._loss._cc, CubicCongestionControl)
+            self.assertIsInstance(server._loss._cc, CubicCongestionControl)
+
+            # check data can be exchanged
+            consume_events(server)
+            client.send_stream_data(0, b"a" * 100000, end_stream=True)
+            received = 0
+            for i in range(10):
+                roundtrip(client, server)
+                for event in iter(server.next_event, None):
+                    if isinstance(event, events.StreamDataReceived):
+                        received += len(event.data)
+            self.assertEqual(received, 100000)
+            self.assertEqual(client.get_write_buffer_size(), 0)
+
+    def test_connect_with_congestion_control_algorithm_unknown(self):
+        configuration = QuicConfiguration(
+            congestion_control_algorithm="bogus", is_client=True
+        )
+        with self.assertRaises(ValueError) as cm:
+            QuicConnection(configuration=configuration)
+        self.assertEqual(
+            str(cm.exception), "Unknown congestion control algorithm 'bogus'"
+        )
+
     def test_connect_with_secrets_log(self):
         client_log_file = io.StringIO()
         server_log_file = io.StringIO()
@@ -810,6 +883,67 @@ class QuicConnectionTest(TestCase):
 
             self.assertEqual(received, b"hello")
 
+    def test_connect_with_certificate_cache(self):
+        client_cache = tls.CertificateCache()
+        server_cache = tls.CertificateCache()
+        for i in range(2):
+            with client_and_server(
+                client_options={"certificate_cache": client_cache},
+                server_options={"certificate_cache": server_cache},
+            ) as (client, server):
+                self.assertTrue(client._handshake_complete)
+                self.assertTrue(server._handshake_complete)
+
+        # the second connection reuses the verified chain
+        self.assertEqual((client_cache.hits, client_cache.misses), (1, 1))
+
+    def test_connect_with_key_share_pool(self):
+        pool = tls.KeySharePool(size=4)
+        pool.fill()
+        with client_and_server(
+            client_options={"key_share_pool": pool},
+            server_options={"key_share_pool": pool},
+        ) as (client, server):
+            self.assertTrue(client._handshake_complete)
+            self.assertTrue(server._handshake_complete)
+        self.assertEqual(pool.hits, len(client.tls._supported_groups) + 1)
+        self.assertEqual(pool.misses, 0)
+
+    def test_connect_with_signature_request(self):
+        requests = []
+
+        def signature_request(data, signature_algorithm):
+            requests.append((data, signature_algorithm))
+
+        with client_and_server(
+            handshake=False,
+            server_kwargs={"signature_request_handler": signature_request},
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            roundtrip(client, server)
+            self.assertEqual(len(requests), 1)
+            self.assertEqual(server.tls.state, tls.State.SERVER_EXPECT_SIGNATURE)
+
+            # the handshake waits for the signature
+            roundtrip(client, server)
+            self.assertFalse(client._handshake_complete)
+            self.assertFalse(server._handshake_complete)
+
+            data, signature_algorithm = requests[0]
+            server.handle_signature(
+                server.tls.certificate_private_key.sign(
+                    data, *tls.signature_algorithm_params(signature_algorithm)
+                )
+            )
+            for i in range(2):
+                roundtrip(server, client)
+            self.assertTrue(client._handshake_complete)
+            self.assertTrue(server._handshake_complete)
+
+            # a late signature is ignored
+            server.close()
+            server.handle_signature(b"signature")
+
     def test_connect_with_0rtt(self):
         client_ticket = None
         ticket_store = SessionTicketStore()
@@ -891,6 +1025,25 @@ class QuicConnectionTest(TestCase):
                 sequence_numbers(client._peer_cid_available), [2, 3, 4, 5, 6, 7, 8]
             )
 
+    def test_connection_id_generator(self):
+        class CountingConnectionIdGenerator(QuicConnectionIdGenerator):
+            def __init__(self):
+                self.count = 0
+
+            def generate_connection_id(self, length):
+                self.count += 1
+                return self.count.to_bytes(length, "big")
+
+        with client_and_server(
+            server_options={"connection_id_generator": CountingConnectionIdGenerator()}
+        ) as (client, server):
+            # all the connection IDs the server issued come from the generator
+            self.assertEqual(
+                [c.cid for c in server._host_cids],
+                [i.to_bytes(8, "big") for i in range(1, 9)],
+            )
+            self.assertEqual(client._peer_cid.cid, bytes.fromhex("0000000000000001"))
+
     def test_change_connection_id_retransmit_new_connection_id(self):
         with client_and_server() as (client, server):
             self.assertEqual(
@@ -1040,6 +1193,96 @@ class QuicConnectionTest(TestCase):
             for data, addr in server.datagrams_to_send(now=time.time()):
                 client.receive_datagram(data, SERVER_ADDR, now=time.time())
 
+    def test_ecn(self):
+        with client_and_server(handshake=False) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            for i in range(3):
+                transfer_with_ecn(client, server)
+                transfer_with_ecn(server, client)
+
+            # both peers report the marks they received
+            self.assertEqual(client._loss.ecn_state, QuicEcnState.CAPABLE)
+            self.assertEqual(client.ecn_codepoint, ECN_ECT0)
+            self.assertEqual(server._loss.ecn_state, QuicEcnState.CAPABLE)
+            self.assertEqual(server.ecn_codepoint, ECN_ECT0)
+
+            # the path marks a PING Congestion Experienced
+            client.send_ping(uid=12345)
+            self.assertEqual(transfer_with_ecn(client, server, ecn=ECN_CE), 1)
+            self.assertEqual(server._spaces[tls.Epoch.ONE_RTT].ecn_counts.ce, 1)
+
+            # the client reduces its congestion window
+            congestion_window = client._loss.congestion_window
+            self.assertEqual(transfer_with_ecn(server, client), 1)
+            self.assertLess(client._loss.congestion_window, congestion_window)
+            self.assertEqual(client._loss.ecn_state, QuicEcnState.CAPABLE)
+
+    def test_ecn_not_supported(self):
+        with client_and_server() as (client, server):
+            # the path clears our marks
+            self.assertEqual(client._loss.ecn_state, QuicEcnState.FAILED)
+            self.assertEqual(client.ecn_codepoint, ECN_NOT_ECT)
+            self.assertEqual(server._loss.ecn_state, QuicEcnState.FAILED)
+            self.assertEqual(server.ecn_codepoint, ECN_NOT_ECT)
+
+    def test_pmtu_discovery(self):
+        with client_and_server(
+            client_options={"max_datagram_size": 1500},
+            server_options={"max_datagram_size": 1500},
+            handshake=False,
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            self.assertEqual(roundtrip(client, server), (1, 2))
+            self.assertEqual(client._loss.pmtu.state, QuicPmtuState.DISABLED)
+
+            # once the handshake is confirmed, each peer probes the largest
+            # allowed size
+            self.assertEqual(roundtrip(client, server), (1, 2))
+            self.assertEqual(roundtrip(client, server), (2, 1))
+            self.assertEqual(client._loss.max_datagram_size, 1500)
+            self.assertEqual(client._loss.pmtu.state, QuicPmtuState.SEARCH_COMPLETE)
+            self.assertEqual(server._loss.max_datagram_size, 1500)
+            self.assertEqual(server._loss.pmtu.state, QuicPmtuState.SEARCH_COMPLETE)
+
+            # larger datagrams are sent
+            client.send_stream_data(0, bytes(10000), end_stream=True)
+            sizes = [len(data) for data, addr in client.datagrams_to_send(now=0)]
+            self.assertEqual(max(sizes), 1500)
+
+    def test_pmtu_discovery_with_limited_path(self):
+        def transfer_limited(sender, receiver):
+            from_addr = CLIENT_ADDR if sender._is_client else SERVER_ADDR
+            for data, addr in sender.datagrams_to_send(now=time.time()):
+                if len(data) <= 1400:
+                    receiver.receive_datagram(data, from_addr, now=time.time())
+
+        with client_and_server(
+            client_options={"max_datagram_size": 1500}, handshake=False
+        ) as (client, server):
+            # the path drops datagrams larger than 1400 bytes
+            client.connect(SERVER_ADDR, now=time.time())
+            for i in range(50):
+                client.send_ping(uid=i)
+                transfer_limited(client, server)
+                transfer_limited(server, client)
+
+            self.assertEqual(client._loss.pmtu.state, QuicPmtuState.SEARCH_COMPLETE)
+            self.assertGreater(client._loss.max_datagram_size, 1380)
+            self.assertLessEqual(client._loss.max_datagram_size, 1400)
+
+            # lost probes do not shrink the congestion window
+            self.assertGreaterEqual(client._loss.congestion_window, K_INITIAL_WINDOW)
+
+    def test_pmtu_discovery_not_enabled(self):
+        with client_and_server(
+            server_options={"max_datagram_size": 1500},
+        ) as (client, server):
+            self.assertEqual(client._loss.max_datagram_size, PACKET_MAX_SIZE)
+            self.assertEqual(client._loss.pmtu.state, QuicPmtuState.DISABLED)
+
+            # the server searches on its own
+            self.assertEqual(server._loss.max_datagram_size, 1500)
+
     def test_tls_error(self):
         def patch(client):
             """
@@ -1613,6 +1856,19 @@ class QuicConnectionTest(TestCase):
                 Buffer(data=binascii.unhexlify("080102030405060708")),
             )
 
+    def test_handle_new_token_frame_with_handler(self):
+        tokens = []
+        with client_and_server(client_kwargs={"token_handler": tokens.append}) as (
+            client,
+            server,
+        ):
+            client._handle_new_token_frame(
+                client_receive_context(client),
+                QuicFrameType.NEW_TOKEN,
+                Buffer(data=binascii.unhexlify("080102030405060708")),
+            )
+            self.assertEqual(tokens, [binascii.unhexlify("0102030405060708")])
+
     def test_handle_new_token_frame_from_client(self):
         with client_and_server() as (client, server):
             # server receives NEW_TOKEN
@@ -1628,6 +1884,37 @@ class QuicConnectionTest(TestCase):
                 cm.exception.reason_phrase, "Clients must not send NEW_TOKEN frames"
             )
 
+    def test_new_token(self):
+        tokens = []
+        with client_and_server(
+            client_kwargs={"token_handler": tokens.append},
+            server_kwargs={
+                "token_issuer": lambda addr: b"token for " + addr[0].encode()
+            },
+        ) as (client, server):
+            # the server sends NEW_TOKEN once the handshake completes
+            self.assertEqual(tokens, [b"token for 1.2.3.4"])
+
+            # NEW_TOKEN is lost and sent again
+            server._on_new_token_delivery(QuicDeliveryState.LOST, b"token for 1.2.3.4")
+            roundtrip(server, client)
+            self.assertEqual(tokens, [b"token for 1.2.3.4"] * 2)
+
+            # NEW_TOKEN is acknowledged
+            server._on_new_token_delivery(QuicDeliveryState.ACKED, b"token for 1.2.3.4")
+            self.assertIsNone(server._new_token_pending)
+
+    def test_new_token_sent_in_initial(self):
+        with client_and_server(
+            client_options={"token": b"some-token"},
+            handshake=False,
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            datagrams = client.datagrams_to_send(now=time.time())
+            header = pull_quic_header(Buffer(data=datagrams[0][0]), host_cid_length=8)
+            self.assertEqual(header.packet_type, PACKET_TYPE_INITIAL)
+            self.assertEqual(header.token, b"some-token")
+
     def test_handle_path_challenge_frame(self):
         with client_and_server() as (client, server):
             # client changes address and sends some data
@@ -2623,6 +2910,239 @@ class QuicConnectionTest(TestCase):
                 str(cm.exception), "Cannot send data on unknown peer-initiated stream"
             )
 
+    def test_send_stream_data_idle_streams(self):
+        with client_and_server() as (client, server):
+            # client opens many streams, then sends data on a single one
+            for stream_id in range(0, 400, 4):
+                client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            self.assertEqual(len(client._streams), 100)
+            self.assertEqual(len(client._streams_scheduler), 0)
+            self.assertEqual(client._streams_pending, {})
+
+            client.send_stream_data(200, b"world")
+            self.assertEqual(list(client._streams_scheduler), [client._streams[200]])
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            self.assertEqual(len(client._streams_scheduler), 0)
+
+    def test_send_stream_data_retransmit(self):
+        with client_and_server() as (client, server):
+            consume_events(server)
+
+            # STREAM frame is sent and lost
+            client.send_stream_data(0, b"hello")
+            self.assertEqual(drop(client), 1)
+            stream = client._streams[0]
+            self.assertEqual(len(client._streams_scheduler), 0)
+            client._on_stream_data_delivery(QuicDeliveryState.LOST, stream, 0, 5)
+            self.assertEqual(list(client._streams_scheduler), [stream])
+
+            # STREAM frame is retransmitted and acked
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            self.assertEqual(len(client._streams_scheduler), 0)
+            self.assertEqual(received_stream_ids(server), [0])
+
+    def test_send_stream_data_discard_finished(self):
+        with client_and_server() as (client, server):
+            # client sends a request, server sends a response
+            client.send_stream_data(0, b"hello", end_stream=True)
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            server.send_stream_data(0, b"world", end_stream=True)
+            self.assertEqual(roundtrip(server, client), (1, 1))
+
+            # streams are discarded once they are finished
+            self.assertEqual(roundtrip(client, server), (0, 0))
+            self.assertEqual(client._streams, {})
+            self.assertEqual(client._streams_pending, {})
+            self.assertEqual(client._streams_finished, {0})
+            self.assertEqual(server._streams, {})
+            self.assertEqual(server._streams_pending, {})
+            self.assertEqual(server._streams_finished, {0})
+
+    def test_set_stream_priority(self):
+        with client_and_server() as (client, server):
+            consume_events(server)
+
+            # client sends a large body, then a small urgent one
+            client.send_stream_data(0, b"a" * 8000, end_stream=True)
+            client.send_stream_data(4, b"b" * 2000, end_stream=True)
+            client.set_stream_priority(4, urgency=0)
+            transfer(client, server)
+
+            # the urgent stream is served first
+            received = received_stream_ids(server)
+            self.assertEqual(received[0], 4)
+            self.assertEqual(received.index(0), received.count(4))
+
+    def test_set_stream_priority_incremental(self):
+        with client_and_server(client_options={"incremental_stream_quantum": 1000}) as (
+            client,
+            server,
+        ):
+            consume_events(server)
+
+            # client sends two incremental bodies
+            client.send_stream_data(0, b"a" * 4000, end_stream=True)
+            client.send_stream_data(4, b"b" * 4000, end_stream=True)
+            client.set_stream_priority(0, incremental=True)
+            client.set_stream_priority(4, incremental=True)
+            transfer(client, server)
+
+            # the streams are interleaved
+            received = received_stream_ids(server)
+            self.assertEqual(received[:4], [0, 4, 0, 4])
+
+    def test_set_stream_priority_sequential(self):
+        with client_and_server() as (client, server):
+            consume_events(server)
+
+            # client sends two bodies with the same urgency
+            client.send_stream_data(4, b"b" * 4000, end_stream=True)
+            client.send_stream_data(0, b"a" * 4000, end_stream=True)
+            transfer(client, server)
+
+            # the streams are served in stream ID order
+            received = received_stream_ids(server)
+            self.assertEqual(received, sorted(received))
+
+    def test_set_stream_priority_invalid(self):
+        with client_and_server() as (client, server):
+            with self.assertRaises(ValueError) as cm:
+                client.set_stream_priority(0, urgency=8)
+            self.assertEqual(str(cm.exception), "Urgency must be between 0 and 7")
+
+    def test_set_write_buffer_limits(self):
+        with client_and_server() as (client, server):
+            consume_events(client)
+            client.set_write_buffer_limits(high=4000, low=1000, stream_id=0)
+
+            # the stream stays writable up to the high watermark
+            client.send_stream_data(0, b"a" * 4000)
+            self.assertTrue(client.is_stream_writable(0))
+            client.send_stream_data(0, b"b" * 4000)
+            self.assertFalse(client.is_stream_writable(0))
+            self.assertEqual(client.get_write_buffer_size(0), 8000)
+            self.assertEqual(client.get_write_buffer_size(), 8000)
+
+            # once the data is acknowledged, the stream becomes writable
+            roundtrip(client, server)
+            self.assertTrue(client.is_stream_writable(0))
+            self.assertEqual(client.get_write_buffer_size(0), 0)
+            self.assertEqual(client.get_write_buffer_size(), 0)
+            self.assertEqual(
+                [e for e in iter(client.next_event, None)],
+                [events.StreamWritable(stream_id=0)],
+            )
+
+    def test_set_write_buffer_limits_connection(self):
+        with client_and_server() as (client, server):
+            consume_events(client)
+            client.set_write_buffer_limits(high=4000, low=1000)
+
+            # the connection-wide limit applies to all streams
+            client.send_stream_data(0, b"a" * 3000)
+            self.assertTrue(client.is_stream_writable(0))
+            client.send_stream_data(4, b"b" * 3000)
+            self.assertTrue(client.is_stream_writable(0))
+            self.assertFalse(client.is_stream_writable(4))
+            self.assertEqual(client.get_write_buffer_size(), 6000)
+
+            roundtrip(client, server)
+            self.assertTrue(client.is_stream_writable(4))
+            self.assertEqual(client.get_write_buffer_size(), 0)
+            self.assertEqual(
+                [e for e in iter(client.next_event, None)],
+                [events.StreamWritable(stream_id=4)],
+            )
+
+    def test_set_write_buffer_limits_connection_and_stream(self):
+        with client_and_server() as (client, server):
+            consume_events(client)
+            client.set_write_buffer_limits(high=10000, low=2000)
+            client.set_write_buffer_limits(high=4000, low=1000, stream_id=0)
+
+            # the stream is paused by its own limit
+            client.send_stream_data(0, b"a" * 5000)
+            self.assertFalse(client.is_stream_writable(0))
+            transfer(client, server)
+
+            # another stream keeps the connection above its low watermark
+            client.send_stream_data(4, b"b" * 5000)
+            self.assertTrue(client.is_stream_writable(4))
+
+            # the stream resumes once its own data is acknowledged
+            transfer(server, client)
+            self.assertEqual(client.get_write_buffer_size(0), 0)
+            self.assertEqual(client.get_write_buffer_size(), 5000)
+            self.assertTrue(client.is_stream_writable(0))
+            self.assertEqual(
+                [e for e in iter(client.next_event, None)],
+                [events.StreamWritable(stream_id=0)],
+            )
+
+    def test_set_write_buffer_limits_producer(self):
+        with client_and_server() as (client, server):
+            consume_events(client)
+            client.set_write_buffer_limits(high=64000, low=16000)
+
+            with tempfile.TemporaryFile() as fp:
+                fp.write(b"a" * 1000000)
+                fp.flush()
+
+                # the producer's data is not buffered until it is sent
+                client.send_stream_data(0, QuicFileProducer(fp), end_stream=True)
+                self.assertEqual(client.get_write_buffer_size(), 0)
+                self.assertTrue(client.is_stream_writable(0))
+
+                # other streams stay writable
+                client.send_stream_data(4, b"b" * 1000)
+                self.assertTrue(client.is_stream_writable(4))
+
+                # data sent from the producer is buffered until it is acknowledged
+                transfer(client, server)
+                self.assertGreater(client.get_write_buffer_size(0), 0)
+                self.assertLessEqual(client.get_write_buffer_size(0), 64000)
+                self.assertTrue(client.is_stream_writable(4))
+
+                for i in range(100):
+                    if client._streams[0].sender.is_finished:
+                        break
+                    roundtrip(client, server)
+                self.assertTrue(client._streams[0].sender.is_finished)
+                self.assertEqual(client.get_write_buffer_size(0), 0)
+
+    def test_set_write_buffer_limits_reset(self):
+        with client_and_server() as (client, server):
+            consume_events(client)
+            client.set_write_buffer_limits(high=4000, stream_id=0)
+            client.send_stream_data(0, b"a" * 8000)
+            self.assertFalse(client.is_stream_writable(0))
+
+            # resetting the stream drops the buffered data
+            client.reset_stream(0, QuicErrorCode.NO_ERROR)
+            self.assertTrue(client.is_stream_writable(0))
+            self.assertEqual(client.get_write_buffer_size(), 0)
+            self.assertEqual(
+                [e for e in iter(client.next_event, None)],
+                [events.StreamWritable(stream_id=0)],
+            )
+
+    def test_set_write_buffer_limits_invalid(self):
+        with client_and_server() as (client, server):
+            with self.assertRaises(ValueError) as cm:
+                client.set_write_buffer_limits(high=1000, low=2000)
+            self.assertEqual(
+                str(cm.exception),
+                "High watermark (1000) must be >= low watermark (2000) >= 0",
+            )
+
+            with self.assertRaises(ValueError) as cm:
+                client.set_write_buffer_limits(stream_id=3)
+            self.assertEqual(
+                str(cm.exception),
+                "Cannot send data on peer-initiated unidirectional stream",
+            )
+
     def test_stream_direction(self):
         with client_and_server() as (client, server):
             for off in [0, 4, 8]:
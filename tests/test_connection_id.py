@@ -0,0 +1,157 @@
+import time
+from unittest import TestCase
+
+from aioquic.buffer import Buffer
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.connection import QuicConnection
+from aioquic.quic.connection_id import (
+    QuicConnectionIdGenerator,
+    QuicLoadBalancerConfig,
+    QuicLoadBalancerConnectionIdGenerator,
+    decode_server_id,
+)
+from aioquic.quic.packet import pull_quic_header
+
+from .utils import SERVER_CACERTFILE, SERVER_CERTFILE, SERVER_KEYFILE
+
+CLIENT_ADDR = ("1.2.3.4", 1234)
+SERVER_ADDR = ("2.3.4.5", 4433)
+
+PLAINTEXT_CONFIG = QuicLoadBalancerConfig(
+    config_id=1, server_id_length=3, nonce_length=4
+)
+STREAM_CIPHER_CONFIG = QuicLoadBalancerConfig(
+    config_id=2, server_id_length=3, nonce_length=8, key=bytes(range(16))
+)
+
+
+class QuicConnectionIdGeneratorTest(TestCase):
+    def test_random(self):
+        generator = QuicConnectionIdGenerator()
+        cid = generator.generate_connection_id(8)
+        self.assertEqual(len(cid), 8)
+        self.assertNotEqual(generator.generate_connection_id(8), cid)
+
+
+class QuicLoadBalancerTest(TestCase):
+    def test_config_invalid(self):
+        with self.assertRaises(ValueError) as cm:
+            QuicLoadBalancerConfig(config_id=7, server_id_length=3, nonce_length=4)
+        self.assertEqual(str(cm.exception), "config_id must be between 0 and 6")
+
+        with self.assertRaises(ValueError) as cm:
+            QuicLoadBalancerConfig(config_id=0, server_id_length=12, nonce_length=8)
+        self.assertEqual(str(cm.exception), "connection IDs must be at most 20 bytes")
+
+        with self.assertRaises(ValueError) as cm:
+            QuicLoadBalancerConfig(
+                config_id=0, server_id_length=3, nonce_length=4, key=bytes(16)
+            )
+        self.assertEqual(
+            str(cm.exception), "nonce_length must be between 8 and 16 with a key"
+        )
+
+        with self.assertRaises(ValueError) as cm:
+            QuicLoadBalancerConnectionIdGenerator(PLAINTEXT_CONFIG, b"\x01\x02")
+        self.assertEqual(str(cm.exception), "server_id must be 3 bytes")
+
+    def test_plaintext(self):
+        generator = QuicLoadBalancerConnectionIdGenerator(
+            PLAINTEXT_CONFIG, b"\x01\x02\x03"
+        )
+        cid = generator.generate_connection_id(8)
+        self.assertEqual(len(cid), 8)
+
+        # config rotation bits, length self-encoding, then the server ID
+        self.assertEqual(cid[0], 0x27)
+        self.assertEqual(cid[1:4], b"\x01\x02\x03")
+        self.assertEqual(decode_server_id(cid, [PLAINTEXT_CONFIG]), b"\x01\x02\x03")
+
+        # the config rotation bits select the configuration
+        self.assertIsNone(decode_server_id(cid, [STREAM_CIPHER_CONFIG]))
+        self.assertIsNone(decode_server_id(b"", [PLAINTEXT_CONFIG]))
+
+    def test_stream_cipher(self):
+        generator = QuicLoadBalancerConnectionIdGenerator(
+            STREAM_CIPHER_CONFIG, b"\x01\x02\x03"
+        )
+        cids = [generator.generate_connection_id(12) for i in range(8)]
+        for cid in cids:
+            self.assertEqual(len(cid), 12)
+            self.assertEqual(cid[0], 0x4B)
+            self.assertEqual(
+                decode_server_id(cid, [PLAINTEXT_CONFIG, STREAM_CIPHER_CONFIG]),
+                b"\x01\x02\x03",
+            )
+
+        # the server ID is not visible
+        self.assertEqual(len(set(cid[1:4] for cid in cids)), 8)
+
+        # a different key decodes a different server ID
+        other_config = QuicLoadBalancerConfig(
+            config_id=2, server_id_length=3, nonce_length=8, key=bytes(16)
+        )
+        self.assertNotEqual(decode_server_id(cids[0], [other_config]), b"\x01\x02\x03")
+
+    def test_load_balancer(self):
+        """
+        A stand-in load balancer routes the client's packets by connection ID.
+        """
+        config = STREAM_CIPHER_CONFIG
+        server_ids = [b"\x00\x00\x01", b"\x00\x00\x02"]
+
+        client_configuration = QuicConfiguration(is_client=True)
+        client_configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+        client = QuicConnection(configuration=client_configuration)
+
+        servers = {}
+        for server_id in server_ids:
+            server_configuration = QuicConfiguration(
+                connection_id_generator=QuicLoadBalancerConnectionIdGenerator(
+                    config, server_id
+                ),
+                connection_id_length=config.connection_id_length,
+                is_client=False,
+            )
+            server_configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+            servers[server_id] = QuicConnection(
+                configuration=server_configuration,
+                original_destination_connection_id=(
+                    client.original_destination_connection_id
+                ),
+            )
+
+        routed = []
+
+        def route(data):
+            header = pull_quic_header(
+                Buffer(data=data), host_cid_length=config.connection_id_length
+            )
+            server_id = decode_server_id(header.destination_cid, [config])
+            if server_id not in servers:
+                # the client picked the connection ID, fall back to hashing
+                server_id = server_ids[header.destination_cid[-1] % 2]
+            routed.append(server_id)
+            return servers[server_id]
+
+        def roundtrip():
+            now = time.time()
+            for data, addr in client.datagrams_to_send(now=now):
+                server = route(data)
+                server.receive_datagram(data, CLIENT_ADDR, now=now)
+                for data, addr in server.datagrams_to_send(now=now):
+                    client.receive_datagram(data, SERVER_ADDR, now=now)
+
+        client.connect(SERVER_ADDR, now=time.time())
+        for i in range(3):
+            roundtrip()
+        self.assertTrue(client._handshake_confirmed)
+
+        # all packets went to the same server, even after the client changes
+        # connection ID
+        client.change_connection_id()
+        client.send_ping(uid=1)
+        roundtrip()
+        server_id = routed[0]
+        self.assertEqual(routed, [server_id] * len(routed))
+        self.assertEqual(decode_server_id(client._peer_cid.cid, [config]), server_id)
@@ -16,6 +16,7 @@ from aioquic.h3.connection import (
     StreamType,
     encode_frame,
     encode_settings,
+    parse_priority,
     parse_settings,
     validate_push_promise_headers,
     validate_request_headers,
@@ -25,8 +26,10 @@ from aioquic.h3.connection import (
 from aioquic.h3.events import DataReceived, HeadersReceived, PushPromiseReceived
 from aioquic.h3.exceptions import NoAvailablePushIDError
 from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.connection import Limit
 from aioquic.quic.events import StreamDataReceived
 from aioquic.quic.logger import QuicLogger
+from aioquic.quic.stream import QuicBufferProducer, QuicCallbackProducer
 
 from .test_connection import client_and_server, transfer
 
@@ -93,7 +96,11 @@ class FakeQuicConnection:
         self._quic_logger = QuicLogger().start_trace(
             is_client=configuration.is_client, odcid=b""
         )
+        self._local_max_streams_bidi = Limit(
+            frame_type=0x12, name="max_streams_bidi", value=128
+        )
         self._remote_max_datagram_frame_size = None
+        self.stream_priorities = {}
 
     def close(self, error_code, reason_phrase):
         self.closed = (error_code, reason_phrase)
@@ -113,6 +120,9 @@ class FakeQuicConnection:
         except IndexError:
             return None
 
+    def set_stream_priority(self, stream_id, urgency=3, incremental=False):
+        self.stream_priorities[stream_id] = (urgency, incremental)
+
     def send_stream_data(self, stream_id, data, end_stream=False):
         # chop up data into individual bytes
         for c in data:
@@ -298,6 +308,151 @@ class H3ConnectionTest(TestCase):
             (ErrorCode.H3_FRAME_UNEXPECTED, "Servers must not send MAX_PUSH_ID"),
         )
 
+    def test_handle_control_frame_priority_update_from_server(self):
+        """
+        A client should not receive PRIORITY_UPDATE on the control stream.
+        """
+        quic_client = FakeQuicConnection(
+            configuration=QuicConfiguration(is_client=True)
+        )
+        h3_client = H3Connection(quic_client)
+
+        # receive SETTINGS
+        h3_client.handle_event(
+            StreamDataReceived(
+                stream_id=3,
+                data=encode_uint_var(StreamType.CONTROL)
+                + encode_frame(FrameType.SETTINGS, encode_settings(DUMMY_SETTINGS)),
+                end_stream=False,
+            )
+        )
+        self.assertIsNone(quic_client.closed)
+
+        # receive unexpected PRIORITY_UPDATE
+        h3_client.handle_event(
+            StreamDataReceived(
+                stream_id=3,
+                data=encode_frame(
+                    FrameType.PRIORITY_UPDATE, encode_uint_var(0) + b"u=1"
+                ),
+                end_stream=False,
+            )
+        )
+        self.assertEqual(
+            quic_client.closed,
+            (ErrorCode.H3_FRAME_UNEXPECTED, "Servers must not send PRIORITY_UPDATE"),
+        )
+
+    def test_handle_control_frame_priority_update_invalid_id(self):
+        """
+        A PRIORITY_UPDATE must reference a client-initiated bidirectional stream.
+        """
+        quic_server = FakeQuicConnection(
+            configuration=QuicConfiguration(is_client=False)
+        )
+        h3_server = H3Connection(quic_server)
+
+        # receive SETTINGS
+        h3_server.handle_event(
+            StreamDataReceived(
+                stream_id=2,
+                data=encode_uint_var(StreamType.CONTROL)
+                + encode_frame(FrameType.SETTINGS, encode_settings(DUMMY_SETTINGS)),
+                end_stream=False,
+            )
+        )
+        self.assertIsNone(quic_server.closed)
+
+        # receive PRIORITY_UPDATE for a unidirectional stream
+        h3_server.handle_event(
+            StreamDataReceived(
+                stream_id=2,
+                data=encode_frame(
+                    FrameType.PRIORITY_UPDATE, encode_uint_var(6) + b"u=1"
+                ),
+                end_stream=False,
+            )
+        )
+        self.assertEqual(
+            quic_server.closed,
+            (
+                ErrorCode.H3_ID_ERROR,
+                "PRIORITY_UPDATE must reference a request stream",
+            ),
+        )
+
+    def test_handle_control_frame_priority_update_above_limit(self):
+        """
+        A PRIORITY_UPDATE must not reference a stream the client cannot open.
+        """
+        quic_server = FakeQuicConnection(
+            configuration=QuicConfiguration(is_client=False)
+        )
+        h3_server = H3Connection(quic_server)
+
+        # receive SETTINGS
+        h3_server.handle_event(
+            StreamDataReceived(
+                stream_id=2,
+                data=encode_uint_var(StreamType.CONTROL)
+                + encode_frame(FrameType.SETTINGS, encode_settings(DUMMY_SETTINGS)),
+                end_stream=False,
+            )
+        )
+
+        # the last stream the client may open
+        h3_server.handle_event(
+            StreamDataReceived(
+                stream_id=2,
+                data=encode_frame(
+                    FrameType.PRIORITY_UPDATE, encode_uint_var(127 * 4) + b"u=1"
+                ),
+                end_stream=False,
+            )
+        )
+        self.assertIsNone(quic_server.closed)
+
+        # receive PRIORITY_UPDATE for a stream above the limit
+        h3_server.handle_event(
+            StreamDataReceived(
+                stream_id=2,
+                data=encode_frame(
+                    FrameType.PRIORITY_UPDATE, encode_uint_var(128 * 4) + b"u=1"
+                ),
+                end_stream=False,
+            )
+        )
+        self.assertEqual(
+            quic_server.closed,
+            (
+                ErrorCode.H3_ID_ERROR,
+                "PRIORITY_UPDATE references a stream above the limit",
+            ),
+        )
+
+    def test_handle_control_frame_priority_update_push(self):
+        """
+        PRIORITY_UPDATE frames for push streams are ignored.
+        """
+        quic_server = FakeQuicConnection(
+            configuration=QuicConfiguration(is_client=False)
+        )
+        h3_server = H3Connection(quic_server)
+
+        h3_server.handle_event(
+            StreamDataReceived(
+                stream_id=2,
+                data=encode_uint_var(StreamType.CONTROL)
+                + encode_frame(FrameType.SETTINGS, encode_settings(DUMMY_SETTINGS))
+                + encode_frame(
+                    FrameType.PRIORITY_UPDATE_PUSH, encode_uint_var(0) + b"u=1"
+                ),
+                end_stream=False,
+            )
+        )
+        self.assertIsNone(quic_server.closed)
+        self.assertNotIn(0, quic_server.stream_priorities)
+
     def test_handle_control_settings_twice(self):
         """
         We should not receive HEADERS on the control stream.
@@ -655,6 +810,55 @@ class H3ConnectionTest(TestCase):
             # make third request -> dynamic table
             self._make_request(h3_client, h3_server)
 
+    def test_request_with_producer(self):
+        with h3_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            # send request
+            stream_id = quic_client.get_next_available_stream_id()
+            h3_client.send_headers(
+                stream_id=stream_id,
+                headers=[
+                    (b":method", b"POST"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                ],
+            )
+            h3_client.send_data(
+                stream_id=stream_id,
+                data=QuicBufferProducer(b"A" * 5000),
+                end_stream=False,
+            )
+            chunks = [b"B" * 3000, b"C" * 3000]
+
+            def read(size):
+                if not chunks:
+                    return b""
+                data = chunks[0][:size]
+                chunks[0] = chunks[0][size:]
+                if not chunks[0]:
+                    chunks.pop(0)
+                return data
+
+            h3_client.send_data(
+                stream_id=stream_id,
+                data=QuicCallbackProducer(read),
+                end_stream=True,
+            )
+
+            # receive request
+            events = h3_transfer(quic_client, h3_server)
+            self.assertIsInstance(events[0], HeadersReceived)
+            body = b""
+            for event in events[1:]:
+                self.assertIsInstance(event, DataReceived)
+                body += event.data
+            self.assertTrue(events[-1].stream_ended)
+            self.assertEqual(body, b"A" * 5000 + b"B" * 3000 + b"C" * 3000)
+            self.assertEqual(chunks, [])
+
     def test_request_headers_only(self):
         with h3_client_and_server() as (quic_client, quic_server):
             h3_client = H3Connection(quic_client)
@@ -1076,6 +1280,92 @@ class H3ConnectionTest(TestCase):
                     ],
                 )
 
+    def _make_prioritized_request(self, h3_client, headers=None):
+        stream_id = h3_client._quic.get_next_available_stream_id()
+        h3_client.send_headers(
+            stream_id=stream_id,
+            headers=[
+                (b":method", b"GET"),
+                (b":scheme", b"https"),
+                (b":authority", b"localhost"),
+                (b":path", b"/"),
+            ]
+            + (headers or []),
+            end_stream=True,
+        )
+        return stream_id
+
+    def test_request_priority_default(self):
+        with h3_fake_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            stream_id = self._make_prioritized_request(h3_client)
+            h3_transfer(quic_client, h3_server)
+            self.assertNotIn(stream_id, quic_server.stream_priorities)
+
+    def test_request_priority_header(self):
+        with h3_fake_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            stream_id = self._make_prioritized_request(
+                h3_client, headers=[(b"priority", b"u=5, i")]
+            )
+            events = h3_transfer(quic_client, h3_server)
+            self.assertIsInstance(events[0], HeadersReceived)
+            self.assertEqual(quic_server.stream_priorities[stream_id], (5, True))
+
+            # the event is logged
+            self.assertIn(
+                {
+                    "new": "u=5, i",
+                    "stream_id": stream_id,
+                    "trigger": "header",
+                },
+                [
+                    event["data"]
+                    for event in quic_server._quic_logger._events
+                    if event["name"] == "http:priority_updated"
+                ],
+            )
+
+    def test_request_priority_update(self):
+        with h3_fake_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            stream_id = self._make_prioritized_request(
+                h3_client, headers=[(b"priority", b"u=5")]
+            )
+            h3_transfer(quic_client, h3_server)
+            self.assertEqual(quic_server.stream_priorities[stream_id], (5, False))
+
+            # reprioritize the request
+            h3_client.send_priority_frame(stream_id, urgency=1, incremental=True)
+            h3_transfer(quic_client, h3_server)
+            self.assertIsNone(quic_server.closed)
+            self.assertEqual(quic_server.stream_priorities[stream_id], (1, True))
+
+    def test_request_priority_update_before_request(self):
+        with h3_fake_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            # the PRIORITY_UPDATE arrives before the request
+            h3_client.send_priority_frame(0, urgency=1)
+            h3_transfer(quic_client, h3_server)
+            self.assertNotIn(0, quic_server.stream_priorities)
+
+            # the frame takes precedence over the header
+            stream_id = self._make_prioritized_request(
+                h3_client, headers=[(b"priority", b"u=5")]
+            )
+            self.assertEqual(stream_id, 0)
+            h3_transfer(quic_client, h3_server)
+            self.assertEqual(quic_server.stream_priorities[stream_id], (1, False))
+            self.assertEqual(h3_server._priority_updates, {})
+
     def test_send_data_after_trailers(self):
         """
         We should not send DATA after trailers.
@@ -1572,6 +1862,32 @@ class H3ConnectionTest(TestCase):
 
 
 class H3ParserTest(TestCase):
+    def test_parse_priority(self):
+        self.assertEqual(parse_priority(b""), (3, False))
+        self.assertEqual(parse_priority(b"u=1"), (1, False))
+        self.assertEqual(parse_priority(b"i"), (3, True))
+        self.assertEqual(parse_priority(b"u=0, i"), (0, True))
+        self.assertEqual(parse_priority(b"i=?0,u=7"), (7, False))
+        self.assertEqual(parse_priority(b"u=2;foo=bar, i=?1"), (2, True))
+
+        # later members override earlier ones
+        self.assertEqual(parse_priority(b"u=1, u=4"), (4, False))
+
+        # unknown keys and invalid values are ignored
+        self.assertEqual(parse_priority(b"foo=1, u=1"), (1, False))
+        self.assertEqual(parse_priority(b"u=8"), (3, False))
+        self.assertEqual(parse_priority(b"u=-1, i=1"), (3, False))
+
+        # quoted strings may contain separators
+        self.assertEqual(parse_priority(b'u=2, foo="a,b", i'), (2, True))
+        self.assertEqual(parse_priority(b'u=2;foo="a;b,c", i'), (2, True))
+        self.assertEqual(parse_priority(b'foo="a\\",u=1", u=5'), (5, False))
+
+        # malformed values are rejected
+        self.assertIsNone(parse_priority(b"U=1"))
+        self.assertIsNone(parse_priority(b"u=1,,i"))
+        self.assertIsNone(parse_priority(b"\xff"))
+
     def test_parse_settings_duplicate_identifier(self):
         buf = Buffer(capacity=1024)
         buf.push_uint_var(1)
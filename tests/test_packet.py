@@ -1,4 +1,6 @@
 import binascii
+import os
+import tempfile
 from unittest import TestCase
 
 from aioquic.buffer import Buffer, BufferReadError
@@ -130,8 +132,9 @@ class PacketTest(TestCase):
             original_destination_cid=original_destination_cid,
             retry_token=header.token,
         )
-        with open("bob.bin", "wb") as fp:
-            fp.write(encoded)
+        with tempfile.TemporaryDirectory() as dirname:
+            with open(os.path.join(dirname, "bob.bin"), "wb") as fp:
+                fp.write(encoded)
         self.assertEqual(encoded, data)
 
     def test_pull_retry_draft_29(self):
@@ -404,6 +407,23 @@ class FrameTest(TestCase):
         packet.push_ack_frame(buf, rangeset, delay)
         self.assertEqual(buf.data, data)
 
+    def test_ack_frame_with_ecn_counts(self):
+        data = b"\x00\x02\x00\x00\x05\x00\x40\x64"
+
+        # parse
+        buf = Buffer(data=data)
+        rangeset, delay = packet.pull_ack_frame(buf)
+        ecn_counts = packet.pull_ecn_counts(buf)
+        self.assertEqual(list(rangeset), [range(0, 1)])
+        self.assertEqual(delay, 2)
+        self.assertEqual(ecn_counts, packet.QuicEcnCounts(ect0=5, ect1=0, ce=100))
+
+        # serialize
+        buf = Buffer(capacity=len(data))
+        packet.push_ack_frame(buf, rangeset, delay)
+        packet.push_ecn_counts(buf, ecn_counts)
+        self.assertEqual(buf.data, data)
+
     def test_ack_frame_with_one_range(self):
         data = b"\x02\x02\x01\x00\x00\x00"
 
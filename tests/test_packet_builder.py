@@ -385,6 +385,47 @@ class QuicPacketBuilderTest(TestCase):
         # check builder
         self.assertEqual(builder.packet_number, 1)
 
+    def test_short_header_pmtu_probe(self):
+        """
+        A path MTU probe is padded to the probed size.
+        """
+        builder = QuicPacketBuilder(
+            host_cid=bytes(8),
+            is_client=False,
+            max_datagram_size=1500,
+            packet_number=0,
+            peer_cid=bytes(8),
+            peer_token=b"",
+            spin_bit=False,
+            version=QuicProtocolVersion.VERSION_1,
+        )
+        crypto = create_crypto()
+
+        # ONE_RTT, with only a PING frame
+        builder.start_packet(PACKET_TYPE_ONE_RTT, crypto, is_pmtu_probe=True)
+        self.assertEqual(builder.remaining_flight_space, 1473)
+        builder.start_frame(QuicFrameType.PING)
+
+        # check datagrams
+        datagrams, packets = builder.flush()
+        self.assertEqual(len(datagrams), 1)
+        self.assertEqual(len(datagrams[0]), 1500)
+        self.assertEqual(
+            packets,
+            [
+                QuicSentPacket(
+                    epoch=Epoch.ONE_RTT,
+                    in_flight=True,
+                    is_ack_eliciting=True,
+                    is_crypto_packet=False,
+                    is_pmtu_probe=True,
+                    packet_number=0,
+                    packet_type=PACKET_TYPE_ONE_RTT,
+                    sent_bytes=1500,
+                )
+            ],
+        )
+
     def test_short_header_max_flight_bytes(self):
         """
         max_flight_bytes limits sent data.
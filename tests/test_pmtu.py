@@ -0,0 +1,122 @@
+from unittest import TestCase
+
+from aioquic import tls
+from aioquic.quic.packet import PACKET_TYPE_ONE_RTT
+from aioquic.quic.packet_builder import QuicSentPacket
+from aioquic.quic.pmtu import K_PMTU_RAISE_TIMER, QuicPathMtuDiscovery, QuicPmtuState
+
+
+def sent_packet(packet_number, sent_bytes, is_pmtu_probe=False):
+    return QuicSentPacket(
+        epoch=tls.Epoch.ONE_RTT,
+        in_flight=True,
+        is_ack_eliciting=True,
+        is_crypto_packet=False,
+        is_pmtu_probe=is_pmtu_probe,
+        packet_number=packet_number,
+        packet_type=PACKET_TYPE_ONE_RTT,
+        sent_bytes=sent_bytes,
+    )
+
+
+class QuicPathMtuDiscoveryTest(TestCase):
+    def setUp(self):
+        self.pmtu = QuicPathMtuDiscovery()
+        self.packet_number = 0
+
+    def lose_probe(self, now=0.0):
+        size = self.pmtu.get_probe_size(now=now)
+        self.pmtu.on_probe_sent()
+        self.pmtu.on_packet_lost(self.probe(size), now=now)
+        return size
+
+    def probe(self, size):
+        self.packet_number += 1
+        return sent_packet(self.packet_number, size, is_pmtu_probe=True)
+
+    def test_disabled(self):
+        self.assertEqual(self.pmtu.state, QuicPmtuState.DISABLED)
+        self.assertIsNone(self.pmtu.get_probe_size(now=0.0))
+
+        # there is no room above the base size
+        self.pmtu.start(max_size=1280, now=0.0)
+        self.assertEqual(self.pmtu.state, QuicPmtuState.DISABLED)
+        self.assertIsNone(self.pmtu.get_probe_size(now=0.0))
+
+    def test_search_at_max_size(self):
+        self.pmtu.start(max_size=1500, now=0.0)
+        self.assertEqual(self.pmtu.state, QuicPmtuState.SEARCHING)
+        self.assertEqual(self.pmtu.get_probe_size(now=0.0), 1500)
+
+        # only one probe is in flight
+        self.pmtu.on_probe_sent()
+        self.assertIsNone(self.pmtu.get_probe_size(now=0.0))
+
+        self.pmtu.on_packet_acked(self.probe(1500), now=0.1)
+        self.assertEqual(self.pmtu.size, 1500)
+        self.assertEqual(self.pmtu.state, QuicPmtuState.SEARCH_COMPLETE)
+        self.assertIsNone(self.pmtu.get_probe_size(now=K_PMTU_RAISE_TIMER))
+
+    def test_search_bisection(self):
+        self.pmtu.start(max_size=1500, now=0.0)
+
+        # three probes at the maximum size are lost
+        for i in range(3):
+            self.assertEqual(self.lose_probe(), 1500)
+        self.assertEqual(self.pmtu.size, 1280)
+
+        # the search continues halfway
+        size = self.pmtu.get_probe_size(now=0.0)
+        self.assertEqual(size, 1390)
+        self.pmtu.on_probe_sent()
+        self.pmtu.on_packet_acked(self.probe(size), now=0.0)
+        self.assertEqual(self.pmtu.size, 1390)
+
+        size = self.pmtu.get_probe_size(now=0.0)
+        self.assertEqual(size, 1445)
+        for i in range(3):
+            self.assertEqual(self.lose_probe(), 1445)
+        for i in range(3):
+            self.assertEqual(self.lose_probe(), 1417)
+        for i in range(3):
+            self.assertEqual(self.lose_probe(), 1403)
+
+        # the search completes, and resumes later
+        self.assertEqual(self.pmtu.size, 1390)
+        self.assertEqual(self.pmtu.state, QuicPmtuState.SEARCH_COMPLETE)
+        self.assertIsNone(self.pmtu.get_probe_size(now=1.0))
+        self.assertEqual(self.pmtu.get_probe_size(now=K_PMTU_RAISE_TIMER), 1500)
+        self.assertEqual(self.pmtu.state, QuicPmtuState.SEARCHING)
+
+    def test_black_hole_losses(self):
+        self.pmtu.start(max_size=1500, now=0.0)
+        self.pmtu.on_probe_sent()
+        self.pmtu.on_packet_acked(self.probe(1500), now=0.0)
+        self.assertEqual(self.pmtu.size, 1500)
+
+        # losses of packets sent before an acknowledged one do not count
+        self.pmtu.on_packet_acked(sent_packet(10, 1500), now=1.0)
+        for packet_number in range(5, 10):
+            self.pmtu.on_packet_lost(sent_packet(packet_number, 1500), now=1.0)
+        self.assertEqual(self.pmtu.size, 1500)
+
+        # large packets stop getting through
+        for packet_number in range(11, 14):
+            self.pmtu.on_packet_lost(sent_packet(packet_number, 1500), now=2.0)
+        self.assertEqual(self.pmtu.size, 1280)
+        self.assertEqual(self.pmtu.state, QuicPmtuState.SEARCH_COMPLETE)
+
+        # the search resumes later
+        self.assertIsNone(self.pmtu.get_probe_size(now=2.0))
+        self.assertEqual(self.pmtu.get_probe_size(now=2.0 + K_PMTU_RAISE_TIMER), 1500)
+
+    def test_black_hole_timeout(self):
+        self.pmtu.start(max_size=1500, now=0.0)
+        self.pmtu.on_probe_sent()
+        self.pmtu.on_packet_acked(self.probe(1500), now=0.0)
+
+        self.pmtu.on_loss_detection_timeout(pto_count=2, now=1.0)
+        self.assertEqual(self.pmtu.size, 1500)
+
+        self.pmtu.on_loss_detection_timeout(pto_count=3, now=1.0)
+        self.assertEqual(self.pmtu.size, 1280)
@@ -1,3 +1,4 @@
+import random
 from unittest import TestCase
 
 from aioquic.quic.rangeset import RangeSet
@@ -179,6 +180,35 @@ class RangeSetTest(TestCase):
         rangeset.subtract(2, 5)
         self.assertEqual(list(rangeset), [range(0, 2), range(5, 10)])
 
+    def test_subtract_many(self):
+        rangeset = RangeSet([range(0, 2), range(4, 6), range(8, 10), range(12, 14)])
+
+        rangeset.subtract(1, 13)
+        self.assertEqual(list(rangeset), [range(0, 1), range(13, 14)])
+
+    def test_random_operations(self):
+        rng = random.Random(1234)
+        rangeset = RangeSet()
+        values = set()
+        for i in range(2000):
+            start = rng.randrange(0, 500)
+            stop = start + rng.randrange(1, 20)
+            if rng.random() < 0.6:
+                rangeset.add(start, stop)
+                values.update(range(start, stop))
+            else:
+                rangeset.subtract(start, stop)
+                values.difference_update(range(start, stop))
+
+            # the ranges are sorted, non-empty and non-adjacent
+            ranges = list(rangeset)
+            for a, b in zip(ranges, ranges[1:]):
+                self.assertLess(a.stop, b.start)
+            self.assertEqual(set(v for r in ranges for v in r), values)
+
+        for value in range(0, 520):
+            self.assertEqual(value in rangeset, value in values)
+
     def test_bool(self):
         with self.assertRaises(NotImplementedError):
             bool(RangeSet())
@@ -219,6 +249,18 @@ class RangeSetTest(TestCase):
         self.assertFalse(r2 == r0)
         self.assertFalse(r2 == 0)
 
+    def test_getitem(self):
+        rangeset = RangeSet([range(1, 2), range(3, 4), range(5, 6)])
+        self.assertEqual(rangeset[0], range(1, 2))
+        self.assertEqual(rangeset[-1], range(5, 6))
+        self.assertEqual(rangeset[1:], [range(3, 4), range(5, 6)])
+        with self.assertRaises(IndexError):
+            rangeset[3]
+
+    def test_reversed(self):
+        rangeset = RangeSet([range(1, 2), range(3, 4)])
+        self.assertEqual(list(reversed(rangeset)), [range(3, 4), range(1, 2)])
+
     def test_len(self):
         rangeset = RangeSet()
         self.assertEqual(len(rangeset), 0)
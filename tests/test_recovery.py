@@ -2,14 +2,14 @@ import math
 from unittest import TestCase
 
 from aioquic import tls
-from aioquic.quic.packet import PACKET_TYPE_INITIAL, PACKET_TYPE_ONE_RTT
-from aioquic.quic.packet_builder import QuicSentPacket
+from aioquic.quic.packet import PACKET_TYPE_INITIAL, PACKET_TYPE_ONE_RTT, QuicEcnCounts
+from aioquic.quic.packet_builder import QuicDeliveryState, QuicSentPacket
 from aioquic.quic.rangeset import RangeSet
 from aioquic.quic.recovery import (
+    QuicEcnState,
     QuicPacketPacer,
     QuicPacketRecovery,
     QuicPacketSpace,
-    QuicRttMonitor,
 )
 
 
@@ -17,6 +17,19 @@ def send_probe():
     pass
 
 
+def sent_packet(packet_number, sent_time=0.0):
+    return QuicSentPacket(
+        epoch=tls.Epoch.ONE_RTT,
+        in_flight=True,
+        is_ack_eliciting=True,
+        is_crypto_packet=False,
+        packet_number=packet_number,
+        packet_type=PACKET_TYPE_ONE_RTT,
+        sent_bytes=1280,
+        sent_time=sent_time,
+    )
+
+
 class QuicPacketPacerTest(TestCase):
     def setUp(self):
         self.pacer = QuicPacketPacer()
@@ -43,22 +56,14 @@ class QuicPacketPacerTest(TestCase):
             self.pacer.update_after_send(now=1.0)
         self.assertAlmostEqual(self.pacer.next_send_time(now=1.0), 1.00005)
 
-        # 2 packets
-        for i in range(2):
-            self.assertIsNone(self.pacer.next_send_time(now=1.00005))
-            self.pacer.update_after_send(now=1.00005)
-        self.assertAlmostEqual(self.pacer.next_send_time(now=1.00005), 1.0001)
-
-        # 1 packet
-        self.assertIsNone(self.pacer.next_send_time(now=1.0001))
-        self.pacer.update_after_send(now=1.0001)
-        self.assertAlmostEqual(self.pacer.next_send_time(now=1.0001), 1.00015)
-
-        # 2 packets
-        for i in range(2):
-            self.assertIsNone(self.pacer.next_send_time(now=1.00015))
-            self.pacer.update_after_send(now=1.00015)
-        self.assertAlmostEqual(self.pacer.next_send_time(now=1.00015), 1.0002)
+        # then one packet every 50us, even if the sender wakes up more often
+        sent = 0
+        for i in range(1000):
+            now = 1.0 + i * 0.00001
+            while self.pacer.next_send_time(now=now) is None:
+                self.pacer.update_after_send(now=now)
+                sent += 1
+        self.assertAlmostEqual(sent, 200, delta=1)
 
 
 class QuicPacketRecoveryTest(TestCase):
@@ -114,6 +119,129 @@ class QuicPacketRecoveryTest(TestCase):
         self.assertEqual(self.recovery._rtt_min, 10.0)
         self.assertEqual(self.recovery._rtt_smoothed, 10.0)
 
+    def test_on_ack_received_ecn(self):
+        space = self.ONE_RTT_SPACE
+        events = []
+        self.recovery._cc.on_congestion_experienced = (
+            lambda sent_time, now: events.append((sent_time, now))
+        )
+
+        # packets are marked while testing
+        for packet_number in range(4):
+            packet = sent_packet(packet_number, sent_time=packet_number * 0.01)
+            self.recovery.on_packet_sent(packet, space)
+            self.assertTrue(packet.is_ecn_marked)
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.TESTING)
+
+        # the peer reports our marks
+        self.recovery.on_ack_received(
+            space,
+            ack_rangeset=RangeSet([range(0, 2)]),
+            ack_delay=0.0,
+            ecn_counts=QuicEcnCounts(ect0=2),
+            now=0.1,
+        )
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.CAPABLE)
+        self.assertEqual(space.peer_ecn_counts, QuicEcnCounts(ect0=2))
+        self.assertEqual(events, [])
+
+        # a router marked one packet Congestion Experienced
+        self.recovery.on_ack_received(
+            space,
+            ack_rangeset=RangeSet([range(0, 4)]),
+            ack_delay=0.0,
+            ecn_counts=QuicEcnCounts(ect0=3, ce=1),
+            now=0.2,
+        )
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.CAPABLE)
+        self.assertEqual(events, [(0.03, 0.2)])
+
+    def test_on_ack_received_ecn_decreasing_counts(self):
+        space = self.ONE_RTT_SPACE
+        for packet_number in range(2):
+            self.recovery.on_packet_sent(sent_packet(packet_number), space)
+
+        self.recovery.on_ack_received(
+            space,
+            ack_rangeset=RangeSet([range(0, 1)]),
+            ack_delay=0.0,
+            ecn_counts=QuicEcnCounts(ect0=1),
+            now=0.1,
+        )
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.CAPABLE)
+
+        # the counts went backwards
+        self.recovery.on_ack_received(
+            space,
+            ack_rangeset=RangeSet([range(0, 2)]),
+            ack_delay=0.0,
+            ecn_counts=QuicEcnCounts(ect0=0, ce=1),
+            now=0.2,
+        )
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.FAILED)
+
+    def test_on_ack_received_ecn_missing_counts(self):
+        space = self.ONE_RTT_SPACE
+        packet = sent_packet(0)
+        self.recovery.on_packet_sent(packet, space)
+
+        # the peer or the path cleared our marks
+        self.recovery.on_ack_received(
+            space, ack_rangeset=RangeSet([range(0, 1)]), ack_delay=0.0, now=0.1
+        )
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.FAILED)
+
+        # packets are no longer marked
+        packet = sent_packet(1)
+        self.recovery.on_packet_sent(packet, space)
+        self.assertFalse(packet.is_ecn_marked)
+
+    def test_on_ack_received_ranges(self):
+        space = self.ONE_RTT_SPACE
+        acked = []
+
+        def on_delivery(delivery, packet_number):
+            if delivery == QuicDeliveryState.ACKED:
+                acked.append(packet_number)
+
+        for packet_number in range(10):
+            packet = QuicSentPacket(
+                epoch=tls.Epoch.ONE_RTT,
+                in_flight=True,
+                is_ack_eliciting=True,
+                is_crypto_packet=False,
+                packet_number=packet_number,
+                packet_type=PACKET_TYPE_ONE_RTT,
+                sent_bytes=1280,
+                sent_time=0.0,
+            )
+            packet.delivery_handlers.append((on_delivery, (packet_number,)))
+            self.recovery.on_packet_sent(packet, space)
+
+        # packets 2, 3 and 5 are ack'd
+        self.recovery.on_ack_received(
+            space,
+            ack_rangeset=RangeSet([range(2, 4), range(5, 6)]),
+            ack_delay=0.0,
+            now=0.01,
+        )
+        self.assertEqual(acked, [2, 3, 5])
+
+        # packets 0 and 1 are lost
+        self.assertEqual(list(space.sent_packets.keys()), [4, 6, 7, 8, 9])
+
+        # the peer acknowledges a range much wider than the packets in flight
+        self.recovery.on_ack_received(
+            space,
+            ack_rangeset=RangeSet([range(0, 1000000)]),
+            ack_delay=0.0,
+            now=0.02,
+        )
+        self.assertEqual(acked, [2, 3, 5, 4, 6, 7, 8, 9])
+        self.assertEqual(list(space.sent_packets.keys()), [])
+        self.assertEqual(self.recovery.bytes_in_flight, 0)
+        self.assertEqual(space.ack_eliciting_in_flight, 0)
+
     def test_on_ack_received_non_ack_eliciting(self):
         packet = QuicSentPacket(
             epoch=tls.Epoch.ONE_RTT,
@@ -147,6 +275,119 @@ class QuicPacketRecoveryTest(TestCase):
         self.assertEqual(self.recovery._rtt_min, math.inf)
         self.assertEqual(self.recovery._rtt_smoothed, 0.0)
 
+    def test_on_loss_detection_timeout_at_loss_time(self):
+        space = self.ONE_RTT_SPACE
+        for packet_number in range(2):
+            self.recovery.on_packet_sent(
+                QuicSentPacket(
+                    epoch=tls.Epoch.ONE_RTT,
+                    in_flight=True,
+                    is_ack_eliciting=True,
+                    is_crypto_packet=False,
+                    packet_number=packet_number,
+                    packet_type=PACKET_TYPE_ONE_RTT,
+                    sent_bytes=1280,
+                    sent_time=0.008,
+                ),
+                space,
+            )
+
+        # second packet ack'd, the first one is not lost yet
+        self.recovery.on_ack_received(
+            space, ack_rangeset=RangeSet([range(1, 2)]), ack_delay=0.0, now=0.108
+        )
+        self.assertEqual(list(space.sent_packets.keys()), [0])
+        self.assertIsNotNone(space.loss_time)
+
+        # the timer fires exactly at the loss time, the first packet is lost
+        self.recovery.on_loss_detection_timeout(now=space.loss_time)
+        self.assertEqual(space.sent_packets, {})
+        self.assertIsNone(space.loss_time)
+
+    def test_on_ack_received_rate_sample(self):
+        space = self.ONE_RTT_SPACE
+        samples = []
+        self.recovery._cc.on_rate_sample = lambda sample, now: samples.append(sample)
+
+        def send_and_ack(start, count, sent_time, now):
+            for packet_number in range(start, start + count):
+                self.recovery.on_packet_sent(
+                    QuicSentPacket(
+                        epoch=tls.Epoch.ONE_RTT,
+                        in_flight=True,
+                        is_ack_eliciting=True,
+                        is_crypto_packet=False,
+                        packet_number=packet_number,
+                        packet_type=PACKET_TYPE_ONE_RTT,
+                        sent_bytes=1280,
+                        sent_time=sent_time,
+                    ),
+                    space,
+                )
+            self.recovery.on_ack_received(
+                space,
+                ack_rangeset=RangeSet([range(start, start + count)]),
+                ack_delay=0.0,
+                now=now,
+            )
+
+        # 10 packets delivered in 100ms
+        send_and_ack(0, 10, sent_time=0.0, now=0.1)
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0].delivered, 12800)
+        self.assertEqual(samples[0].delivery_rate, 128000)
+        self.assertFalse(samples[0].is_app_limited)
+        self.assertEqual(samples[0].prior_delivered, 0)
+
+        # the sender runs out of data, the next packets are application-limited
+        self.recovery.on_application_limited()
+        send_and_ack(10, 5, sent_time=0.1, now=0.2)
+        self.assertEqual(len(samples), 2)
+        self.assertEqual(samples[1].delivered, 6400)
+        self.assertEqual(samples[1].delivery_rate, 64000)
+        self.assertTrue(samples[1].is_app_limited)
+        self.assertEqual(samples[1].prior_delivered, 12800)
+
+        # once those are acknowledged, the sender is no longer limited
+        send_and_ack(15, 10, sent_time=0.2, now=0.3)
+        self.assertEqual(len(samples), 3)
+        self.assertFalse(samples[2].is_app_limited)
+
+    def test_on_packet_lost_ecn_testing(self):
+        space = self.ONE_RTT_SPACE
+        for packet_number in range(3):
+            self.recovery.on_packet_sent(sent_packet(packet_number), space)
+
+        # marked packets may be dropped by the path
+        self.recovery._on_packets_lost(
+            list(space.sent_packets.values())[:2], space=space, now=1.0
+        )
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.TESTING)
+
+        self.recovery._on_packets_lost(
+            list(space.sent_packets.values()), space=space, now=1.0
+        )
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.FAILED)
+
+    def test_on_packet_lost_pmtu_probe(self):
+        packet = sent_packet(0)
+        packet.is_pmtu_probe = True
+        packet.sent_bytes = 1500
+        space = self.ONE_RTT_SPACE
+        congestion_window = self.recovery.congestion_window
+
+        self.recovery.pmtu.start(max_size=1500, now=0.0)
+        self.assertEqual(self.recovery.pmtu.get_probe_size(now=0.0), 1500)
+        self.recovery.on_packet_sent(packet, space)
+        self.assertEqual(self.recovery.bytes_in_flight, 1500)
+
+        # a lost probe is not a sign of congestion
+        self.recovery._on_packets_lost([packet], space=space, now=1.0)
+        self.assertEqual(self.recovery.bytes_in_flight, 0)
+        self.assertEqual(self.recovery.congestion_window, congestion_window)
+        self.assertEqual(self.recovery.ecn_state, QuicEcnState.TESTING)
+        self.assertEqual(self.recovery.max_datagram_size, 1280)
+
     def test_on_packet_lost_crypto(self):
         packet = QuicSentPacket(
             epoch=tls.Epoch.INITIAL,
@@ -170,60 +411,37 @@ class QuicPacketRecoveryTest(TestCase):
         self.assertEqual(space.ack_eliciting_in_flight, 0)
         self.assertEqual(len(space.sent_packets), 0)
 
+    def _lose_packets(self, acked):
+        space = self.ONE_RTT_SPACE
 
-class QuicRttMonitorTest(TestCase):
-    def test_monitor(self):
-        monitor = QuicRttMonitor()
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=10, now=1000))
-        self.assertEqual(monitor._samples, [10, 0.0, 0.0, 0.0, 0.0])
-        self.assertFalse(monitor._ready)
-
-        # not taken into account
-        self.assertFalse(monitor.is_rtt_increasing(rtt=11, now=1000))
-        self.assertEqual(monitor._samples, [10, 0.0, 0.0, 0.0, 0.0])
-        self.assertFalse(monitor._ready)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=11, now=1001))
-        self.assertEqual(monitor._samples, [10, 11, 0.0, 0.0, 0.0])
-        self.assertFalse(monitor._ready)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=12, now=1002))
-        self.assertEqual(monitor._samples, [10, 11, 12, 0.0, 0.0])
-        self.assertFalse(monitor._ready)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=13, now=1003))
-        self.assertEqual(monitor._samples, [10, 11, 12, 13, 0.0])
-        self.assertFalse(monitor._ready)
-
-        # we now have enough samples
-        self.assertFalse(monitor.is_rtt_increasing(rtt=14, now=1004))
-        self.assertEqual(monitor._samples, [10, 11, 12, 13, 14])
-        self.assertTrue(monitor._ready)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=20, now=1005))
-        self.assertEqual(monitor._increases, 0)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=30, now=1006))
-        self.assertEqual(monitor._increases, 0)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=40, now=1007))
-        self.assertEqual(monitor._increases, 0)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=50, now=1008))
-        self.assertEqual(monitor._increases, 0)
-
-        self.assertFalse(monitor.is_rtt_increasing(rtt=60, now=1009))
-        self.assertEqual(monitor._increases, 1)
+        # a first RTT sample of 100ms
+        self.recovery.on_packet_sent(sent_packet(0, sent_time=0.0), space)
+        self.recovery.on_ack_received(
+            space, ack_rangeset=RangeSet([range(0, 1)]), ack_delay=0.0, now=0.1
+        )
 
-        self.assertFalse(monitor.is_rtt_increasing(rtt=70, now=1010))
-        self.assertEqual(monitor._increases, 2)
+        # packets sent over 1.1s, longer than the persistent congestion duration
+        for packet_number in range(1, 13):
+            self.recovery.on_packet_sent(
+                sent_packet(packet_number, sent_time=0.1 * packet_number + 0.1),
+                space,
+            )
+        self.recovery.on_packet_sent(sent_packet(13, sent_time=2.0), space)
 
-        self.assertFalse(monitor.is_rtt_increasing(rtt=80, now=1011))
-        self.assertEqual(monitor._increases, 3)
+        acked.add(13)
+        self.recovery.on_ack_received(space, ack_rangeset=acked, ack_delay=0.0, now=2.1)
 
-        self.assertFalse(monitor.is_rtt_increasing(rtt=90, now=1012))
-        self.assertEqual(monitor._increases, 4)
+    def test_on_packets_lost_persistent_congestion(self):
+        self._lose_packets(RangeSet())
+        self.assertEqual(self.recovery.bytes_in_flight, 0)
+        self.assertEqual(
+            self.recovery.congestion_window, self.recovery._cc.minimum_window
+        )
 
-        self.assertTrue(monitor.is_rtt_increasing(rtt=100, now=1013))
-        self.assertEqual(monitor._increases, 5)
+    def test_on_packets_lost_not_persistent_congestion(self):
+        # an acknowledged packet in the middle splits the period
+        self._lose_packets(RangeSet([range(6, 7)]))
+        self.assertEqual(self.recovery.bytes_in_flight, 0)
+        self.assertGreater(
+            self.recovery.congestion_window, self.recovery._cc.minimum_window
+        )
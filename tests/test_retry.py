@@ -26,11 +26,119 @@ class QuicRetryTokenHandlerTest(TestCase):
         # validate token - empty
         with self.assertRaises(ValueError) as cm:
             handler.validate_token(addr, b"")
-        self.assertEqual(
-            str(cm.exception), "Ciphertext length must be equal to key size."
-        )
+        self.assertEqual(str(cm.exception), "Token is not valid.")
+
+        # validate token - tampered
+        with self.assertRaises(ValueError) as cm:
+            handler.validate_token(addr, token[:-1] + bytes([token[-1] ^ 1]))
+        self.assertEqual(str(cm.exception), "Token is not valid.")
 
         # validate token - wrong address
         with self.assertRaises(ValueError) as cm:
             handler.validate_token(("1.2.3.4", 12345), token)
         self.assertEqual(str(cm.exception), "Remote address does not match.")
+
+    def test_retry_token_expired(self):
+        addr = ("127.0.0.1", 1234)
+        handler = QuicRetryTokenHandler(lifetime=10.0)
+        token = handler.create_token(addr, b"odcid", b"rscid", now=1000.0)
+
+        self.assertEqual(
+            handler.validate_token(addr, token, now=1009.9), (b"odcid", b"rscid")
+        )
+
+        # the key has not rotated out yet, but the token has expired
+        with self.assertRaises(ValueError) as cm:
+            handler.validate_token(addr, token, now=1010.0)
+        self.assertEqual(str(cm.exception), "Token has expired.")
+
+        # the key has rotated out
+        with self.assertRaises(ValueError) as cm:
+            handler.validate_token(addr, token, now=1020.0)
+        self.assertEqual(str(cm.exception), "Token is not valid.")
+
+        # the token was issued in the future
+        token = handler.create_token(addr, b"odcid", b"rscid", now=1005.0)
+        with self.assertRaises(ValueError) as cm:
+            handler.validate_token(addr, token, now=1004.0)
+        self.assertEqual(str(cm.exception), "Token has expired.")
+
+    def test_retry_token_key_rotation(self):
+        addr = ("127.0.0.1", 1234)
+        handler = QuicRetryTokenHandler()
+
+        # a token sealed just before the key rotates
+        token = handler.create_token(addr, b"odcid", b"rscid", now=1009.0)
+        self.assertEqual(
+            handler.validate_token(addr, token, now=1011.0), (b"odcid", b"rscid")
+        )
+
+    def test_retry_token_shared_secret(self):
+        addr = ("::1", 1234, 0, 0)
+        secret = bytes(range(32))
+        handler = QuicRetryTokenHandler(secret=secret)
+        token = handler.create_token(addr, b"odcid", b"rscid")
+
+        # another server with the same secret accepts the token
+        self.assertEqual(
+            QuicRetryTokenHandler(secret=secret).validate_token(addr, token),
+            (b"odcid", b"rscid"),
+        )
+
+        # a server with another secret does not
+        with self.assertRaises(ValueError) as cm:
+            QuicRetryTokenHandler().validate_token(addr, token)
+        self.assertEqual(str(cm.exception), "Token is not valid.")
+
+        with self.assertRaises(ValueError) as cm:
+            QuicRetryTokenHandler(secret=b"short")
+        self.assertEqual(str(cm.exception), "secret must be at least 16 bytes")
+
+    def test_new_token(self):
+        addr = ("127.0.0.1", 1234)
+        handler = QuicRetryTokenHandler()
+        token = handler.create_new_token(addr, now=1000.0)
+        self.assertFalse(handler.is_retry_token(token))
+
+        # the client may connect from another port, but not from another address
+        self.assertFalse(
+            handler.validate_new_token(("1.2.3.4", 1234), token, now=1001.0)
+        )
+        self.assertTrue(
+            handler.validate_new_token(("127.0.0.1", 4321), token, now=1001.0)
+        )
+
+        # the token expires after a day
+        token = handler.create_new_token(addr, now=1000.0)
+        self.assertFalse(handler.validate_new_token(addr, token, now=87400.0))
+        self.assertTrue(handler.validate_new_token(addr, token, now=87399.0))
+
+        # retry tokens and NEW_TOKEN tokens cannot be swapped
+        retry_token = handler.create_token(addr, b"odcid", b"rscid", now=1000.0)
+        self.assertTrue(handler.is_retry_token(retry_token))
+        self.assertFalse(handler.validate_new_token(addr, retry_token, now=1001.0))
+        with self.assertRaises(ValueError) as cm:
+            handler.validate_token(addr, token, now=1001.0)
+        self.assertEqual(str(cm.exception), "Token is not valid.")
+
+        self.assertFalse(handler.validate_new_token(addr, b"", now=1001.0))
+        self.assertFalse(handler.is_retry_token(b""))
+
+    def test_new_token_replay(self):
+        addr = ("127.0.0.1", 1234)
+        handler = QuicRetryTokenHandler(max_used_new_tokens=2)
+        token = handler.create_new_token(addr, now=1000.0)
+
+        # the token is only accepted once
+        self.assertTrue(handler.validate_new_token(addr, token, now=1001.0))
+        self.assertFalse(handler.validate_new_token(addr, token, now=1002.0))
+
+        # while too many used tokens are remembered, tokens are rejected
+        token2 = handler.create_new_token(addr, now=2000.0)
+        token3 = handler.create_new_token(addr, now=2000.0)
+        self.assertTrue(handler.validate_new_token(addr, token2, now=2001.0))
+        self.assertFalse(handler.validate_new_token(addr, token3, now=2001.0))
+
+        # until the first one expires
+        self.assertTrue(handler.validate_new_token(addr, token3, now=87400.0))
+        self.assertEqual(len(handler._used_new_tokens), 2)
@@ -0,0 +1,98 @@
+from unittest import TestCase
+
+from aioquic.quic.scheduler import QuicStreamScheduler
+from aioquic.quic.stream import QuicStream
+
+
+def stream_ids(scheduler):
+    return [stream.stream_id for stream in scheduler]
+
+
+class QuicStreamSchedulerTest(TestCase):
+    def test_default_priority(self):
+        scheduler = QuicStreamScheduler()
+        for stream_id in [8, 0, 4]:
+            scheduler.add(QuicStream(stream_id=stream_id))
+
+        # same urgency, non-incremental: stream ID order
+        self.assertEqual(stream_ids(scheduler), [0, 4, 8])
+        self.assertEqual(len(scheduler), 3)
+
+    def test_add_twice(self):
+        scheduler = QuicStreamScheduler()
+        stream = QuicStream(stream_id=0)
+        scheduler.add(stream)
+        scheduler.add(stream)
+        self.assertEqual(stream_ids(scheduler), [0])
+
+    def test_remove(self):
+        scheduler = QuicStreamScheduler()
+        streams = [QuicStream(stream_id=stream_id) for stream_id in [0, 4, 8]]
+        for stream in streams:
+            scheduler.add(stream)
+
+        scheduler.remove(streams[1])
+        self.assertEqual(stream_ids(scheduler), [0, 8])
+        self.assertNotIn(streams[1], scheduler)
+
+        # removing an unscheduled stream is a no-op
+        scheduler.remove(streams[1])
+        self.assertEqual(stream_ids(scheduler), [0, 8])
+
+    def test_urgency(self):
+        scheduler = QuicStreamScheduler()
+        streams = [QuicStream(stream_id=stream_id) for stream_id in [0, 4, 8]]
+        for stream in streams:
+            scheduler.add(stream)
+
+        scheduler.update(streams[2], urgency=0, incremental=False)
+        scheduler.update(streams[0], urgency=7, incremental=False)
+        self.assertEqual(stream_ids(scheduler), [8, 4, 0])
+        self.assertEqual(streams[2].priority_urgency, 0)
+
+    def test_update_unscheduled(self):
+        scheduler = QuicStreamScheduler()
+        stream = QuicStream(stream_id=0)
+        scheduler.update(stream, urgency=1, incremental=True)
+        self.assertEqual(stream.priority_urgency, 1)
+        self.assertTrue(stream.priority_incremental)
+        self.assertNotIn(stream, scheduler)
+
+    def test_incremental_after_sequential(self):
+        scheduler = QuicStreamScheduler()
+        streams = [QuicStream(stream_id=stream_id) for stream_id in [0, 4, 8]]
+        for stream in streams:
+            scheduler.add(stream)
+
+        scheduler.update(streams[0], urgency=3, incremental=True)
+        self.assertEqual(stream_ids(scheduler), [4, 8, 0])
+
+    def test_incremental_round_robin(self):
+        scheduler = QuicStreamScheduler(quantum=1000)
+        streams = [QuicStream(stream_id=stream_id) for stream_id in [0, 4, 8]]
+        for stream in streams:
+            stream.priority_incremental = True
+            scheduler.add(stream)
+        self.assertEqual(stream_ids(scheduler), [0, 4, 8])
+
+        # stream 0 has not used up its quantum
+        scheduler.on_data_sent(streams[0], 999)
+        self.assertEqual(stream_ids(scheduler), [0, 4, 8])
+
+        # stream 0 yields its turn
+        scheduler.on_data_sent(streams[0], 1)
+        self.assertEqual(stream_ids(scheduler), [4, 8, 0])
+
+        # stream 4 yields its turn
+        scheduler.on_data_sent(streams[1], 1200)
+        self.assertEqual(stream_ids(scheduler), [8, 0, 4])
+
+    def test_on_data_sent_sequential(self):
+        scheduler = QuicStreamScheduler(quantum=1000)
+        streams = [QuicStream(stream_id=stream_id) for stream_id in [0, 4]]
+        for stream in streams:
+            scheduler.add(stream)
+
+        # sequential streams do not rotate
+        scheduler.on_data_sent(streams[0], 2000)
+        self.assertEqual(stream_ids(scheduler), [0, 4])
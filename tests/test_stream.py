@@ -1,24 +1,31 @@
+import tempfile
 from unittest import TestCase
 
 from aioquic.quic.events import StreamDataReceived, StreamReset
 from aioquic.quic.packet import QuicErrorCode, QuicStreamFrame
 from aioquic.quic.packet_builder import QuicDeliveryState
-from aioquic.quic.stream import FinalSizeError, QuicStream
+from aioquic.quic.stream import (
+    FinalSizeError,
+    QuicBufferProducer,
+    QuicCallbackProducer,
+    QuicFileProducer,
+    QuicStream,
+)
 
 
 class QuicStreamTest(TestCase):
     def test_receiver_empty(self):
         stream = QuicStream(stream_id=0)
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 0)
 
         # empty
         self.assertEqual(
             stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"")), None
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 0)
 
     def test_receiver_ordered(self):
@@ -29,8 +36,8 @@ class QuicStreamTest(TestCase):
             stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"01234567")),
             StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0),
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 8)
         self.assertEqual(stream.receiver.highest_offset, 8)
         self.assertFalse(stream.receiver.is_finished)
@@ -40,8 +47,8 @@ class QuicStreamTest(TestCase):
             stream.receiver.handle_frame(QuicStreamFrame(offset=8, data=b"89012345")),
             StreamDataReceived(data=b"89012345", end_stream=False, stream_id=0),
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 16)
         self.assertEqual(stream.receiver.highest_offset, 16)
         self.assertFalse(stream.receiver.is_finished)
@@ -53,8 +60,8 @@ class QuicStreamTest(TestCase):
             ),
             StreamDataReceived(data=b"67890123", end_stream=True, stream_id=0),
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 24)
         self.assertEqual(stream.receiver.highest_offset, 24)
         self.assertTrue(stream.receiver.is_finished)
@@ -67,10 +74,8 @@ class QuicStreamTest(TestCase):
             stream.receiver.handle_frame(QuicStreamFrame(offset=8, data=b"89012345")),
             None,
         )
-        self.assertEqual(
-            bytes(stream.receiver._buffer), b"\x00\x00\x00\x00\x00\x00\x00\x0089012345"
-        )
-        self.assertEqual(list(stream.receiver._ranges), [range(8, 16)])
+        self.assertEqual(stream.receiver._segments, [b"89012345"])
+        self.assertEqual(stream.receiver._segment_starts, [8])
         self.assertEqual(stream.receiver._buffer_start, 0)
         self.assertEqual(stream.receiver.highest_offset, 16)
 
@@ -79,11 +84,66 @@ class QuicStreamTest(TestCase):
             stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"01234567")),
             StreamDataReceived(data=b"0123456789012345", end_stream=False, stream_id=0),
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 16)
         self.assertEqual(stream.receiver.highest_offset, 16)
 
+    def test_receiver_unordered_overlapping(self):
+        stream = QuicStream(stream_id=0)
+
+        # add data at offsets 8 and 20
+        stream.receiver.handle_frame(QuicStreamFrame(offset=8, data=b"89012345"))
+        stream.receiver.handle_frame(QuicStreamFrame(offset=20, data=b"0123"))
+        self.assertEqual(stream.receiver._segment_starts, [8, 20])
+
+        # add data overlapping both segments, only the holes are stored
+        self.assertEqual(
+            stream.receiver.handle_frame(
+                QuicStreamFrame(offset=4, data=b"456789012345678901")
+            ),
+            None,
+        )
+        self.assertEqual(
+            stream.receiver._segments, [b"4567", b"89012345", b"6789", b"0123"]
+        )
+        self.assertEqual(stream.receiver._segment_starts, [4, 8, 16, 20])
+        self.assertEqual(stream.receiver._segment_stops, [8, 16, 20, 24])
+
+        # fill the hole at the front, all segments are delivered
+        self.assertEqual(
+            stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"0123")),
+            StreamDataReceived(
+                data=b"012345678901234567890123", end_stream=False, stream_id=0
+            ),
+        )
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._buffer_start, 24)
+
+    def test_receiver_unordered_sparse(self):
+        stream = QuicStream(stream_id=0)
+
+        # data far ahead is stored without filling the gap
+        self.assertEqual(
+            stream.receiver.handle_frame(QuicStreamFrame(offset=1000000, data=b"z")),
+            None,
+        )
+        self.assertEqual(stream.receiver._segments, [b"z"])
+        self.assertEqual(stream.receiver._segment_starts, [1000000])
+        self.assertEqual(stream.receiver.highest_offset, 1000001)
+
+        # a duplicate of the stored data is ignored
+        stream.receiver.handle_frame(QuicStreamFrame(offset=1000000, data=b"z"))
+        self.assertEqual(stream.receiver._segments, [b"z"])
+
+        # in-order data which does not reach the segment is delivered
+        self.assertEqual(
+            stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"0123")),
+            StreamDataReceived(data=b"0123", end_stream=False, stream_id=0),
+        )
+        self.assertEqual(stream.receiver._segment_starts, [1000000])
+        self.assertEqual(stream.receiver._buffer_start, 4)
+
     def test_receiver_offset_only(self):
         stream = QuicStream(stream_id=0)
 
@@ -91,8 +151,8 @@ class QuicStreamTest(TestCase):
         self.assertEqual(
             stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"")), None
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 0)
         self.assertEqual(stream.receiver.highest_offset, 0)
 
@@ -100,10 +160,8 @@ class QuicStreamTest(TestCase):
         self.assertEqual(
             stream.receiver.handle_frame(QuicStreamFrame(offset=8, data=b"")), None
         )
-        self.assertEqual(
-            bytes(stream.receiver._buffer), b"\x00\x00\x00\x00\x00\x00\x00\x00"
-        )
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 0)
         self.assertEqual(stream.receiver.highest_offset, 8)
 
@@ -115,8 +173,8 @@ class QuicStreamTest(TestCase):
             stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"01234567")),
             StreamDataReceived(data=b"01234567", end_stream=False, stream_id=0),
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 8)
 
         # add data again at offset 0
@@ -124,16 +182,16 @@ class QuicStreamTest(TestCase):
             stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"01234567")),
             None,
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 8)
 
         # add data again at offset 0
         self.assertEqual(
             stream.receiver.handle_frame(QuicStreamFrame(offset=0, data=b"01")), None
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 8)
 
     def test_receiver_already_partially_consumed(self):
@@ -150,8 +208,8 @@ class QuicStreamTest(TestCase):
             ),
             StreamDataReceived(data=b"89012345", end_stream=False, stream_id=0),
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 16)
 
     def test_receiver_already_partially_consumed_2(self):
@@ -173,8 +231,8 @@ class QuicStreamTest(TestCase):
             ),
             StreamDataReceived(data=b"89012345abcdefgh", end_stream=False, stream_id=0),
         )
-        self.assertEqual(bytes(stream.receiver._buffer), b"")
-        self.assertEqual(list(stream.receiver._ranges), [])
+        self.assertEqual(stream.receiver._segments, [])
+        self.assertEqual(stream.receiver._segment_starts, [])
         self.assertEqual(stream.receiver._buffer_start, 24)
 
     def test_receiver_fin(self):
@@ -377,6 +435,155 @@ class QuicStreamTest(TestCase):
         stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 8, 16)
         self.assertFalse(stream.sender.is_finished)
 
+    def test_sender_data_chunks(self):
+        stream = QuicStream()
+
+        # write data in several chunks
+        data = b"0123456789"
+        stream.sender.write(data)
+        stream.sender.write(bytearray(b"abcd"))
+        stream.sender.write(memoryview(b"efgh"))
+        self.assertEqual(len(stream.sender._chunks), 3)
+
+        # data within a chunk is not copied
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"01234567")
+        self.assertIsInstance(frame.data, memoryview)
+        self.assertIs(frame.data.obj, data)
+
+        # data spanning chunks is joined
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"89abcdef")
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"gh")
+        self.assertEqual(list(stream.sender._pending), [])
+
+        # chunks are released once they are entirely acknowledged
+        stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 0, 12)
+        self.assertEqual(stream.sender._chunk_starts, [10, 14])
+        stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 12, 14)
+        self.assertEqual(stream.sender._chunk_starts, [14])
+        stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 14, 18)
+        self.assertEqual(stream.sender._chunk_starts, [])
+
+    def test_sender_data_mutable(self):
+        stream = QuicStream()
+
+        # mutable buffers are copied
+        data = bytearray(b"01234567")
+        stream.sender.write(data)
+        data[0:4] = b"abcd"
+
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"01234567")
+
+    def test_sender_producer_buffer(self):
+        stream = QuicStream()
+        data = b"0123456789abcdef"
+        producer = QuicBufferProducer(data)
+        stream.sender.write(producer, end_stream=True)
+        self.assertFalse(stream.sender.buffer_is_empty)
+        self.assertEqual(list(stream.sender._pending), [range(0, 16)])
+
+        # data is read from the producer without being copied
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"01234567")
+        self.assertIs(frame.data.obj, data)
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"89abcdef")
+        self.assertTrue(frame.fin)
+
+        # data is lost, read it again
+        stream.sender.on_data_delivery(QuicDeliveryState.LOST, 0, 8)
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"01234567")
+
+        # data is acknowledged, release the producer
+        stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 0, 16)
+        self.assertEqual(stream.sender._chunks, [])
+        self.assertTrue(stream.sender.is_finished)
+
+    def test_sender_producer_callback(self):
+        stream = QuicStream()
+        reads = []
+        chunks = [b"01234567", b"89abcdef"]
+
+        def read(size):
+            reads.append(size)
+            return chunks.pop(0)[:size] if chunks else b""
+
+        stream.sender.write(b"xy")
+        stream.sender.write(QuicCallbackProducer(read), end_stream=True)
+        self.assertEqual(list(stream.sender._pending), [range(0, 2)])
+
+        # the producer is only read once the buffered data is sent
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"xy")
+        self.assertEqual(reads, [])
+
+        # the producer is not read beyond the flow-control limit
+        frame = stream.sender.get_frame(8, max_offset=2)
+        self.assertIsNone(frame)
+        self.assertFalse(stream.sender.buffer_is_empty)
+        self.assertEqual(reads, [])
+
+        frame = stream.sender.get_frame(8, max_offset=8)
+        self.assertEqual(frame.data, b"012345")
+        self.assertEqual(frame.offset, 2)
+        self.assertFalse(frame.fin)
+        self.assertEqual(reads, [6])
+
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"89abcdef")
+        self.assertEqual(frame.offset, 8)
+        self.assertFalse(frame.fin)
+        self.assertEqual(reads, [6, 8])
+
+        # the producer is exhausted
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"")
+        self.assertEqual(frame.offset, 16)
+        self.assertTrue(frame.fin)
+        self.assertEqual(reads, [6, 8, 8])
+
+        # produced data is kept until it is acknowledged
+        stream.sender.on_data_delivery(QuicDeliveryState.LOST, 8, 16)
+        frame = stream.sender.get_frame(8)
+        self.assertEqual(frame.data, b"89abcdef")
+        stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 0, 16)
+        stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 16, 16)
+        self.assertEqual(stream.sender._chunks, [])
+        self.assertTrue(stream.sender.is_finished)
+
+    def test_sender_producer_file(self):
+        with tempfile.TemporaryFile() as fp:
+            fp.write(b"0123456789abcdef")
+            fp.flush()
+
+            producer = QuicFileProducer(fp, offset=4)
+            self.assertEqual(producer.size, 12)
+            self.assertEqual(producer.read(2, 4), b"6789")
+
+            producer = QuicFileProducer(fp.fileno(), offset=4, size=4)
+            self.assertEqual(producer.size, 4)
+            with self.assertRaises(ValueError):
+                QuicFileProducer(fp, offset=14, size=4).read(0, 4)
+
+            stream = QuicStream()
+            stream.sender.write(producer, end_stream=True)
+            frame = stream.sender.get_frame(8)
+            self.assertEqual(frame.data, b"4567")
+            self.assertTrue(frame.fin)
+
+            # the file is only closed if requested
+            stream.sender.on_data_delivery(QuicDeliveryState.ACKED, 0, 4)
+            self.assertTrue(stream.sender.is_finished)
+            self.assertFalse(fp.closed)
+
+            producer = QuicFileProducer(fp, closefd=True)
+            producer.close()
+            self.assertTrue(fp.closed)
+
     def test_sender_data_and_fin(self):
         stream = QuicStream()
 
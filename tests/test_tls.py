@@ -1,6 +1,7 @@
 import binascii
 import datetime
 import ssl
+import time
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -13,14 +14,17 @@ from aioquic.buffer import Buffer, BufferReadError
 from aioquic.quic.configuration import QuicConfiguration
 from aioquic.tls import (
     Certificate,
+    CertificateCache,
     CertificateVerify,
     ClientHello,
     Context,
     EncryptedExtensions,
     Finished,
+    KeySharePool,
     NewSessionTicket,
     ServerHello,
     State,
+    encode_certificate,
     load_pem_x509_certificates,
     pull_block,
     pull_certificate,
@@ -424,6 +428,97 @@ class ContextTest(TestCase):
 
         self._handshake(client, server)
 
+    def test_handshake_with_certificate_cache(self):
+        server = self.create_server()
+        server.certificate_cache = CertificateCache()
+        client = self.create_client()
+        client.certificate_cache = CertificateCache()
+
+        self._handshake(client, server)
+        self.assertEqual(len(client.certificate_cache), 1)
+        self.assertEqual(client.certificate_cache.misses, 1)
+
+    def test_handshake_with_key_share_pool(self):
+        pool = KeySharePool(size=2)
+        pool.fill()
+        client = self.create_client()
+        client.key_share_pool = pool
+        server = self.create_server()
+        server.key_share_pool = pool
+
+        self._handshake(client, server)
+
+        # the client takes a key for each group, the server one X25519 key
+        self.assertEqual(pool.hits, len(client._supported_groups) + 1)
+        self.assertEqual(pool.misses, 0)
+
+    def test_handshake_with_signature_request(self):
+        requests = []
+
+        def signature_request(data, signature_algorithm):
+            requests.append((data, signature_algorithm))
+
+        client = self.create_client()
+        server = self.create_server()
+        server.signature_request_cb = signature_request
+
+        # send client hello
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        server_input = merge_buffers(client_buf)
+        reset_buffers(client_buf)
+
+        # handle client hello, the flight stops before certificate verify
+        server_buf = create_buffers()
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_SIGNATURE)
+        self.assertEqual(len(requests), 1)
+        data, signature_algorithm = requests[0]
+        self.assertEqual(
+            signature_algorithm, tls.SignatureAlgorithm.RSA_PSS_RSAE_SHA256
+        )
+        self.assertEqual(len(server_buf[tls.Epoch.ONE_RTT].data), 0)
+        client.handle_message(merge_buffers(server_buf), client_buf)
+        self.assertEqual(client.state, State.CLIENT_EXPECT_CERTIFICATE_VERIFY)
+        reset_buffers(server_buf)
+
+        # send certificate verify and finished
+        server.handle_signature(
+            server.certificate_private_key.sign(
+                data, *tls.signature_algorithm_params(signature_algorithm)
+            ),
+            server_buf,
+        )
+        self.assertEqual(server.state, State.SERVER_EXPECT_FINISHED)
+        client.handle_message(merge_buffers(server_buf), client_buf)
+        self.assertEqual(client.state, State.CLIENT_POST_HANDSHAKE)
+        reset_buffers(server_buf)
+
+        # handle finished
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        self.assertEqual(server.state, State.SERVER_POST_HANDSHAKE)
+        self.assertEqual(client._dec_key, server._enc_key)
+        self.assertEqual(client._enc_key, server._dec_key)
+
+    def test_handshake_with_signature_request_and_early_message(self):
+        client = self.create_client()
+        server = self.create_server()
+        server.signature_request_cb = lambda data, signature_algorithm: None
+
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        server_input = merge_buffers(client_buf)
+        server_buf = create_buffers()
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_SIGNATURE)
+
+        # messages are kept until the signature is available
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_SIGNATURE)
+        with self.assertRaises(tls.AlertUnexpectedMessage):
+            server.handle_signature(b"signature", server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_FINISHED)
+
     def test_handshake_with_certificate_error(self):
         client = self.create_client(cafile=None)
         server = self.create_server()
@@ -617,6 +712,159 @@ class ContextTest(TestCase):
         second_handshake_bad_pre_shared_key()
 
 
+class CertificateCacheTest(TestCase):
+    def test_encode_certificate(self):
+        certificate, _ = generate_ec_certificate(common_name="example.com")
+        chain_certificate, _ = generate_ec_certificate(common_name="ca.example.com")
+        cache = CertificateCache()
+
+        buf = Buffer(capacity=4096)
+        push_certificate(
+            buf,
+            Certificate(
+                request_context=b"",
+                certificates=[
+                    (certificate.public_bytes(serialization.Encoding.DER), b""),
+                ],
+            ),
+        )
+        data = cache.encode_certificate(certificate, [])
+        self.assertEqual(data, buf.data)
+        self.assertIs(cache.encode_certificate(certificate, []), data)
+
+        # a different chain is encoded again
+        data = cache.encode_certificate(certificate, [chain_certificate])
+        self.assertEqual(data, encode_certificate(certificate, [chain_certificate]))
+        self.assertEqual(len(pull_certificate(Buffer(data=data)).certificates), 2)
+
+    def test_max_size_invalid(self):
+        with self.assertRaises(ValueError) as cm:
+            CertificateCache(max_size=0)
+        self.assertEqual(str(cm.exception), "max_size must be at least 1")
+
+    def test_verify_certificate(self):
+        certificate, _ = generate_ec_certificate(
+            common_name="example.com",
+            alternative_names=["example.com", "www.example.com"],
+        )
+        cadata = certificate.public_bytes(serialization.Encoding.PEM)
+        cache = CertificateCache(max_size=1)
+
+        cache.verify_certificate(
+            cadata=cadata, certificate=certificate, server_name="example.com"
+        )
+        cache.verify_certificate(
+            cadata=cadata, certificate=certificate, server_name="example.com"
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # failures are not cached
+        for i in range(2):
+            with self.assertRaises(tls.AlertBadCertificate):
+                cache.verify_certificate(
+                    cadata=cadata, certificate=certificate, server_name="example.org"
+                )
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+        # the least recently used chain is evicted
+        cache.verify_certificate(
+            cadata=cadata, certificate=certificate, server_name="www.example.com"
+        )
+        self.assertEqual(len(cache), 1)
+        cache.verify_certificate(
+            cadata=cadata, certificate=certificate, server_name="example.com"
+        )
+        self.assertEqual((cache.hits, cache.misses), (1, 5))
+
+        # expired chains are verified again
+        with patch("aioquic.tls.utcnow") as mock_utcnow:
+            mock_utcnow.return_value = certificate.not_valid_after + datetime.timedelta(
+                seconds=1
+            )
+            with self.assertRaises(tls.AlertCertificateExpired):
+                cache.verify_certificate(
+                    cadata=cadata, certificate=certificate, server_name="example.com"
+                )
+        self.assertEqual(len(cache), 0)
+
+
+class KeySharePoolTest(TestCase):
+    def test_fill_and_get(self):
+        pool = KeySharePool(groups=[tls.Group.SECP256R1, tls.Group.X25519], size=2)
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(pool.fill(), 4)
+        self.assertEqual(len(pool), 4)
+        self.assertEqual(pool.fill(), 0)
+
+        # keys are handed out once
+        keys = [pool.get(tls.Group.X25519) for i in range(3)]
+        self.assertEqual(len(set(id(key) for key in keys)), 3)
+        self.assertEqual((pool.hits, pool.misses), (2, 1))
+        self.assertIsInstance(pool.get(tls.Group.SECP256R1), ec.EllipticCurvePrivateKey)
+        self.assertEqual(len(pool), 1)
+
+        # groups which are not pooled are generated on the spot
+        key = pool.get(tls.Group.SECP384R1)
+        self.assertIsInstance(key.curve, ec.SECP384R1)
+        self.assertEqual((pool.hits, pool.misses), (3, 1))
+
+    def test_fork(self):
+        pool = KeySharePool(groups=[tls.Group.X25519], size=2)
+        pool.fill()
+
+        # the keys are not used by child processes
+        pool._pid = -1
+        pool.get(tls.Group.X25519)
+        self.assertEqual((pool.hits, pool.misses), (0, 1))
+        self.assertEqual(len(pool), 0)
+
+    def test_fork_with_thread(self):
+        pool = KeySharePool(groups=[tls.Group.X25519], size=2)
+        pool.start()
+        parent_condition, parent_thread = pool._condition, pool._thread
+        try:
+            # the child process runs its own thread
+            pool._pid = -1
+            pool.get(tls.Group.X25519)
+            self.assertIsNot(pool._condition, parent_condition)
+            self.assertIsNotNone(pool._thread)
+            self.assertIsNot(pool._thread, parent_thread)
+            for i in range(100):
+                if len(pool) == 2:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(len(pool), 2)
+        finally:
+            pool.close()
+
+            # stop the thread which stands in for the parent's
+            with parent_condition:
+                parent_condition.notify()
+            parent_thread.join()
+
+    def test_size_invalid(self):
+        with self.assertRaises(ValueError) as cm:
+            KeySharePool(size=0)
+        self.assertEqual(str(cm.exception), "size must be at least 1")
+
+    def test_start(self):
+        pool = KeySharePool(groups=[tls.Group.X25519], size=4)
+        pool.start()
+        try:
+            for i in range(8):
+                pool.get(tls.Group.X25519)
+
+            # the background thread refills the pool
+            for i in range(100):
+                if len(pool) == 4:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(len(pool), 4)
+        finally:
+            pool.close()
+        self.assertIsNone(pool._thread)
+
+
 class TlsTest(TestCase):
     def test_pull_client_hello(self):
         buf = Buffer(data=load("tls_client_hello.bin"))